@@ -0,0 +1,173 @@
+import asyncio
+import os
+import re
+import time
+from dotenv import load_dotenv
+load_dotenv()
+
+from pipeline import AnalysisPipeline
+from similar_items import find_similar_items
+from sel_multithread import SCRAPER_BACKEND
+from async_scraper import iter_review_pages
+from stages import StageGraph
+from summarizer import summarizer, SUMMARY_TIMEOUT
+from incremental import scrape_state
+from product_urls import get_uuid
+from product_index import get_product_index, RELATED_COUNT
+
+RELATED_TIMEOUT = float(os.getenv("RELATED_TIMEOUT", 20))
+# best reviews of an analysed product that go into its product index vector
+INDEX_REVIEWS = 20
+
+
+def response_body(data):
+    """/analyse data with its ReviewBatch turned into the JSON response's list of review dicts"""
+    return {**data, "Reviews": data["Reviews"].to_dicts()}
+
+
+def analysis_data(pipeline, summary, related_items):
+    """/analyse response of a ranked pipeline, Reviews stay a ReviewBatch until response_body"""
+    return {
+        "Reviews": pipeline.batch,
+        "Summary": summary,
+        **pipeline.aggregates(),
+        "RelatedItems": related_items,
+    }
+
+
+def batch_state(batch):
+    """Scrape state of a freshly scraped product, see incremental.py"""
+    total_pages = int(batch.page.max()) if len(batch) else 0
+    return scrape_state(total_pages, int(batch.likes.sum()), int(batch.dislikes.sum()))
+
+
+def search_param(url):
+    return re.sub(r"-", "+", get_uuid(url))
+
+
+async def find_related(search_param, url=None):
+    """Related items from the local product index, the live Amazon search only when it has too few close matches
+
+    Live results are added to the index, so the next similar product is answered locally.
+    """
+    index = get_product_index()
+    if index is not None:
+        items = index.query(search_param.replace("+", " "), exclude=[url] if url else [])
+        if len(items) == RELATED_COUNT:
+            return items
+    items = await asyncio.to_thread(find_similar_items, search_param)
+    if index is not None:
+        await asyncio.to_thread(index.add_items, items)
+    return items
+
+
+def index_product(url, batch):
+    """Add an analysed product to the product index, its best reviews describe it next to the title"""
+    index = get_product_index()
+    if index is None or not len(batch):
+        return
+    best = batch.final.argsort()[::-1][:INDEX_REVIEWS]
+    index.add_product(url.split("?")[0], get_uuid(url), [batch.text[i] for i in best.tolist()])
+
+
+async def analysis_events(url, backend=SCRAPER_BACKEND, store=None):
+    """Yield the /analyse result piece by piece as it becomes available
+
+    The request runs as a graph of stages: scraping (with inference on each
+    page as it lands), the similar items lookup and the LLM summary run
+    concurrently. The summary picks its reviews by final_score, so it starts
+    once every review is ranked. Events, in order of arrival:
+      {"event": "reviews", ...}  once per scraped page with running aggregates
+      {"event": "related", ...}  when the similar items lookup returns
+      {"event": "summary", ...}  when the LLM summary returns
+      {"event": "done", ...}     the complete response with Reviews as a ReviewBatch
+                                 (see response_body), the Server-Timing value of
+                                 every stage and the scrape state
+    """
+    start = time.time()
+    graph = StageGraph()
+    try:
+        outputs = {
+            "related": graph.stage("related", lambda: find_related(search_param(url), url), timeout=RELATED_TIMEOUT, fallback=list),
+            "summary": graph.stage("summary", summarizer.summarize, deps=["ranked"], timeout=SUMMARY_TIMEOUT, fallback=""),
+        }
+        pipeline = AnalysisPipeline(store=store)
+
+        def finished_outputs():
+            for name in [i for i, future in outputs.items() if future.done()]:
+                value = outputs.pop(name).result()
+                if name == "related":
+                    yield {"event": "related", "RelatedItems": value}
+                else:
+                    yield {"event": "summary", "Summary": value}
+
+        scrape_start = time.perf_counter()
+        pages = iter_review_pages(url, backend)
+        next_page = asyncio.ensure_future(anext(pages, None))
+        try:
+            while next_page is not None:
+                await asyncio.wait([next_page, *outputs.values()], return_when=asyncio.FIRST_COMPLETED)
+                for event in finished_outputs():
+                    yield event
+
+                if next_page.done():
+                    item = next_page.result()
+                    if item is None:
+                        next_page = None
+                        break
+                    next_page = asyncio.ensure_future(anext(pages, None))
+
+                    page, reviews = item
+                    added = len(pipeline.batch)
+                    with graph.timer("inference"):
+                        await asyncio.to_thread(pipeline.add, reviews)
+
+                    # engagement scores depend on every review seen so far, so they are provisional until the end
+                    pipeline.rank().apply()
+                    yield {
+                        "event": "reviews",
+                        "page": page,
+                        "Reviews": pipeline.batch.to_dicts(added),
+                        **pipeline.aggregates(),
+                    }
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+            await pages.aclose()
+        graph.record("scrape", time.perf_counter() - scrape_start)
+
+        with graph.timer("rank"):
+            pipeline.sort_by_page()
+        with graph.timer("dedupe"):
+            await asyncio.to_thread(pipeline.match_products, get_uuid(url))
+        with graph.timer("rank"):
+            pipeline.rank().apply()
+        batch = pipeline.batch
+        graph.resolve("ranked", batch)
+        await asyncio.to_thread(index_product, url, batch)
+
+        related_items = await graph.future("related")
+        summary = await graph.future("summary")
+        for event in finished_outputs():
+            yield event
+
+        print(f"Time taken : {time.time() - start:.2f}")
+        yield {
+            "event": "done",
+            "data": analysis_data(pipeline, summary, related_items),
+            "timing": graph.server_timing(),
+            "state": batch_state(batch),
+        }
+    finally:
+        # also reached when the client disconnects or the caller closes the stream early
+        graph.cancel()
+
+
+async def run_analysis(url, backend=SCRAPER_BACKEND, store=None):
+    """Non-streaming /analyse, drains the same event stream, returns (response, Server-Timing value, scrape state)"""
+    data, timing, state = None, "", None
+    async for event in analysis_events(url, backend, store):
+        if event["event"] == "done":
+            data, timing, state = event["data"], event["timing"], event["state"]
+    return data, timing, state
+
@@ -0,0 +1,180 @@
+import asyncio
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+load_dotenv()
+
+import sel_multithread
+from sel_multithread import SCRAPER_BACKEND
+from driver_pool import driver_pool
+
+# pages in flight across every request in this process
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", 12))
+# an empty or failed page is retried this many times, waiting PAGE_RETRY_DELAY * attempt in between
+EMPTY_PAGE_RETRIES = int(os.getenv("EMPTY_PAGE_RETRIES", 1))
+PAGE_RETRY_DELAY = float(os.getenv("PAGE_RETRY_DELAY", 0.5))
+# the reviews end at this many consecutive empty pages with nothing after them, or at the last page
+EMPTY_PAGES_TO_END = int(os.getenv("EMPTY_PAGES_TO_END", 3))
+
+scrape_executor = ThreadPoolExecutor(max_workers=SCRAPE_CONCURRENCY, thread_name_prefix="scrape")
+# one semaphore per event loop, a Semaphore is bound to the loop it was first used on
+page_slots = weakref.WeakKeyDictionary()
+
+
+def get_page_slots():
+    loop = asyncio.get_running_loop()
+    if loop not in page_slots:
+        page_slots[loop] = asyncio.Semaphore(SCRAPE_CONCURRENCY)
+    return page_slots[loop]
+
+
+def selenium_total_pages(base_url):
+    with driver_pool.lease() as driver:
+        driver.get(base_url)
+        driver_pool.page_loaded(driver)
+        return sel_multithread.get_total_pages(driver)
+
+def selenium_page(base_url, page, worker_id):
+    with driver_pool.lease() as driver:
+        return sel_multithread.scrape_page(driver, base_url, page, worker_id)
+
+
+def resolve_backend(base_url, backend):
+    """Pick the page fetcher for a product, returns (total_pages, fetch_page)"""
+    if backend in ("http", "auto"):
+        try:
+            import html_scraper
+
+            return html_scraper.get_total_pages(base_url), html_scraper.fetch_review_page
+        except Exception as e:
+            if backend == "http":
+                raise
+            print(f"HTTP scrape unavailable ({e}), falling back to Selenium")
+    return selenium_total_pages(base_url), selenium_page
+
+
+async def iter_review_pages(base_url, backend=SCRAPER_BACKEND, concurrency=SCRAPE_CONCURRENCY):
+    """Yield (page, reviews) as pages finish, in completion order
+
+    Workers pull page numbers from one shared queue, so a slow page only
+    holds up its own worker. An empty or failed page is retried, then
+    skipped. The reviews end at the last page, or earlier at a run of
+    EMPTY_PAGES_TO_END empty pages with no reviews found after it; every
+    queued or in-flight page past that run is dropped.
+    """
+    loop = asyncio.get_running_loop()
+    total_pages, fetch_page = await loop.run_in_executor(scrape_executor, resolve_backend, base_url, backend)
+    print(f"Found {total_pages} pages total.")
+
+    pages = asyncio.Queue()
+    for page in range(1, total_pages + 1):
+        pages.put_nowait(page)
+
+    finished = asyncio.Queue()
+    in_flight = {}
+    end_page = total_pages + 1
+    empty = set()
+    last_found = 0
+    stopped = False
+    slots = get_page_slots()
+
+    def end_of_reviews(page):
+        """First page of an EMPTY_PAGES_TO_END run of empty pages around `page`, if no reviews came after it"""
+        start = page
+        while start - 1 in empty:
+            start -= 1
+        stop = page
+        while stop + 1 in empty:
+            stop += 1
+        if stop - start + 1 >= EMPTY_PAGES_TO_END and last_found < start:
+            return start
+        return None
+
+    async def fetch(page, worker_id):
+        """Reviews of a page, [] if it stays empty, None if it kept failing"""
+        reviews = None
+        for attempt in range(1 + EMPTY_PAGE_RETRIES):
+            if attempt:
+                await asyncio.sleep(PAGE_RETRY_DELAY * attempt)
+            if page >= end_page:
+                return []
+            async with slots:
+                task = loop.run_in_executor(scrape_executor, fetch_page, base_url, page, worker_id)
+                in_flight[page] = task
+                try:
+                    reviews = await task
+                except asyncio.CancelledError:
+                    if stopped or page < end_page:
+                        raise
+                    return []  # cut off by the end of reviews, not by the caller
+                except Exception as e:
+                    print(f"Worker {worker_id}: page {page} failed (attempt {attempt + 1}): {type(e).__name__} {e}")
+                    reviews = None
+                finally:
+                    in_flight.pop(page, None)
+            if reviews:
+                return reviews
+        return reviews
+
+    async def worker(worker_id):
+        nonlocal end_page, last_found
+        while not pages.empty():
+            page = pages.get_nowait()
+            if page >= end_page:
+                continue
+
+            reviews = await fetch(page, worker_id)
+            if reviews:
+                last_found = max(last_found, page)
+                await finished.put((page, reviews))
+            elif reviews is None:
+                print(f"Worker {worker_id}: skipping page {page}, it kept failing")
+            elif page < end_page:
+                empty.add(page)
+                start = end_of_reviews(page)
+                if start is not None and start < end_page:
+                    print(f"Worker {worker_id}: pages from {start} are empty, reviews end before them")
+                    end_page = start
+                    for later, task in list(in_flight.items()):
+                        if later > end_page:
+                            task.cancel()
+
+    workers = [
+        asyncio.ensure_future(worker(i + 1))
+        for i in range(max(1, min(concurrency, total_pages)))
+    ]
+    done = asyncio.ensure_future(asyncio.gather(*workers))
+
+    def on_done(future):
+        if not future.cancelled():
+            future.exception()  # mark as retrieved, `await done` below re-raises it
+        finished.put_nowait(None)
+
+    done.add_done_callback(on_done)
+
+    try:
+        while (item := await finished.get()) is not None:
+            page, reviews = item
+            if page < end_page:
+                yield page, reviews
+        await done
+    finally:
+        stopped = True
+        done.cancel()
+
+
+async def scrape_all_reviews_async(base_url, backend=SCRAPER_BACKEND, concurrency=SCRAPE_CONCURRENCY):
+    """Awaitable counterpart of scrape_all_reviews, returns (reviews, count) in page order"""
+    all_reviews = []
+    async for page, reviews in iter_review_pages(base_url, backend, concurrency):
+        all_reviews.extend(reviews)
+
+    # Sort reviews by page and remove worker metadata
+    all_reviews.sort(key=lambda x: x.get("page", 0))
+    for review in all_reviews:
+        review.pop("page", None)
+        review.pop("thread_id", None)
+
+    print(f"Scraped {len(all_reviews)}")
+    return all_reviews, len(all_reviews)
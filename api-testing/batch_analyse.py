@@ -0,0 +1,225 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from dotenv import load_dotenv
+load_dotenv()
+
+from pipeline import AnalysisPipeline
+from review_batch import ReviewBatch
+from sel_multithread import SCRAPER_BACKEND
+from async_scraper import iter_review_pages
+from summarizer import summarizer, SUMMARY_TIMEOUT, configure as configure_summarizer
+from analysis import analysis_data, batch_state, find_related, get_uuid, index_product, response_body, search_param, RELATED_TIMEOUT
+
+# products scraped at once, their pages still share the process-wide page slots and driver pool
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))
+# reviews from several products are pooled into one model pass of at least this many
+BATCH_POOL_REVIEWS = int(os.getenv("BATCH_POOL_REVIEWS", 2048))
+# ...unless no other product finishes scraping within this many seconds
+BATCH_POOL_WAIT = float(os.getenv("BATCH_POOL_WAIT", 2))
+
+
+async def scrape_product(url, backend):
+    batch = ReviewBatch()
+    async for page, reviews in iter_review_pages(url, backend):
+        batch.extend(reviews)
+    return batch
+
+
+async def finish_product(url, pipeline, related=True, summary=True):
+    """Rank an already scored product and add its summary and related items"""
+    pipeline.sort_by_page()
+    await asyncio.to_thread(pipeline.match_products, get_uuid(url))
+    pipeline.rank().apply()
+    await asyncio.to_thread(index_product, url, pipeline.batch)
+
+    async def optional(enabled, coro_fn, timeout, fallback):
+        if not enabled:
+            return fallback
+        try:
+            return await asyncio.wait_for(coro_fn(), timeout)
+        except Exception as e:
+            print(f"{get_uuid(url)}: {type(e).__name__} {e}")
+            return fallback
+
+    summary_text, related_items = await asyncio.gather(
+        optional(summary, lambda: summarizer.summarize(pipeline.batch), SUMMARY_TIMEOUT, ""),
+        optional(related, lambda: find_related(search_param(url), url), RELATED_TIMEOUT, []),
+    )
+    return analysis_data(pipeline, summary_text, related_items), batch_state(pipeline.batch)
+
+
+async def analyse_many(urls, backend=SCRAPER_BACKEND, store=None, cache=None, skip_fresh=True,
+                       concurrency=BATCH_CONCURRENCY, pool_size=BATCH_POOL_REVIEWS, related=True, summary=True):
+    """Analyse many products, yields one result dict per URL as each finishes
+
+    Products are scraped `concurrency` at a time. Their reviews are pooled
+    and scored together so the models see large batches instead of one
+    product's worth at a time. With a ResponseCache, fresh entries are
+    returned without scraping (unless `skip_fresh` is off) and every result
+    is written back to it.
+
+    Result dicts: {"url", "status": "cached"|"analysed"|"error", "data", "state", "error"}
+    """
+    results = asyncio.Queue()
+    scraped = asyncio.Queue()
+    products = asyncio.Semaphore(concurrency)
+    pipeline = AnalysisPipeline(store=store)
+    tasks = []
+
+    async def scrape(url):
+        async with products:
+            if cache is not None and skip_fresh:
+                data = await asyncio.to_thread(cache.peek, get_uuid(url))
+                if data is not None:
+                    await results.put({"url": url, "status": "cached", "data": data, "state": None, "error": None})
+                    await scraped.put(None)
+                    return
+            try:
+                await scraped.put((url, AnalysisPipeline(await scrape_product(url, backend), store=store)))
+            except Exception as e:
+                await results.put({"url": url, "status": "error", "data": None, "state": None, "error": f"{type(e).__name__}: {e}"})
+                await scraped.put(None)
+
+    async def finish(url, product):
+        try:
+            data, state = await finish_product(url, product, related, summary)
+            if cache is not None:
+                await asyncio.to_thread(cache.set, get_uuid(url), data, state)
+            await results.put({"url": url, "status": "analysed", "data": data, "state": state, "error": None})
+        except Exception as e:
+            await results.put({"url": url, "status": "error", "data": None, "state": None, "error": f"{type(e).__name__}: {e}"})
+
+    async def score_pooled():
+        pending, received = [], 0
+        while received < len(urls) or pending:
+            timed_out = False
+            if received < len(urls):
+                try:
+                    item = await asyncio.wait_for(scraped.get(), BATCH_POOL_WAIT)
+                    received += 1
+                    if item is not None:  # None marks a cached or failed product
+                        pending.append(item)
+                except asyncio.TimeoutError:
+                    timed_out = True
+
+            pooled = sum(len(product.batch) for _, product in pending)
+            if pending and (pooled >= pool_size or timed_out or received == len(urls)):
+                # near-duplicates are clustered per product, one text per cluster goes into the pooled pass
+                per_product = await asyncio.to_thread(lambda: [product.pending_texts() for _, product in pending])
+                texts = [text for product_texts in per_product for text in product_texts]
+                sentiments, fakes = await asyncio.to_thread(pipeline.score, texts)
+                print(f"Scored {pooled} reviews from {len(pending)} products in one pass of {len(texts)}")
+                start = 0
+                for (url, product), product_texts in zip(pending, per_product):
+                    stop = start + len(product_texts)
+                    product.set_scores(sentiments[start:stop], fakes[start:stop])
+                    start = stop
+                    tasks.append(asyncio.ensure_future(finish(url, product)))
+                pending = []
+
+    tasks.extend(asyncio.ensure_future(scrape(url)) for url in urls)
+    scorer = asyncio.ensure_future(score_pooled())
+    try:
+        for _ in urls:
+            get = asyncio.ensure_future(results.get())
+            if not scorer.done():
+                await asyncio.wait([get, scorer], return_when=asyncio.FIRST_COMPLETED)
+            if scorer.done() and scorer.exception() is not None:
+                get.cancel()
+                raise scorer.exception()
+            yield await get
+    finally:
+        scorer.cancel()
+        for task in tasks:
+            task.cancel()
+
+
+def read_urls(sources):
+    """URLs from the command line, a file of one URL per line, or - for stdin"""
+    urls = []
+    for source in sources:
+        if source.startswith("http"):
+            urls.append(source)
+            continue
+        lines = sys.stdin if source == "-" else open(source, encoding="utf-8")
+        urls.extend(line.strip() for line in lines if line.strip() and not line.startswith("#"))
+    return list(dict.fromkeys(urls))
+
+
+def completed_urls(path):
+    """URLs already written to the output, so an interrupted run picks up where it stopped
+
+    A half written last line from a killed run is cut off so new results
+    start on a line of their own, and so is everything from the first line
+    that isn't valid JSON (those products are analysed again).
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "rb+") as f:
+        valid = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                result = json.loads(line)
+            except ValueError:
+                print(f"Corrupt line in {path} at byte {valid}, resuming from there")
+                break
+            if not result.get("error"):
+                done.add(result["url"])
+            valid += len(line)
+        f.truncate(valid)
+    return done
+
+
+async def run_cli(args):
+    from upstash_redis import Redis
+    from score_cache import make_score_store
+    from response_cache import ResponseCache
+
+    urls = read_urls(args.urls)
+    done = completed_urls(args.out)
+    todo = [url for url in urls if url not in done]
+    print(f"{len(urls)} products, {len(done)} already in {args.out}, {len(todo)} to go")
+
+    redis = None if args.no_cache else Redis.from_env()
+    cache = ResponseCache(redis) if redis is not None else None
+    configure_summarizer(redis)
+
+    start = time.time()
+    count = 0
+    with open(args.out, "a", encoding="utf-8") as out:
+        async for result in analyse_many(
+            todo, args.backend, None if args.no_cache else make_score_store(redis=redis), cache, skip_fresh=not args.force,
+            concurrency=args.concurrency, related=not args.no_related, summary=not args.no_summary,
+        ):
+            count += 1
+            line = {"url": result["url"], "status": result["status"]}
+            if result["error"]:
+                line["error"] = result["error"]
+            else:
+                line.update(response_body(result["data"]))
+            out.write(json.dumps(line, ensure_ascii=False) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+            print(f"[{count}/{len(todo)}] {result['status']} {result['url']}")
+    print(f"Done {count} products in {time.time() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Analyse many products and write one JSON line per product")
+    parser.add_argument("urls", nargs="+", help="review page URLs, files with one URL per line, or - for stdin")
+    parser.add_argument("--out", default="batch-results.jsonl", help="results, also the checkpoint to resume from")
+    parser.add_argument("--backend", default=SCRAPER_BACKEND, choices=["auto", "http", "selenium"])
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--force", action="store_true", help="re-analyse products with a fresh cache entry")
+    parser.add_argument("--no-cache", action="store_true", help="don't read or write the Redis caches or the score store")
+    parser.add_argument("--no-related", action="store_true", help="skip the similar items lookup")
+    parser.add_argument("--no-summary", action="store_true", help="skip the LLM summary")
+    asyncio.run(run_cli(parser.parse_args()))
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class InferenceBatcher:
+    """Merges concurrent inference calls into one batch
+
+    Callers on any thread `score(texts)` and block on a future. A single
+    batcher thread waits `window_ms` from the first queued call (or until
+    `max_batch_size` texts are queued), runs `fn` once over everything
+    collected and hands each caller its slice. `fn` takes a list of texts
+    and returns a tuple of per-text output lists, like score_reviews.
+    """
+
+    def __init__(self, fn, window_ms=5, max_batch_size=1024):
+        self.fn = fn
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.pending = deque()
+        self.pending_texts = 0
+        self.cond = threading.Condition()
+        self.thread = None
+        self.stats = {
+            "requests": 0,
+            "batches": 0,
+            "texts": 0,
+            "max_batch_size": 0,
+            "wait_ms_total": 0.0,
+            "max_wait_ms": 0.0,
+            "run_ms_total": 0.0,
+        }
+
+    def submit(self, texts):
+        future = Future()
+        with self.cond:
+            self.pending.append((list(texts), future, time.perf_counter()))
+            self.pending_texts += len(texts)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="inference-batcher", daemon=True)
+                self.thread.start()
+            self.cond.notify()
+        return future
+
+    def score(self, texts):
+        return self.submit(texts).result()
+
+    def next_batch(self):
+        with self.cond:
+            while not self.pending:
+                self.cond.wait()
+            deadline = self.pending[0][2] + self.window
+            while self.pending_texts < self.max_batch_size and (remaining := deadline - time.perf_counter()) > 0:
+                self.cond.wait(remaining)
+
+            # a single call bigger than max_batch_size still goes through on its own
+            batch, size = [], 0
+            while self.pending and (not batch or size + len(self.pending[0][0]) <= self.max_batch_size):
+                item = self.pending.popleft()
+                batch.append(item)
+                size += len(item[0])
+            self.pending_texts -= size
+            return batch, size
+
+    def run(self):
+        while True:
+            batch, size = self.next_batch()
+            start = time.perf_counter()
+            texts = [text for item in batch for text in item[0]]
+            try:
+                outputs = self.fn(texts)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            offset = 0
+            for item_texts, future, _ in batch:
+                end = offset + len(item_texts)
+                future.set_result(tuple(output[offset:end] for output in outputs))
+                offset = end
+
+            waits = [(start - queued_at) * 1000 for _, _, queued_at in batch]
+            with self.cond:
+                self.stats["requests"] += len(batch)
+                self.stats["batches"] += 1
+                self.stats["texts"] += size
+                self.stats["max_batch_size"] = max(self.stats["max_batch_size"], size)
+                self.stats["wait_ms_total"] += sum(waits)
+                self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], *waits)
+                self.stats["run_ms_total"] += (finished - start) * 1000
+
+    def metrics(self):
+        with self.cond:
+            stats = dict(self.stats)
+            queued_requests, queued_texts = len(self.pending), self.pending_texts
+        batches, requests = stats["batches"], stats["requests"]
+        return {
+            "queue_depth": queued_requests,
+            "queued_texts": queued_texts,
+            "requests": requests,
+            "batches": batches,
+            "texts": stats["texts"],
+            "mean_batch_size": round(stats["texts"] / batches, 1) if batches else 0,
+            "max_batch_size": stats["max_batch_size"],
+            "requests_per_batch": round(requests / batches, 2) if batches else 0,
+            "mean_wait_ms": round(stats["wait_ms_total"] / requests, 2) if requests else 0,
+            "max_wait_ms": round(stats["max_wait_ms"], 2),
+            "mean_run_ms": round(stats["run_ms_total"] / batches, 2) if batches else 0,
+        }
@@ -0,0 +1,352 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+import fixture_server
+
+# Server-Timing entries grouped under the stage names of the report
+STAGES = {
+    "scrape": "scrape",
+    "inference": "inference",
+    "rank": "score",
+    "dedupe": "score",
+    "summary": "llm",
+    "related": "related",
+    "cache": "cache",
+}
+
+
+class MemoryRedis:
+    """In-process stand-in for the Upstash client, covers the calls the caches and locks make"""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+
+    def live(self, key):
+        if key in self.expires and self.expires[key] < time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def get(self, key):
+        with self.lock:
+            return self.data[key] if self.live(key) else None
+
+    def set(self, key, value, ex=None, nx=False):
+        with self.lock:
+            if nx and self.live(key):
+                return None
+            self.data[key] = value
+            if ex:
+                self.expires[key] = time.time() + ex
+            return True
+
+    def delete(self, *keys):
+        with self.lock:
+            return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def exists(self, *keys):
+        with self.lock:
+            return sum(self.live(key) for key in keys)
+
+
+def configure(base_url, workdir):
+    """Point the API at the fixture server and keep its state out of the working tree"""
+    os.environ.update({
+        "SCRAPER_BACKEND": "http",
+        "SUMMARY_BACKEND": "http",
+        "SUMMARY_BACKEND_URL": f"{base_url}/v1/summarize",
+        "SIMILAR_ITEMS_BACKEND": "http",
+        "AMAZON_SEARCH_URL": fixture_server.search_url(base_url),
+        "SCORE_CACHE_PATH": os.path.join(workdir, "score-cache.sqlite3"),
+        "DEDUPE_INDEX_PATH": os.path.join(workdir, "dedupe-index.sqlite3"),
+        "PRODUCT_INDEX_PATH": os.path.join(workdir, "product-index.sqlite3"),
+        "PRODUCT_INDEX_DIR": os.path.join(workdir, "product-index"),
+        "JOB_QUEUE_PATH": os.path.join(workdir, "job-queue.sqlite3"),
+        "UPSTASH_REDIS_REST_URL": "http://127.0.0.1:9",
+        "UPSTASH_REDIS_REST_TOKEN": "bench",
+    })
+
+
+def serve_api(port):
+    """Child process: the API with the caches on MemoryRedis"""
+    import uvicorn
+    import main
+
+    redis = MemoryRedis()
+    main.response_cache.redis = redis
+    main.single_flight.redis = redis
+    main.summarizer.configure(redis)
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def start_api(args, base_url, workdir):
+    """Start the API in its own process, so the load generator doesn't share its GIL"""
+    with socket_port() as port:
+        pass
+    env = {**os.environ}
+    log = open(os.path.join(workdir, "api.log"), "w")
+    process = subprocess.Popen(
+        [sys.executable, __file__, "--serve", str(port), "--fixtures", base_url, "--workdir", workdir],
+        stdout=log, stderr=subprocess.STDOUT, env=env,
+    )
+    api = f"http://127.0.0.1:{port}"
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API exited with {process.returncode}, see {log.name}")
+        try:
+            requests.get(api, timeout=1).raise_for_status()
+            return process, api
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"API didn't start within {args.startup_timeout}s, see {log.name}")
+
+
+class socket_port:
+    """A free local port"""
+
+    def __enter__(self):
+        import socket
+
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        return self.sock.getsockname()[1]
+
+    def __exit__(self, *exc):
+        self.sock.close()
+
+
+def parse_server_timing(header):
+    """{name: (milliseconds or None, desc or None)} from a Server-Timing header"""
+    timings = {}
+    for entry in filter(None, (part.strip() for part in header.split(","))):
+        name, *params = entry.split(";")
+        duration = desc = None
+        for param in params:
+            key, _, value = param.partition("=")
+            if key == "dur":
+                duration = float(value)
+            elif key == "desc":
+                desc = value.strip('"')
+        # the same stage can be timed more than once per request (rank before and after dedupe)
+        previous = timings.get(name, (None, None))[0]
+        if previous is not None and duration is not None:
+            duration += previous
+        timings[name] = (duration if duration is not None else previous, desc)
+    return timings
+
+
+def analyse(session, api, url):
+    start = time.perf_counter()
+    try:
+        response = session.post(f"{api}/analyse", json={"url": url, "backend": "http"}, timeout=300)
+        status = response.status_code
+        timing = parse_server_timing(response.headers.get("Server-Timing", ""))
+    except requests.RequestException as e:
+        status, timing = type(e).__name__, {}
+    return {"latency": time.perf_counter() - start, "status": status, "timing": timing}
+
+
+def run_load(api, urls, concurrency):
+    """Closed loop: `concurrency` clients each send their next request as soon as the last one returns"""
+    local = threading.local()
+
+    def one(url):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return analyse(local.session, api, url)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, urls))
+    return results, time.perf_counter() - start
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    values = np.array(values)
+    return {
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p95": round(float(np.percentile(values, 95)), 2),
+        "p99": round(float(np.percentile(values, 99)), 2),
+        "mean": round(float(values.mean()), 2),
+        "max": round(float(values.max()), 2),
+    }
+
+
+def inference_seconds(api):
+    try:
+        return requests.get(f"{api}/metrics/inference", timeout=10).json().get("seconds", {})
+    except (requests.RequestException, ValueError):
+        return {}
+
+
+def summarize(results, elapsed, before, after):
+    ok = [r for r in results if r["status"] == 200]
+    stages = {}
+    for result in ok:
+        # several Server-Timing entries can make up one stage of a request (score is rank + dedupe)
+        durations = {}
+        for name, (duration, desc) in result["timing"].items():
+            stage = STAGES.get(name, name)
+            stages.setdefault(stage, {"durations": [], "desc": {}})
+            if duration is not None:
+                durations[stage] = durations.get(stage, 0.0) + duration
+            if desc is not None:
+                stages[stage]["desc"][desc] = stages[stage]["desc"].get(desc, 0) + 1
+        for stage, duration in durations.items():
+            stages[stage]["durations"].append(duration)
+
+    analysed = sum("scrape" in r["timing"] for r in ok)
+    inference = {
+        name: {
+            "total_s": round(after[name] - before.get(name, 0.0), 3),
+            "per_analysis_ms": round((after[name] - before.get(name, 0.0)) * 1000 / analysed, 2) if analysed else None,
+        }
+        for name in after
+    }
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "analysed": analysed,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": percentiles([r["latency"] * 1000 for r in ok]),
+        "stages_ms": {
+            name: {"count": len(stage["durations"]), **percentiles(stage["durations"]), **({"desc": stage["desc"]} if stage["desc"] else {})}
+            for name, stage in stages.items()
+        },
+        "inference": inference,
+    }
+
+
+def compare(report, baseline):
+    """Percent change of the headline numbers against an earlier --json report"""
+    rows = [
+        ("p50 ms", report["latency_ms"].get("p50"), baseline["latency_ms"].get("p50")),
+        ("p95 ms", report["latency_ms"].get("p95"), baseline["latency_ms"].get("p95")),
+        ("p99 ms", report["latency_ms"].get("p99"), baseline["latency_ms"].get("p99")),
+        ("req/s", report["throughput_rps"], baseline["throughput_rps"]),
+    ]
+    for name, stage in report["stages_ms"].items():
+        rows.append((f"{name} p50 ms", stage.get("p50"), baseline["stages_ms"].get(name, {}).get("p50")))
+    for name, now, before in rows:
+        if now is not None and before:
+            print(f"  {name:<18} {before:>10.2f} -> {now:>10.2f}  ({(now - before) / before:+.1%})")
+
+
+def print_report(report):
+    latency = report["latency_ms"]
+    print(f"{report['requests']} requests ({report['analysed']} analysed, {report['errors']} errors) "
+          f"at concurrency {report['config']['concurrency']} in {report['elapsed_s']:.2f}s: {report['throughput_rps']:.2f} req/s")
+    if latency:
+        print(f"latency ms  p50 {latency['p50']:.1f}  p95 {latency['p95']:.1f}  p99 {latency['p99']:.1f}  max {latency['max']:.1f}")
+    print("stage ms (from Server-Timing)")
+    for name, stage in report["stages_ms"].items():
+        line = f"  {name:<10} n={stage['count']:<5}"
+        if stage["count"]:
+            line += f" p50 {stage['p50']:>9.1f}  p95 {stage['p95']:>9.1f}  mean {stage['mean']:>9.1f}"
+        if "desc" in stage:
+            line += f"  {stage['desc']}"
+        print(line)
+    if report["inference"]:
+        print("inference (from /metrics/inference)")
+        for name, stage in report["inference"].items():
+            per = stage["per_analysis_ms"]
+            print(f"  {name:<10} {stage['total_s']:.3f}s total" + (f", {per:.1f}ms per analysis" if per is not None else ""))
+
+
+def main(args):
+    server, base_url = fixture_server.serve(total_pages=args.pages, llm_latency=args.llm_latency, vary_reviews=not args.same_reviews)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench-analyse-")
+    configure(base_url, workdir)
+
+    process = None
+    api = args.api
+    if api is None:
+        process, api = start_api(args, base_url, workdir)
+        print(f"API on {api}, logs in {workdir}/api.log")
+    else:
+        print(f"Using the API at {api}, start it with:")
+        print(f"  SUMMARY_BACKEND=http SUMMARY_BACKEND_URL={base_url}/v1/summarize "
+              f"SIMILAR_ITEMS_BACKEND=http AMAZON_SEARCH_URL={fixture_server.search_url(base_url)}")
+
+    try:
+        # model loading and first-request setup stay out of the numbers
+        warmup = [fixture_server.review_url(base_url, f"bench-warmup-{i}") for i in range(args.warmup)]
+        run_load(api, warmup, max(1, min(args.concurrency, args.warmup)))
+
+        # requests cycle through `products` products, repeats are answered by the response cache
+        products = args.products or args.requests
+        urls = [fixture_server.review_url(base_url, f"bench-product-{i % products}") for i in range(args.requests)]
+        before = inference_seconds(api)
+        results, elapsed = run_load(api, urls, args.concurrency)
+        after = inference_seconds(api)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        server.shutdown()
+
+    report = {
+        "config": {
+            "requests": args.requests, "concurrency": args.concurrency, "products": products,
+            "pages": args.pages, "llm_latency": args.llm_latency, "warmup": args.warmup,
+            "same_reviews": args.same_reviews,
+        },
+        "created_at": time.time(),
+        **summarize(results, elapsed, before, after),
+    }
+    print_report(report)
+    errors = sorted({str(r["status"]) for r in results if r["status"] != 200})
+    if errors:
+        print(f"errors: {', '.join(errors)}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"against {args.baseline}")
+        compare(report, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test /analyse end to end against recorded fixtures")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--products", type=int, help="distinct products, fewer than --requests exercises the cache (default: all distinct)")
+    parser.add_argument("--pages", type=int, default=5, help="review pages per product")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds the stub summary endpoint waits")
+    parser.add_argument("--same-reviews", action="store_true", help="serve every product the same reviews, so the score and summary caches answer repeats")
+    parser.add_argument("--warmup", type=int, default=2, help="requests sent before measuring")
+    parser.add_argument("--api", help="base URL of an already running API instead of starting one")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--workdir", help="where the API keeps its caches and log (default: a temp dir)")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="an earlier --json report to compare against")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--fixtures", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        configure(args.fixtures, args.workdir)
+        serve_api(args.serve)
+    else:
+        main(args)
@@ -0,0 +1,48 @@
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import model_test
+from batcher import InferenceBatcher
+
+WORDS = "good bad phone battery camera screen fast slow value price quality delivery worst best".split()
+
+
+def make_pages(count, per_page=10, seed=0):
+    """One list of review texts per scraped page, like the pipeline's score calls"""
+    rng = random.Random(seed)
+    return [
+        [" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 60))) for _ in range(per_page)]
+        for _ in range(count)
+    ]
+
+
+def run(score, pages, callers):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(callers) as pool:
+        results = list(pool.map(score, pages))
+    return time.perf_counter() - start, results
+
+
+if __name__ == "__main__":
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    callers = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    window = float(sys.argv[3]) if len(sys.argv) > 3 else model_test.INFERENCE_BATCH_WINDOW_MS
+    texts = make_pages(pages)
+
+    unbatched, expected = run(model_test.score_now, texts, callers)
+    batcher = InferenceBatcher(model_test.score_now, window, model_test.INFERENCE_BATCH_MAX)
+    batched, results = run(batcher.score, texts, callers)
+
+    diff = max(
+        abs(a - b)
+        for got, want in zip(results, expected)
+        for column_got, column_want in zip(got, want)
+        for a, b in zip(column_got, column_want)
+    )
+    print(f"{pages} pages of 10 reviews from {callers} threads, {window}ms window")
+    print(f"one call each: {unbatched:.3f}s ({pages / unbatched:.0f} pages/s)")
+    print(f"batched:       {batched:.3f}s ({pages / batched:.0f} pages/s)")
+    print(f"max score diff {diff:.2e}")
+    print(batcher.metrics())
@@ -0,0 +1,60 @@
+import copy
+import json
+import random
+import time
+
+from model_test import get_sentiment, fake_check
+from pipeline import AnalysisPipeline
+
+
+def make_reviews(n=1000, seed=0):
+    """Synthetic scraped reviews built from vocab words, already ranked by rank_reviews_by_score"""
+    rng = random.Random(seed)
+    words = list(json.load(open("../ml/vocab.json")))[2:]
+    reviews = []
+    for _ in range(n):
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(5, 120)))
+        reviews.append({
+            "review": text,
+            "user": "user",
+            "rating": str(rng.randint(1, 5)),
+            "time": "1 month ago",
+            "ldr": [str(rng.randint(0, 50)), str(rng.randint(0, 10))],
+            "score": {"ldr": rng.random(), "eng": rng.random(), "len": rng.random()},
+        })
+    return reviews
+
+
+def two_pass(reviews):
+    # what get_reviews_formatted + analyze used to do
+    texts = [i["review"] for i in reviews]
+    all_sentiments = get_sentiment(texts)
+    all_plag = fake_check(texts)
+    for idx, review in enumerate(reviews):
+        review["score"]["sent"] = all_sentiments[idx]
+        review["score"]["plag"] = all_plag[idx]
+    get_sentiment(texts)
+    fake_check(texts)
+
+
+def single_pass(reviews):
+    AnalysisPipeline(reviews).run()
+
+
+def bench(fn, reviews, repeat=5):
+    times = []
+    for _ in range(repeat):
+        batch = copy.deepcopy(reviews)
+        start = time.perf_counter()
+        fn(batch)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == "__main__":
+    reviews = make_reviews()
+    before = bench(two_pass, reviews)
+    after = bench(single_pass, reviews)
+    print(f"two-pass inference    : {before:.3f}s")
+    print(f"single-pass pipeline  : {after:.3f}s")
+    print(f"speedup               : {before / after:.2f}x")
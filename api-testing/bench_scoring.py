@@ -0,0 +1,78 @@
+import copy
+import random
+import sys
+import time
+
+import scoring
+from pipeline import AnalysisPipeline, grads
+from review_batch import ReviewBatch
+from sel_multithread import rank_reviews
+
+
+def make_scored_reviews(n=100000, seed=0):
+    """Synthetic scraped reviews with model outputs, no inference needed"""
+    rng = random.Random(seed)
+    reviews = [
+        {
+            "review": "x" * rng.randint(5, 600),
+            "ldr": [str(rng.randint(0, 500)), str(rng.randint(0, 80))],
+            "score": {},
+        }
+        for _ in range(n)
+    ]
+    return reviews, [rng.random() for _ in reviews], [rng.random() for _ in reviews]
+
+
+def dict_scoring(reviews, sentiments, fakes):
+    # rank_reviews + the per-review weighted sum the pipeline used to do
+    scorer = AnalysisPipeline(weights=grads)
+    rank_reviews(reviews)
+    for review, sent, plag in zip(reviews, sentiments, fakes):
+        review["score"]["sent"] = sent
+        review["score"]["plag"] = plag
+        review["sentiment"] = sent
+        review["final_score"] = scorer.final_score(review["score"])
+
+
+def columnar_scoring(reviews, sentiments, fakes):
+    components = scoring.engagement_scores(*scoring.parse_reviews(reviews))
+    components.update(sent=sentiments, plag=fakes)
+    scoring.final_scores(components, grads)
+
+
+def batch_scoring(batch, sentiments, fakes):
+    # what AnalysisPipeline does once the scraped pages are in its ReviewBatch
+    pipeline = AnalysisPipeline(batch, weights=grads)
+    batch.set_column("sent", sentiments)
+    batch.set_column("plag", fakes)
+    pipeline.rank().apply()
+
+
+def bench(fn, reviews, sentiments, fakes, repeat=5):
+    times = []
+    for _ in range(repeat):
+        batch = copy.deepcopy(reviews)
+        start = time.perf_counter()
+        fn(batch, sentiments, fakes)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    reviews, sentiments, fakes = make_scored_reviews(n)
+    before = bench(dict_scoring, reviews, sentiments, fakes)
+    columnar = bench(columnar_scoring, reviews, sentiments, fakes)
+    start = time.perf_counter()
+    batch = ReviewBatch.from_dicts(reviews)
+    build = time.perf_counter() - start
+    after = bench(batch_scoring, batch, sentiments, fakes)
+    start = time.perf_counter()
+    batch.to_dicts()
+    to_dicts = time.perf_counter() - start
+    print(f"{n} reviews")
+    print(f"dict-based scoring       : {before:.3f}s")
+    print(f"columnar scoring         : {columnar:.3f}s ({before / columnar:.1f}x)")
+    print(f"ReviewBatch scoring      : {after:.3f}s ({before / after:.1f}x)")
+    print(f"  filling the batch      : {build:.3f}s (once, as pages are scraped)")
+    print(f"  response dicts         : {to_dicts:.3f}s (once, at the response boundary)")
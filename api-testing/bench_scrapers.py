@@ -0,0 +1,40 @@
+import argparse
+import time
+
+import fixture_server
+from sel_multithread import scrape_all_reviews_threaded
+
+
+def bench(backend, url, total_pages, num_threads):
+    start = time.perf_counter()
+    reviews, num = scrape_all_reviews_threaded(url, num_threads=num_threads, backend=backend)
+    elapsed = time.perf_counter() - start
+    return reviews, total_pages / elapsed, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare pages/sec of the HTTP and Selenium review scrapers")
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--threads", type=int, default=6)
+    parser.add_argument("--backends", default="http,selenium")
+    args = parser.parse_args()
+
+    server, base_url = fixture_server.serve(total_pages=args.pages)
+    url = fixture_server.review_url(base_url)
+
+    results = {}
+    for backend in args.backends.split(","):
+        try:
+            results[backend] = bench(backend, url, args.pages, args.threads)
+        except Exception as e:
+            print(f"{backend}: skipped ({e})")
+
+    print()
+    for backend, (reviews, pages_per_sec, elapsed) in results.items():
+        print(f"{backend:<9}: {len(reviews)} reviews, {elapsed:.2f}s, {pages_per_sec:.1f} pages/sec")
+
+    if len(results) == 2:
+        (_, (a, *_)), (_, (b, *_)) = results.items()
+        print("identical reviews" if a == b else "REVIEWS DIFFER between backends")
+
+    server.shutdown()
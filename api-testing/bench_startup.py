@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# runs in a fresh interpreter: import the module, score once, report timings and memory
+CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+import importlib
+importlib.import_module(sys.argv[1])
+imported = time.perf_counter() - start
+
+def memory():
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    private = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {"rss_mb": round(fields.get("Rss", 0), 1), "pss_mb": round(fields.get("Pss", 0), 1), "private_mb": round(private, 1)}
+
+after_import = memory()
+start = time.perf_counter()
+from model_test import score_now
+score_now(["good phone, battery lasts all day", "worst purchase ever"])
+first_score = time.perf_counter() - start
+print(json.dumps({"import_s": imported, "first_score_s": first_score, "after_import": after_import, "after_score": memory()}))
+sys.stdout.flush()
+# stay alive until told to exit, so the workers' memory is measured side by side
+sys.stdin.read()
+"""
+
+
+def start_workers(module, count):
+    env = {**os.environ, "MODEL_PRELOAD": "lazy", "JOB_WORKERS": "0"}
+    return [
+        subprocess.Popen([sys.executable, "-c", CHILD, module], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, env=env)
+        for _ in range(count)
+    ]
+
+
+def read_result(process):
+    # skip whatever the module prints while it loads
+    for line in process.stdout:
+        if line.startswith('{"import_s"'):
+            return json.loads(line)
+    raise RuntimeError(f"worker exited with {process.wait()}")
+
+
+def run(module, workers):
+    start = time.perf_counter()
+    processes = start_workers(module, workers)
+    results = [read_result(process) for process in processes]
+    ready = time.perf_counter() - start
+    for process in processes:
+        process.communicate("")
+    return results, ready
+
+
+def summarize(results):
+    def median(key, section=None):
+        return statistics.median(r[section][key] if section else r[key] for r in results)
+
+    return {
+        "import_s": round(median("import_s"), 3),
+        "first_score_s": round(median("first_score_s"), 3),
+        **{f"import_{key}": median(key, "after_import") for key in ("rss_mb", "pss_mb", "private_mb")},
+        **{f"score_{key}": median(key, "after_score") for key in ("rss_mb", "pss_mb", "private_mb")},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold start time and per-worker memory of the API")
+    parser.add_argument(
+        "--module", default="model_test",
+        help="module a worker imports at startup, `main` also needs the Upstash Redis credentials",
+    )
+    parser.add_argument("--workers", type=int, default=4, help="workers started at once, memory is per worker")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    rounds = []
+    for i in range(args.runs):
+        results, ready = run(args.module, args.workers)
+        rounds.append({**summarize(results), "all_ready_s": round(ready, 3)})
+        print(f"run {i + 1}: {rounds[-1]}")
+
+    report = {
+        "module": args.module,
+        "workers": args.workers,
+        **{key: statistics.median(r[key] for r in rounds) for key in rounds[0]},
+    }
+    print(f"import {report['import_s']:.2f}s, first score {report['first_score_s']:.2f}s, "
+          f"{args.workers} workers ready in {report['all_ready_s']:.2f}s")
+    print(f"per worker after import: RSS {report['import_rss_mb']:.0f}MB, PSS {report['import_pss_mb']:.0f}MB, private {report['import_private_mb']:.0f}MB")
+    print(f"per worker after scoring: RSS {report['score_rss_mb']:.0f}MB, PSS {report['score_pss_mb']:.0f}MB, private {report['score_private_mb']:.0f}MB")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,317 @@
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from itertools import chain
+
+import numpy as np
+from dotenv import load_dotenv
+load_dotenv()
+
+DEDUPE_BACKEND = os.getenv("DEDUPE_BACKEND", "sqlite")  # sqlite | off, the index across products
+DEDUPE_INDEX_PATH = os.getenv("DEDUPE_INDEX_PATH", "dedupe-index.sqlite3")
+# estimated Jaccard similarity of two reviews' shingles above which they are one cluster
+DEDUPE_THRESHOLD = float(os.getenv("DEDUPE_THRESHOLD", 0.7))
+
+NUM_PERM = 64
+# 16 bands of 4 rows make pairs from ~0.5 similarity candidates, the threshold is checked on the signatures
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+# shingles hashed per chunk, bounds the (NUM_PERM, shingles) work array to ~25MB
+CHUNK_SHINGLES = 50000
+MERSENNE = (1 << 61) - 1
+
+# fixed seed, signatures have to match across processes and runs
+rng = np.random.default_rng(20240601)
+PERM_A = rng.integers(1, 1 << 31, NUM_PERM, dtype=np.uint64)
+PERM_B = rng.integers(0, 1 << 31, NUM_PERM, dtype=np.uint64)
+BAND_MULT = rng.integers(1, 1 << 63, ROWS, dtype=np.uint64) | np.uint64(1)
+# added per band, so one key column holds every band without collisions between them
+BAND_SALT = rng.integers(0, 1 << 63, BANDS, dtype=np.uint64)
+
+NON_ALPHANUM = re.compile(r"[\W_]+")
+
+
+def clean_text(text):
+    return NON_ALPHANUM.sub(" ", text.lower()).strip()
+
+
+def shingle_hashes(text):
+    """crc32 of every run of SHINGLE_WORDS words, short reviews are a single shingle"""
+    words = clean_text(text).split()
+    grams = [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(len(words) - SHINGLE_WORDS + 1, 1))]
+    return [zlib.crc32(gram.encode()) for gram in grams]
+
+
+def signatures(texts):
+    """(len(texts), NUM_PERM) uint32 MinHash signatures, min of (a*x + b) mod p over each review's shingles"""
+    hashes = [shingle_hashes(text) for text in texts]
+    out = np.empty((len(texts), NUM_PERM), dtype=np.uint32)
+    start = 0
+    while start < len(texts):
+        stop, total = start, 0
+        while stop < len(texts) and (stop == start or total + len(hashes[stop]) <= CHUNK_SHINGLES):
+            total += len(hashes[stop])
+            stop += 1
+        lengths = np.array([len(i) for i in hashes[start:stop]])
+        flat = np.fromiter(chain.from_iterable(hashes[start:stop]), dtype=np.uint64, count=total)
+        values = ((flat[None, :] * PERM_A[:, None] + PERM_B[:, None]) % MERSENNE).astype(np.uint32)
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        out[start:stop] = np.minimum.reduceat(values, offsets, axis=1).T
+        start = stop
+    return out
+
+
+def band_keys(sigs):
+    """(n, BANDS) uint64 bucket keys, one hash of each band's ROWS signature values"""
+    with np.errstate(over="ignore"):
+        return (sigs.reshape(len(sigs), BANDS, ROWS).astype(np.uint64) * BAND_MULT).sum(axis=2) + BAND_SALT
+
+
+def similar(a, b, threshold=DEDUPE_THRESHOLD):
+    return np.count_nonzero(a == b) >= threshold * NUM_PERM
+
+
+class DuplicateClusters:
+    """Near-duplicate clusters of one product's reviews
+
+    Each review joins the first cluster whose representative (its first
+    review) shares an LSH band with it and passes the signature check,
+    otherwise it starts a new cluster. `ids` holds the cluster of every
+    review in batch order, per-cluster model scores let one forward pass
+    serve the whole cluster.
+    """
+
+    def __init__(self, threshold=DEDUPE_THRESHOLD):
+        self.threshold = threshold
+        self.buckets = [{} for _ in range(BANDS)]
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.signatures = np.zeros((0, NUM_PERM), dtype=np.uint32)
+        self.keys = np.zeros((0, BANDS), dtype=np.uint64)
+        self.sent = np.zeros(0)
+        self.plag = np.zeros(0)
+        # near-duplicates found in other products, per cluster
+        self.external = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def count(self):
+        return len(self.signatures)
+
+    def add(self, texts):
+        """Cluster ids of `texts`, appended after the reviews added before"""
+        sigs = signatures(texts)
+        keys = band_keys(sigs)
+        ids = np.empty(len(texts), dtype=np.int64)
+        new = []
+        for i, (sig, row) in enumerate(zip(sigs, keys.tolist())):
+            cluster = self.find(sig, row, new, sigs)
+            if cluster is None:
+                cluster = self.count + len(new)
+                new.append(i)
+                for band, key in enumerate(row):
+                    self.buckets[band].setdefault(key, cluster)
+            ids[i] = cluster
+
+        self.ids = np.concatenate([self.ids, ids])
+        self.signatures = np.concatenate([self.signatures, sigs[new]])
+        self.keys = np.concatenate([self.keys, keys[new]])
+        self.sent = np.concatenate([self.sent, np.full(len(new), np.nan)])
+        self.plag = np.concatenate([self.plag, np.full(len(new), np.nan)])
+        self.external = np.concatenate([self.external, np.zeros(len(new), dtype=np.int64)])
+        return ids
+
+    def find(self, sig, row, new, sigs):
+        for band, key in enumerate(row):
+            cluster = self.buckets[band].get(key)
+            if cluster is None:
+                continue
+            # clusters started by this call aren't in self.signatures yet
+            rep = self.signatures[cluster] if cluster < self.count else sigs[new[cluster - self.count]]
+            if similar(sig, rep, self.threshold):
+                return cluster
+        return None
+
+    def set_scores(self, clusters, sentiments, fakes):
+        self.sent[clusters] = sentiments
+        self.plag[clusters] = fakes
+
+    def take(self, order):
+        self.ids = self.ids[order]
+
+    def sizes(self):
+        return np.bincount(self.ids, minlength=self.count)
+
+    def counts(self):
+        """Near-duplicates of every review including itself, in this product and the indexed ones"""
+        return (self.sizes() + self.external)[self.ids]
+
+
+class DedupeIndex:
+    """Near-duplicate groups across every analysed product, on disk so tens of millions of reviews fit
+
+    A group is stored once (signature, band keys, total size) however many
+    products carry a copy of it, so a template posted everywhere costs one
+    set of rows and a lookup finds at most a handful of groups per cluster.
+    `members` records each product's share so re-analysing it replaces
+    rather than double counts.
+    """
+
+    def __init__(self, path=DEDUPE_INDEX_PATH, threshold=DEDUPE_THRESHOLD):
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS products (id INTEGER PRIMARY KEY, slug TEXT UNIQUE)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS groups (id INTEGER PRIMARY KEY, size INTEGER, signature BLOB)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS bands (key INTEGER, grp INTEGER, PRIMARY KEY (key, grp)) WITHOUT ROWID"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS members (product INTEGER, grp INTEGER, size INTEGER, "
+            "PRIMARY KEY (product, grp)) WITHOUT ROWID"
+        )
+
+    def in_chunks(self, query, values, *params, size=500):
+        for start in range(0, len(values), size):
+            chunk = values[start:start + size]
+            yield from self.conn.execute(query.format(",".join("?" * len(chunk))), [*params, *chunk])
+
+    def find_groups(self, sigs, keys):
+        """Group of every signature (-1 when none passes the threshold) and that group's size"""
+        probes = {}
+        for i, row in enumerate(keys.view(np.int64).tolist()):
+            for key in row:
+                probes.setdefault(key, []).append(i)
+        hits = [
+            (idx, grp)
+            for key, grp in self.in_chunks("SELECT key, grp FROM bands WHERE key IN ({})", list(probes))
+            for idx in probes[key]
+        ]
+        groups = np.full(len(sigs), -1, dtype=np.int64)
+        sizes = np.zeros(len(sigs), dtype=np.int64)
+        if not hits:
+            return groups, sizes
+
+        pairs = np.unique(np.array(hits, dtype=np.int64), axis=0)
+        candidates, which = np.unique(pairs[:, 1], return_inverse=True)
+        found = {
+            grp: (size, signature)
+            for grp, size, signature in self.in_chunks(
+                "SELECT id, size, signature FROM groups WHERE id IN ({})", candidates.tolist()
+            )
+        }
+        group_sigs = np.frombuffer(b"".join(found[grp][1] for grp in candidates.tolist()), dtype="<u4")
+        group_sigs = group_sigs.reshape(len(candidates), NUM_PERM)
+        agree = np.count_nonzero(sigs[pairs[:, 0]] == group_sigs[which.ravel()], axis=1)
+
+        # the most similar group that passes the threshold
+        order = np.lexsort((-agree, pairs[:, 0]))
+        pairs, agree = pairs[order], agree[order]
+        near = pairs[agree >= self.threshold * NUM_PERM]
+        best = near[np.concatenate([[True], near[1:, 0] != near[:-1, 0]])] if len(near) else near
+        groups[best[:, 0]] = best[:, 1]
+        sizes[best[:, 0]] = [found[grp][0] for grp in best[:, 1].tolist()]
+        return groups, sizes
+
+    def match_and_add(self, slug, clusters):
+        """Count the product's near-duplicates elsewhere into `clusters.external`, then (re)index it"""
+        sigs, keys, local = clusters.signatures, clusters.keys, clusters.sizes()
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO products (slug) VALUES (?)", (slug,))
+            (product,) = self.conn.execute("SELECT id FROM products WHERE slug = ?", (slug,)).fetchone()
+            # take out the product's previous run first, so its own reviews aren't counted as elsewhere
+            self.conn.execute(
+                "UPDATE groups SET size = size - (SELECT size FROM members WHERE product = ? AND grp = groups.id) "
+                "WHERE id IN (SELECT grp FROM members WHERE product = ?)",
+                (product, product),
+            )
+            self.conn.execute("DELETE FROM members WHERE product = ?", (product,))
+
+            groups, sizes = self.find_groups(sigs, keys)
+            clusters.external = sizes
+            new = np.nonzero(groups < 0)[0]
+            # the products insert above holds the write lock, so no other process takes these ids
+            (last,) = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM groups").fetchone()
+            groups[new] = np.arange(last + 1, last + 1 + len(new))
+            self.conn.executemany(
+                "INSERT INTO groups VALUES (?, 0, ?)",
+                [(grp, sig.astype("<u4").tobytes()) for grp, sig in zip(groups[new].tolist(), sigs[new])],
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO bands VALUES (?, ?)",
+                [(key, grp) for grp, row in zip(groups[new].tolist(), keys[new].view(np.int64).tolist()) for key in row],
+            )
+
+            shares = {}
+            for grp, size in zip(groups.tolist(), local.tolist()):
+                shares[grp] = shares.get(grp, 0) + size
+            self.conn.executemany("UPDATE groups SET size = size + ? WHERE id = ?", [(size, grp) for grp, size in shares.items()])
+            self.conn.executemany(
+                "INSERT INTO members VALUES (?, ?, ?)", [(product, grp, size) for grp, size in shares.items()]
+            )
+
+
+index = None
+index_lock = threading.Lock()
+
+
+def get_index(backend=DEDUPE_BACKEND):
+    """Process-wide index across products, None when turned off"""
+    global index
+    if backend != "sqlite":
+        return None
+    with index_lock:
+        if index is None:
+            index = DedupeIndex()
+        return index
+
+
+if __name__ == "__main__":
+    # clustering speed, model calls saved and index growth on synthetic template-farm reviews
+    import random
+    import resource
+    import sys
+    import tempfile
+    import time
+
+    products = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    per_product = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rand = random.Random(0)
+    words = ["".join(rand.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rand.randint(2, 9))) for _ in range(3000)]
+    templates = [" ".join(rand.choice(words) for _ in range(40)) for _ in range(50)]
+
+    def review():
+        if rand.random() < 0.3:
+            # a farm template with a word or two changed
+            text = rand.choice(templates).split()
+            text[rand.randrange(len(text))] = rand.choice(words)
+            return " ".join(text)
+        return " ".join(rand.choice(words) for _ in range(rand.randint(5, 60)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DedupeIndex(os.path.join(tmp, "index.sqlite3"))
+        cluster_time = index_time = 0.0
+        reviews = clusters_total = 0
+        for p in range(products):
+            texts = [review() for _ in range(per_product)]
+            start = time.perf_counter()
+            clusters = DuplicateClusters()
+            clusters.add(texts)
+            cluster_time += time.perf_counter() - start
+            start = time.perf_counter()
+            store.match_and_add(f"product-{p}", clusters)
+            index_time += time.perf_counter() - start
+            reviews += len(texts)
+            clusters_total += clusters.count
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        size = os.path.getsize(os.path.join(tmp, "index.sqlite3")) / 1024 / 1024
+        print(f"{reviews} reviews in {clusters_total} clusters ({1 - clusters_total / reviews:.0%} fewer model inputs)")
+        print(f"clustering {reviews / cluster_time:.0f} reviews/s, index match+add {reviews / index_time:.0f} reviews/s")
+        print(f"index {size:.1f}MB on disk, max RSS {rss:.0f}MB")
+        print(f"cross-product duplicates of the last product: {int(clusters.counts().max())} max")
@@ -0,0 +1,139 @@
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from contextlib import contextmanager
+import atexit
+import os
+import queue
+import threading
+from dotenv import load_dotenv
+load_dotenv()
+
+DRIVER_POOL_SIZE = int(os.getenv("DRIVER_POOL_SIZE", 12))
+DRIVER_MAX_PAGES = int(os.getenv("DRIVER_MAX_PAGES", 50))
+DRIVER_LEASE_TIMEOUT = float(os.getenv("DRIVER_LEASE_TIMEOUT", 120))
+
+
+def setup_driver():
+    chrome_options = Options()
+    chrome_options.add_argument(
+        "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
+    )
+    chrome_options.add_argument("--accept-language=en-US,en;q=0.9")
+
+    chrome_options.add_argument("--headless")
+
+    driver = webdriver.Chrome(options=chrome_options)
+    return driver
+
+
+def quit_driver(driver):
+    try:
+        driver.quit()
+    except Exception as e:
+        print(f"Driver pool: error quitting driver: {e}")
+
+
+class DriverPool:
+    """Bounded, thread-safe pool of warm headless Chrome drivers
+
+    At most `size` drivers exist at once. A driver is recycled after
+    `max_pages` page loads or when it fails a health check, and cookies and
+    storage are wiped before it is handed to the next lease.
+    """
+
+    def __init__(self, size=DRIVER_POOL_SIZE, max_pages=DRIVER_MAX_PAGES, factory=setup_driver):
+        self.size = size
+        self.max_pages = max_pages
+        self.factory = factory
+        self.idle = queue.LifoQueue()  # most recently used driver first, it is the warmest
+        self.slots = threading.BoundedSemaphore(size)
+        self.pages = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def lease(self, timeout=DRIVER_LEASE_TIMEOUT):
+        if not self.slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No Chrome driver free after {timeout}s")
+        driver = None
+        try:
+            driver = self.checkout()
+            yield driver
+        finally:
+            if driver is not None:
+                self.checkin(driver)
+            self.slots.release()
+
+    def checkout(self):
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                return self.create()
+            if self.healthy(driver):
+                return driver
+            self.discard(driver)
+
+    def checkin(self, driver):
+        with self.lock:
+            worn_out = self.pages.get(id(driver), 0) >= self.max_pages
+        if worn_out or not self.reset(driver):
+            self.discard(driver)
+        else:
+            self.idle.put(driver)
+
+    def create(self):
+        driver = self.factory()
+        with self.lock:
+            self.pages[id(driver)] = 0
+        return driver
+
+    def discard(self, driver):
+        with self.lock:
+            self.pages.pop(id(driver), None)
+        quit_driver(driver)
+
+    def page_loaded(self, driver):
+        with self.lock:
+            self.pages[id(driver)] = self.pages.get(id(driver), 0) + 1
+
+    def healthy(self, driver):
+        try:
+            return driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def reset(self, driver):
+        """Wipe cookies and storage so the next lease starts clean, False if the driver is dead"""
+        try:
+            try:
+                driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+            except Exception:
+                pass  # about:blank and error pages have no storage
+            try:
+                driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            except Exception:
+                driver.delete_all_cookies()
+            driver.get("about:blank")
+            return True
+        except Exception as e:
+            print(f"Driver pool: recycling driver after failed reset: {e}")
+            return False
+
+    def warm(self, count):
+        """Start up to `count` idle drivers ahead of the first request"""
+        for _ in range(min(count, self.size) - self.idle.qsize()):
+            with self.lock:
+                if len(self.pages) >= self.size:
+                    return
+            self.idle.put(self.create())
+
+    def close(self):
+        while True:
+            try:
+                self.discard(self.idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+driver_pool = DriverPool()
+atexit.register(driver_pool.close)
@@ -0,0 +1,146 @@
+from functools import lru_cache
+import hashlib
+import numpy as np
+import json
+import os
+import threading
+from dotenv import load_dotenv
+load_dotenv()
+
+VOCAB_PATH = os.getenv("VOCAB_PATH", "../ml/vocab.json")
+# compiled from VOCAB_PATH by `python encoder.py --compile`, memory-mapped so every worker shares one copy
+VOCAB_TABLE_PATH = os.getenv("VOCAB_TABLE_PATH", "../ml/vocab.npy")
+ENCODER_CACHE_SIZE = int(os.getenv("ENCODER_CACHE_SIZE", 65536))
+UNKNOWN_ID = 1
+
+
+def token_hash(token):
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+
+
+class Vocab(dict):
+    """token -> id table that resolves unknown tokens to <UNKOWN> without a Python-level .get call"""
+
+    def __missing__(self, key):
+        return UNKNOWN_ID
+
+    def lookup(self, tokens):
+        return np.fromiter(map(self.__getitem__, tokens), dtype=np.int64)
+
+
+class VocabTable:
+    """token -> id lookup on the compiled table: row 0 sorted 64-bit token hashes, row 1 their ids"""
+
+    def __init__(self, path):
+        table = np.load(path, mmap_mode="r")
+        self.hashes, self.ids = table[0], table[1]
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def lookup(self, tokens):
+        hashes = np.fromiter(map(token_hash, tokens), dtype=np.uint64)
+        pos = np.minimum(np.searchsorted(self.hashes, hashes), len(self.hashes) - 1)
+        return np.where(self.hashes[pos] == hashes, self.ids[pos], UNKNOWN_ID).astype(np.int64)
+
+
+def compile_vocab(json_path=VOCAB_PATH, table_path=VOCAB_TABLE_PATH):
+    plain = json.load(open(json_path))
+    hashes = np.array([token_hash(token) for token in plain], dtype=np.uint64)
+    if len(np.unique(hashes)) != len(hashes):
+        raise ValueError("two tokens share a hash, the table can't tell them apart")
+    order = np.argsort(hashes)
+    ids = np.array(list(plain.values()), dtype=np.uint64)
+    # write then rename, so a worker starting meanwhile never maps a half written file
+    tmp = f"{table_path}.tmp.npy"
+    np.save(tmp, np.stack([hashes[order], ids[order]]))
+    os.replace(tmp, table_path)
+    return len(hashes)
+
+
+def load_vocab():
+    """The compiled table when it's up to date with the JSON vocab, else the JSON vocab itself"""
+    try:
+        if os.path.getmtime(VOCAB_TABLE_PATH) >= os.path.getmtime(VOCAB_PATH):
+            table = VocabTable(VOCAB_TABLE_PATH)
+            print(f"Mapped vocabulary ({len(table)} tokens)")
+            return table
+        print(f"{VOCAB_TABLE_PATH} is older than {VOCAB_PATH}, recompile it with `python encoder.py --compile`")
+    except OSError:
+        pass
+    table = Vocab(json.load(open(VOCAB_PATH)))
+    print(f"Loaded vocabulary ({len(table)} tokens)")
+    return table
+
+
+vocab = None
+vocab_lock = threading.Lock()
+
+def get_vocab():
+    """Loaded on first use, so importing the encoder costs nothing"""
+    global vocab
+    with vocab_lock:
+        if vocab is None:
+            vocab = load_vocab()
+        return vocab
+
+def tokenize(text):
+    # nltk takes a while to import, only pay for it once there's something to encode
+    from nltk.tokenize import word_tokenize
+
+    return word_tokenize(text)
+
+
+@lru_cache(maxsize=ENCODER_CACHE_SIZE)
+def encode_ids(text):
+    ids = (vocab if vocab is not None else get_vocab()).lookup(tokenize(text))
+    ids.flags.writeable = False  # shared through the cache
+    return ids
+
+def encode_many(texts):
+    """Encode a list of texts, tokenizing each distinct text only once"""
+    unique = {text: encode_ids(text) for text in dict.fromkeys(texts)}
+    return [unique[text] for text in texts]
+
+def pad_ids(encoded, min_len=0):
+    """Copy encoded id arrays into one preallocated zero-padded int64 buffer"""
+    width = max(min_len, max((len(ids) for ids in encoded), default=0))
+    buffer = np.zeros((len(encoded), width), dtype=np.int64)
+    for row, ids in zip(buffer, encoded):
+        row[:len(ids)] = ids
+    return buffer
+
+def encode_batch(texts, min_len=0):
+    return pad_ids(encode_many(texts), min_len)
+
+
+if __name__ == "__main__":
+    # parity check against the original per-token NLTK + dict.get path
+    import sys
+    from nltk.tokenize import word_tokenize
+
+    if "--compile" in sys.argv:
+        sys.argv.remove("--compile")
+        print(f"Compiled {compile_vocab()} tokens into {VOCAB_TABLE_PATH}")
+
+    plain_vocab = json.load(open(VOCAB_PATH))
+    texts = [line.strip() for line in open(sys.argv[1])] if len(sys.argv) > 1 else [
+        "i really enjoyed this product, the quality is great",
+        "labubu dolls are so bad at their job",
+        "i liked the delivery guy, send him again",
+        "good frame quality, wished it was cheaper though, great buy",
+        "",
+        "Don't buy!! It's a waste... 10/10 would NOT recommend",
+    ]
+
+    mismatches = 0
+    buffer = encode_batch(texts)
+    for text, row in zip(texts, buffer):
+        expected = [plain_vocab.get(tk, 1) for tk in word_tokenize(text)]
+        got = row[:len(expected)].tolist()
+        if got != expected or row[len(expected):].any():
+            mismatches += 1
+            print(f"MISMATCH: {text!r}\n  expected {expected}\n  got      {row.tolist()}")
+
+    print(f"{len(texts) - mismatches}/{len(texts)} texts encode identically")
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,129 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import urllib.parse
+from html import escape
+import threading
+import random
+import json
+import time
+import os
+import re
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+REVIEW_TEXT = re.compile(r'(<div class="ZmyHeo"><div><div class="">)(.*?)(</div>)', re.S)
+# sentences added to every review with vary_reviews, so each product's reviews are its own
+PHRASES = [
+    "Battery lasts about {n} hours.", "Delivered in {n} days.", "Camera is fine in daylight.",
+    "Display is bright enough outdoors.", "Heats up a little while gaming.", "Used it for {n} weeks now.",
+    "Packaging was damaged.", "Customer care was helpful.", "Charger is not in the box.",
+    "Value for money at this price.", "Speaker is loud and clear.", "Software has a few bugs.",
+]
+
+
+def load_fixture(*parts):
+    with open(os.path.join(FIXTURES_DIR, *parts), encoding="utf-8") as f:
+        return f.read()
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Stand-in for Flipkart review pages and Amazon search, backed by the recorded HTML in fixtures/
+
+    Also answers POST /v1/summarize like the summarizer's HTTP backend
+    expects, after `llm_latency` seconds, so runs never hit Gemini.
+    """
+
+    review_pages = [load_fixture("flipkart", f"reviews-page-{i}.html") for i in (1, 2, 3)]
+    empty_page = load_fixture("flipkart", "reviews-empty.html")
+    search_page = load_fixture("amazon", "search.html")
+    total_pages = 3
+    llm_latency = 0.0
+    vary_reviews = False
+
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(parsed.query)
+
+        if "/product-reviews/" in parsed.path:
+            slug = parsed.path.strip("/").split("/")[0]
+            self.send_html(self.review_page(int(query.get("page", ["1"])[0]), slug))
+        elif parsed.path == "/s":
+            self.send_html(self.search_page.replace("{query}", escape(query.get("k", [""])[0])))
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if urllib.parse.urlparse(self.path).path != "/v1/summarize":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.llm_latency)
+        reviews = body.get("prompt", "").count("\n- ")
+        self.send_body(json.dumps({"text": f"Stub summary of {reviews} reviews."}), "application/json")
+
+    def review_page(self, page, slug=""):
+        if page > self.total_pages:
+            return self.empty_page
+        html = self.review_pages[(page - 1) % len(self.review_pages)]
+        if self.vary_reviews:
+            count = iter(range(1000))
+
+            def vary(match):
+                rng = random.Random(f"{slug}:{page}:{next(count)}")
+                extra = " ".join(rng.choice(PHRASES).format(n=rng.randint(2, 40)) for _ in range(rng.randint(1, 3)))
+                return f"{match[1]}{match[2]} {extra}{match[3]}"
+
+            html = REVIEW_TEXT.sub(vary, html)
+        return re.sub(r"Page \d+ of \d+", f"Page {page} of {self.total_pages}", html)
+
+    def send_html(self, body):
+        self.send_body(body, "text/html; charset=utf-8")
+
+    def send_body(self, body, content_type):
+        body = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=0, total_pages=3, llm_latency=0.0, vary_reviews=False):
+    """Start the fixture server on a background thread, returns (server, base_url)
+
+    With `vary_reviews`, every product (URL slug) and page gets its own review
+    texts, so caches keyed by review text don't answer one product from another.
+    """
+    handler = type("Handler", (FixtureHandler,), {"total_pages": total_pages, "llm_latency": llm_latency, "vary_reviews": vary_reviews})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def search_url(base_url):
+    """AMAZON_SEARCH_URL for the stand-in search page"""
+    return f"{base_url}/s?k="
+
+
+def review_url(base_url, slug="fixture-product"):
+    return f"{base_url}/{slug}/product-reviews/itm0000000000000?pid=FIXTURE&marketplace=FLIPKART"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve recorded review pages for local runs and benchmarks")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds the stub summary endpoint waits")
+    args = parser.parse_args()
+
+    server, base_url = serve(args.port, args.pages, args.llm_latency)
+    print(f"Serving fixtures at {review_url(base_url)}")
+    print(f"Stub summaries at {base_url}/v1/summarize (SUMMARY_BACKEND=http)")
+    print(f"Amazon search at {search_url(base_url)} (SIMILAR_ITEMS_BACKEND=http AMAZON_SEARCH_URL=...)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
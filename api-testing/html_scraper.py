@@ -0,0 +1,134 @@
+from requests.adapters import HTTPAdapter
+from selectolax.lexbor import LexborHTMLParser as HTMLParser
+import requests
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+from sel_multithread import clean_text
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 32))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 10))
+
+
+class NeedsJavaScript(Exception):
+    """The plain HTML response has no reviews, the page has to be rendered in a browser"""
+
+
+def make_session(pool_size=HTTP_POOL_SIZE):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
+        "Accept-Language": "en-US,en;q=0.9",
+    })
+    return session
+
+
+session = make_session()
+
+
+def fetch_page(url):
+    response = session.get(url, timeout=HTTP_TIMEOUT)
+    if response.status_code != 200:
+        raise NeedsJavaScript(f"HTTP {response.status_code} for {url}")
+    return response.text
+
+
+def parse_total_pages(tree):
+    for span in tree.css("div._1G0WLw.mpIySA span"):
+        text = span.text().strip()
+        if "Page" in text and "of" in text:
+            return int(text.split()[-1])
+    return 1
+
+
+def parse_review_page(html, page=None, thread_id=None):
+    """Same fields scrape_pages_range reads through WebDriver, pulled from the raw HTML"""
+    reviews = []
+    for container in HTMLParser(html).css("div.EKFha-"):
+        # Review text
+        raw_block = container.css_first("div.ZmyHeo")
+        review_text = clean_text(raw_block.text(separator=" ")) if raw_block else None
+
+        # Rating
+        rating_div = container.css_first("div.XQDdHH.Ga3i8K")
+        rating = rating_div.text().strip() if rating_div else None
+
+        # Reviewer name and time info
+        reviewer_name = None
+        time_info = None
+        for p in container.css("p._2NsDsF"):
+            class_list = (p.attributes.get("class") or "").split()
+            if "AwS1CA" in class_list:
+                reviewer_name = p.text().strip()
+            elif len(class_list) == 1:
+                time_info = p.text().strip()
+
+        likes = 0
+        dislikes = 0
+        for div in container.css("div._6kK6mk"):
+            if "aQymJL" in (div.attributes.get("class") or "").split():
+                dislikes = div.text().strip()
+            else:
+                likes = div.text().strip()
+
+        # Only add review if we have review text
+        if review_text:
+            reviews.append(
+                {
+                    "review": review_text,
+                    "user": reviewer_name,
+                    "rating": rating,
+                    "time": time_info,
+                    "page": page,
+                    "ldr": [likes, dislikes],
+                    "thread_id": thread_id,
+                }
+            )
+    return reviews
+
+
+def get_total_pages(base_url):
+    tree = HTMLParser(fetch_page(base_url))
+    if not tree.css_first("div.EKFha-") and not tree.css_first("div._1G0WLw.mpIySA"):
+        raise NeedsJavaScript(f"No reviews in the static HTML of {base_url}")
+    return parse_total_pages(tree)
+
+
+def fetch_review_page(base_url, page, thread_id=None):
+    """Reviews on a single page, raising on fetch errors so they can be told apart from an empty page"""
+    return parse_review_page(fetch_page(f"{base_url}&page={page}"), page, thread_id)
+
+
+def scrape_page(base_url, page, thread_id=None):
+    try:
+        return fetch_review_page(base_url, page, thread_id)
+    except Exception as e:
+        print(f"Thread {thread_id}: Error fetching page {page}: {e}")
+        return []
+
+
+def scrape_pages_range(base_url, start_page, end_page, thread_id, max_empty_pages=3):
+    """HTTP counterpart of sel_multithread.scrape_pages_range"""
+    thread_reviews = []
+    consecutive_empty_pages = 0
+
+    for page in range(start_page, end_page + 1):
+        page_reviews = scrape_page(base_url, page, thread_id)
+
+        thread_reviews.extend(page_reviews)
+        if page_reviews:
+            consecutive_empty_pages = 0
+            print(f"Thread {thread_id}: Completed page {page}, found {len(page_reviews)} reviews")
+        else:
+            consecutive_empty_pages += 1
+            if consecutive_empty_pages >= max_empty_pages:
+                print(
+                    f"Thread {thread_id}: Found {consecutive_empty_pages} consecutive empty pages, stopping early at page {page}"
+                )
+                break
+
+    return thread_reviews
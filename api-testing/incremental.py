@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import os
+import time
+import urllib.parse
+from dotenv import load_dotenv
+load_dotenv()
+
+from pipeline import AnalysisPipeline
+from sel_multithread import SCRAPER_BACKEND
+from review_batch import ReviewBatch
+from async_scraper import resolve_backend, scrape_executor, get_page_slots
+from summarizer import summarizer, SUMMARY_TIMEOUT
+from product_urls import get_uuid
+
+# past this many pages of new reviews a full re-scrape is cheaper to reason about
+INCREMENTAL_MAX_PAGES = int(os.getenv("INCREMENTAL_MAX_PAGES", 10))
+NEWEST_COUNT = 10
+
+
+def fingerprint(user, rating, text):
+    """Stable identity of a review, the relative "time" field changes between scrapes so it is left out
+
+    A missing name or rating is None in a scraped review and "" in a ReviewBatch, both key the same.
+    """
+    key = "\0".join([str(user or ""), str(rating or ""), text or ""])
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def batch_fingerprints(batch):
+    return [fingerprint(*row) for row in zip(batch.user, batch.rating, batch.text)]
+
+
+def recent_url(url):
+    """The same review listing sorted newest first"""
+    parsed = urllib.parse.urlparse(url)
+    query = [(k, v) for k, v in urllib.parse.parse_qsl(parsed.query) if k not in ("sortOrder", "page")]
+    query.append(("sortOrder", "MOST_RECENT"))
+    return urllib.parse.urlunparse(parsed._replace(query=urllib.parse.urlencode(query)))
+
+
+def scrape_state(total_pages, likes, dislikes, newest=()):
+    """What the next incremental refresh needs, stored next to the cached response"""
+    return {
+        "total_pages": total_pages,
+        "newest": list(newest)[:NEWEST_COUNT],
+        "likes": likes,
+        "dislikes": dislikes,
+        "scraped_at": time.time(),
+    }
+
+
+async def scrape_new_reviews(url, known, backend=SCRAPER_BACKEND, max_pages=INCREMENTAL_MAX_PAGES):
+    """Walk the newest-first listing until a known review shows up
+
+    Returns (new_reviews, total_pages), newest first, or (None, total_pages)
+    when more than `max_pages` pages are new and a full scrape is needed.
+    """
+    loop = asyncio.get_running_loop()
+    url = recent_url(url)
+    total_pages, fetch_page = await loop.run_in_executor(scrape_executor, resolve_backend, url, backend)
+
+    new_reviews = []
+    for page in range(1, min(total_pages, max_pages) + 1):
+        async with get_page_slots():
+            reviews = await loop.run_in_executor(scrape_executor, fetch_page, url, page, 0)
+        fresh = [i for i in reviews if fingerprint(i["user"], i["rating"], i["review"]) not in known]
+        new_reviews.extend(fresh)
+        if len(fresh) < len(reviews) or not reviews:
+            return new_reviews, total_pages
+    if total_pages <= max_pages:
+        return new_reviews, total_pages
+    return None, total_pages
+
+
+async def refresh_analysis(url, data, state, backend=SCRAPER_BACKEND, store=None):
+    """Bring a cached /analyse response up to date by scraping only the reviews added since
+
+    `data` is the cached response with Reviews as a ReviewBatch. Returns
+    (data, state), or None when the cached entry can't be extended (no
+    scrape state yet, too many new pages, or the refresh failed) and a full
+    run is needed.
+    """
+    if not state or not data:
+        return None
+    try:
+        return await extend_analysis(url, data, state, backend, store)
+    except Exception as e:
+        print(f"Incremental refresh of {url} failed, running a full analysis: {type(e).__name__} {e}")
+        return None
+
+
+async def extend_analysis(url, data, state, backend, store):
+    known = set(state.get("newest", [])) | set(batch_fingerprints(data["Reviews"]))
+    new_reviews, total_pages = await scrape_new_reviews(url, known, backend)
+    if new_reviews is None:
+        print(f"Too many new review pages for {url}, running a full analysis")
+        return None
+    print(f"Incremental refresh found {len(new_reviews)} new reviews")
+
+    # newest reviews go first, the cached ones keep their order and model scores
+    new_batch = ReviewBatch.from_dicts(new_reviews)
+    pipeline = AnalysisPipeline(store=store)
+    await asyncio.to_thread(pipeline.add, new_batch)
+    await asyncio.to_thread(pipeline.add_scored, data["Reviews"])
+    await asyncio.to_thread(pipeline.match_products, get_uuid(url))
+
+    likes = state["likes"] + int(new_batch.likes.sum())
+    dislikes = state["dislikes"] + int(new_batch.dislikes.sum())
+    total_ldr = (likes - dislikes) / (likes + dislikes) if likes + dislikes else 0
+    pipeline.rank(total_ldr).apply()
+
+    summary = data["Summary"]
+    if new_reviews:
+        try:
+            summary = await asyncio.wait_for(summarizer.summarize(pipeline.batch), SUMMARY_TIMEOUT)
+        except Exception as e:
+            print(f"Summary refresh failed, keeping the previous one: {type(e).__name__} {e}")
+
+    data = {
+        **data,
+        "Reviews": pipeline.batch,
+        "Summary": summary,
+        **pipeline.aggregates(),
+    }
+    newest = batch_fingerprints(new_batch) + list(state.get("newest", []))
+    return data, scrape_state(total_pages, likes, dislikes, newest)
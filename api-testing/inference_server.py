@@ -0,0 +1,184 @@
+import multiprocessing
+import os
+import queue
+import signal
+import tempfile
+import threading
+from multiprocessing.connection import Client, Listener
+from dotenv import load_dotenv
+load_dotenv()
+
+# inside a directory only this user can enter, connections unpickle what they receive
+DEFAULT_SOCKET = os.path.join(
+    os.getenv("XDG_RUNTIME_DIR") or tempfile.gettempdir(), f"review-inference-{os.getuid()}", "inference.sock"
+)
+# shared secret of the server and the API processes, required, there is no default
+INFERENCE_AUTHKEY = os.getenv("INFERENCE_AUTHKEY")
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 2))
+# intra-op threads per worker, by default half the cores are left to scraping and the API
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", max(1, (os.cpu_count() or 2) // (2 * INFERENCE_WORKERS))))
+INFERENCE_INTEROP_THREADS = int(os.getenv("INFERENCE_INTEROP_THREADS", 1))
+# connections each API process keeps open to the server
+INFERENCE_CLIENT_POOL = int(os.getenv("INFERENCE_CLIENT_POOL", 8))
+
+
+def require_authkey(authkey=INFERENCE_AUTHKEY):
+    if not authkey:
+        raise RuntimeError("Set INFERENCE_AUTHKEY to the same random secret for the inference server and the API")
+    return authkey.encode()
+
+
+def private_dir(address):
+    """Create the socket's directory as 0700, refuse one that another user owns or can enter"""
+    directory = os.path.dirname(os.path.abspath(address))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(f"{directory} has to belong to this user with no access for others (chmod 700)")
+
+
+def serve_worker(listener, models, worker_id, threads, interop):
+    """Forked worker: the model weights are the parent's shared pages (ONNX sessions are opened here), batches run one at a time"""
+    from model_test import configure_threads, load_models, run_models, INFERENCE_BATCH_WINDOW_MS, INFERENCE_BATCH_MAX
+    from batcher import InferenceBatcher
+
+    if models is None:
+        models = load_models(threads=threads)
+    else:
+        configure_threads(threads, interop)
+    check_fake, sentiment = models
+    # requests from every connection are merged, one batch runs at a time per worker
+    batcher = InferenceBatcher(
+        lambda texts: tuple(run_models([sentiment, check_fake], texts)),
+        INFERENCE_BATCH_WINDOW_MS,
+        INFERENCE_BATCH_MAX,
+    )
+
+    def handle(conn):
+        with conn:
+            while True:
+                try:
+                    kind, texts = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if kind != "score":
+                        raise ValueError(f"unknown request {kind}")
+                    sentiments, fakes = batcher.score(texts) if texts else ([], [])
+                    conn.send(("ok", (sentiments, fakes)))
+                except Exception as e:
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+
+    print(f"Inference worker {worker_id} ready ({threads} threads)")
+    while True:
+        try:
+            conn = listener.accept()
+        except Exception as e:
+            # e.g. a client with the wrong authkey
+            print(f"Inference worker {worker_id} rejected a connection: {e}")
+            continue
+        threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+
+def serve(address=DEFAULT_SOCKET, workers=INFERENCE_WORKERS, threads=INFERENCE_THREADS, interop=INFERENCE_INTEROP_THREADS):
+    """Load both models once, then fork `workers` processes accepting on the same Unix socket"""
+    import model_test
+
+    authkey = require_authkey()
+    private_dir(address)
+
+    if model_test.MODEL_RUNTIME == "onnx":
+        # onnxruntime's thread pools don't survive a fork, every worker opens its own sessions
+        models = None
+    else:
+        models = model_test.get_models()
+    for model in models or ():
+        # weights move to shared memory, so the forked workers never copy them
+        model.share_memory()
+
+    if os.path.exists(address):
+        os.unlink(address)
+    listener = Listener(address, family="AF_UNIX", authkey=authkey)
+    os.chmod(address, 0o600)
+
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=serve_worker, args=(listener, models, i, threads, interop), daemon=True)
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    print(f"Serving inference on {address} with {workers} workers")
+
+    def stop(*_):
+        for process in processes:
+            process.terminate()
+        listener.close()
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        stop()
+
+
+class InferenceClient:
+    """Thread-safe client with a small pool of open connections to the inference server"""
+
+    def __init__(self, address, authkey=INFERENCE_AUTHKEY, pool_size=INFERENCE_CLIENT_POOL):
+        self.address = address
+        self.authkey = require_authkey(authkey)
+        self.idle = queue.LifoQueue()
+        self.slots = threading.Semaphore(pool_size)
+
+    def connect(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return Client(self.address, family="AF_UNIX", authkey=self.authkey)
+
+    def score(self, texts):
+        """Returns (sentiments, fakes) like model_test.score_reviews"""
+        with self.slots:
+            for attempt in range(2):
+                conn = self.connect()
+                try:
+                    conn.send(("score", list(texts)))
+                    status, result = conn.recv()
+                except (EOFError, OSError):
+                    # the server restarted or dropped an idle connection, retry once on a new one
+                    conn.close()
+                    if attempt:
+                        raise
+                    continue
+                self.idle.put(conn)
+                if status != "ok":
+                    raise RuntimeError(f"Inference server error: {result}")
+                return result
+
+
+client = None
+client_lock = threading.Lock()
+
+
+def get_client(address=DEFAULT_SOCKET):
+    """Process-wide client, model_test passes its INFERENCE_SOCKET"""
+    global client
+    with client_lock:
+        if client is None or client.address != address:
+            client = InferenceClient(address)
+        return client
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve both review models to the API processes over a Unix socket")
+    parser.add_argument("--socket", default=os.getenv("INFERENCE_SOCKET", DEFAULT_SOCKET))
+    parser.add_argument("--workers", type=int, default=INFERENCE_WORKERS)
+    parser.add_argument("--threads", type=int, default=INFERENCE_THREADS, help="torch intra-op threads per worker")
+    parser.add_argument("--interop-threads", type=int, default=INFERENCE_INTEROP_THREADS)
+    args = parser.parse_args()
+    serve(args.socket, args.workers, args.threads, args.interop_threads)
@@ -0,0 +1,265 @@
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dotenv import load_dotenv
+load_dotenv()
+
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "job-queue.sqlite3")
+# worker processes every API process starts on top of its own driver pool, so each one adds
+# its workers' share of DRIVER_POOL_SIZE in Chrome. Off by default, run `python jobs.py` instead
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 0))
+# a running job not finished after this long belongs to a dead worker and is queued again
+JOB_TIMEOUT = int(os.getenv("JOB_TIMEOUT", 600))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", 24 * 3600))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 0.5))
+
+# lower priority runs first, interactive requests jump ahead of batch pre-warming
+LANES = {"interactive": 0, "batch": 1}
+# queued jobs per lane before new ones are turned away
+LANE_LIMITS = {
+    "interactive": int(os.getenv("JOB_INTERACTIVE_LIMIT", 50)),
+    "batch": int(os.getenv("JOB_BATCH_LIMIT", 10000)),
+}
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """SQLite-backed job queue shared by the API and the worker processes
+
+    A product has at most one queued or running job, enqueueing it again
+    returns the existing job. Claiming happens in an IMMEDIATE transaction so
+    two workers never take the same job.
+    """
+
+    def __init__(self, path=JOB_QUEUE_PATH):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, slug TEXT, url TEXT, backend TEXT, lane TEXT, priority INTEGER, "
+            "status TEXT, attempts INTEGER DEFAULT 0, worker TEXT, error TEXT, "
+            "created_at REAL, started_at REAL, finished_at REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, created_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_slug ON jobs (slug, status)")
+
+    def transaction(self):
+        return Transaction(self)
+
+    def enqueue(self, slug, url, backend, lane="interactive"):
+        """Returns the job id, raises QueueFull when the lane is at its limit"""
+        if lane not in LANES:
+            raise ValueError(f"unknown lane {lane}")
+        with self.transaction() as conn:
+            existing = conn.execute(
+                "SELECT id, lane FROM jobs WHERE slug = ? AND status IN ('queued', 'running')", (slug,)
+            ).fetchone()
+            if existing is not None:
+                if LANES[lane] < LANES[existing["lane"]]:
+                    # a user is waiting on a product queued for pre-warming, move it up
+                    conn.execute(
+                        "UPDATE jobs SET lane = ?, priority = ? WHERE id = ? AND status = 'queued'",
+                        (lane, LANES[lane], existing["id"]),
+                    )
+                return existing["id"]
+
+            (queued,) = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE lane = ? AND status = 'queued'", (lane,)
+            ).fetchone()
+            if queued >= LANE_LIMITS[lane]:
+                raise QueueFull(f"{lane} queue is full ({queued} jobs waiting)")
+
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, slug, url, backend, lane, priority, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, 'queued', ?)",
+                (job_id, slug, url, backend, lane, LANES[lane], time.time()),
+            )
+            return job_id
+
+    def claim(self, worker):
+        """Take the next job for `worker`, None when the queue is empty"""
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'error' ELSE 'queued' END, "
+                "error = 'worker died', finished_at = CASE WHEN attempts >= ? THEN ? END "
+                "WHERE status = 'running' AND started_at < ?",
+                (JOB_MAX_ATTEMPTS, JOB_MAX_ATTEMPTS, now, now - JOB_TIMEOUT),
+            )
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY priority, created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (worker, now, row["id"]),
+            )
+            return dict(row)
+
+    def finish(self, job_id, error=None):
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                ("error" if error else "done", error, time.time(), job_id),
+            )
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        if job["status"] == "queued":
+            with self.lock:
+                (ahead,) = self.conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND (priority < ? OR (priority = ? AND created_at < ?))",
+                    (job["priority"], job["priority"], job["created_at"]),
+                ).fetchone()
+            job["position"] = ahead + 1
+        return job
+
+    def depth(self):
+        """Queued and running jobs per lane"""
+        stats = {lane: {"queued": 0, "running": 0} for lane in LANES}
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT lane, status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') GROUP BY lane, status"
+            ).fetchall()
+        for lane, status, count in rows:
+            stats[lane][status] = count
+        return stats
+
+    def prune(self, retention=JOB_RETENTION):
+        with self.transaction() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'error') AND finished_at < ?",
+                (time.time() - retention,),
+            )
+
+
+class Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, takes the write lock up front so concurrent claims serialize"""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def __enter__(self):
+        self.queue.lock.acquire()
+        self.queue.conn.execute("BEGIN IMMEDIATE")
+        return self.queue.conn
+
+    def __exit__(self, exc_type, *exc):
+        try:
+            self.queue.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.queue.lock.release()
+
+
+def worker_main(worker_id):
+    """Entry point of a worker process: claim jobs, analyse, write the result to the response cache"""
+    import asyncio
+    import signal
+    import sys
+
+    # exit through atexit so the worker's Chrome instances are closed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    from upstash_redis import Redis
+    from analysis import run_analysis
+    from response_cache import ResponseCache
+    from score_cache import make_score_store
+    import summarizer
+
+    redis = Redis.from_env()
+    cache = ResponseCache(redis)
+    store = make_score_store(redis=redis)
+    summarizer.configure(redis)
+    queue = JobQueue()
+    name = f"{os.uname().nodename}:{os.getpid()}:{worker_id}"
+    print(f"Job worker {name} started")
+    # one loop for the worker's lifetime, the summarizer's client and semaphores stay bound to it
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    idle_since = time.time()
+    while True:
+        job = queue.claim(name)
+        if job is None:
+            if time.time() - idle_since > 60:
+                queue.prune()
+                idle_since = time.time()
+            time.sleep(JOB_POLL_INTERVAL)
+            continue
+
+        start = time.time()
+        try:
+            data, _, scrape = loop.run_until_complete(run_analysis(job["url"], job["backend"], store))
+            cache.set(job["slug"], data, scrape)
+            queue.finish(job["id"])
+            print(f"Job {job['id']} ({job['lane']}) done in {time.time() - start:.2f}s")
+        except Exception as e:
+            queue.finish(job["id"], error=f"{type(e).__name__}: {e}")
+            print(f"Job {job['id']} failed: {type(e).__name__} {e}")
+        idle_since = time.time()
+
+
+def start_workers(count=JOB_WORKERS):
+    """Spawn `count` worker processes splitting DRIVER_POOL_SIZE between them
+
+    The split only covers the workers, the process calling this keeps its
+    own driver pool on top (see JOB_WORKERS).
+    """
+    if count <= 0:
+        return []
+    pool_size = max(1, int(os.getenv("DRIVER_POOL_SIZE", 12)) // count)
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=worker_main, args=(i,), daemon=True) for i in range(count)]
+    # each worker gets its share of Chrome instances, so N workers together stay within one pool.
+    # A spawned child imports driver_pool and async_scraper before worker_main runs, so the
+    # limits go into the environment it inherits, not into os.environ inside the child
+    limits = {"DRIVER_POOL_SIZE": str(pool_size), "SCRAPE_CONCURRENCY": str(pool_size)}
+    saved = {key: os.environ.get(key) for key in limits}
+    os.environ.update(limits)
+    try:
+        for worker in workers:
+            worker.start()
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    return workers
+
+
+def stop_workers(workers, timeout=10):
+    for worker in workers:
+        worker.terminate()
+    for worker in workers:
+        worker.join(timeout)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run analysis job workers outside the API process")
+    parser.add_argument("--workers", type=int, default=max(JOB_WORKERS, 2), help="processes sharing DRIVER_POOL_SIZE")
+    args = parser.parse_args()
+
+    workers = start_workers(args.workers)
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        stop_workers(workers)
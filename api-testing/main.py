@@ -1,31 +1,55 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi.errors import RateLimitExceeded
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from pydantic import BaseModel
 
-import urllib.parse
+from fastapi.responses import StreamingResponse, JSONResponse
 import requests
 from upstash_redis import Redis
 
+import asyncio
+import json
 import time
-import re
 
-from model_test import get_sentiment, fake_check
+from analysis import analysis_events, run_analysis, get_uuid, response_body
+from incremental import refresh_analysis
+from batch_analyse import analyse_many
+from model_test import inference_metrics as model_inference_metrics, preload_models
+from jobs import JobQueue, QueueFull, start_workers, stop_workers
+from score_cache import make_score_store
+from response_cache import ResponseCache
+from singleflight import SingleFlight
+import summarizer
 from similar_items import find_similar_items
-from sel_multithread import get_reviews_formatted, rank_reviews_by_score
+from sel_multithread import SCRAPER_BACKEND
+from driver_pool import driver_pool
 
 import os
-import google.generativeai as genai
 from dotenv import load_dotenv
 load_dotenv()
 
 
 redis = Redis.from_env()
+score_store = make_score_store(redis=redis)
+response_cache = ResponseCache(redis)
+single_flight = SingleFlight(redis)
+summarizer.configure(redis)
+job_queue = JobQueue()
+job_workers = []
 
 class URLRequest(BaseModel):
     url: str
+    backend: str = SCRAPER_BACKEND  # auto | http | selenium
+    background: bool = False  # on a cache miss, queue a job and return its id instead of waiting
+    lane: str = "interactive"  # interactive | batch
+
+class BatchRequest(BaseModel):
+    urls: list[str]
+    backend: str = SCRAPER_BACKEND
+    force: bool = False  # re-analyse products that have a fresh cache entry
+    background: bool = False  # queue every product in the batch lane instead of running them here
     
 app = FastAPI()
 
@@ -42,110 +66,184 @@ app.add_middleware(
 )
 
 
-def get_uuid(url):
-    parsed_url = urllib.parse.urlparse(url)
-    return parsed_url.path.strip("/").split("/")[0]
+@app.on_event("startup")
+def warm_drivers():
+    driver_pool.warm(int(os.getenv("DRIVER_POOL_WARM", 0)))
 
-def cache(url, data):
-    id = get_uuid(url)
-    redis.set(id, data)
+@app.on_event("startup")
+def warm_models():
+    preload_models()
 
+@app.on_event("startup")
+def start_job_workers():
+    # none unless JOB_WORKERS is set, queued jobs are run by `python jobs.py --workers N`
+    job_workers.extend(start_workers())
 
-@app.get("/")
-def main():
-    return {"health": "ok"}
-
-@app.post("/analyse")
-# @limiter.limit("5/minute")
-async def analyze(request: Request, url: URLRequest):
-    url = url.url
-    top_n = 25
-
-    start = time.time()
-    search_param = re.sub(r"-", "+", get_uuid(url))
-
-    if res := redis.get(get_uuid(url)):
-        return res
-
-    total_start_time = time.time()
-    reviews, num = get_reviews_formatted(url)
-    similar_items = find_similar_items(search_param)
-    end = time.time()
-
-    list_of_texts = [i["review"] for i in reviews]
-
-    # print("LIST OF TEXTX", list_of_texts)
-    user_score = [i["final_score"] for i in reviews]
-    user_mean_score = sum(user_score) / len(user_score)
-    user_sentiment = ""
+@app.on_event("shutdown")
+def close_drivers():
+    driver_pool.close()
 
-    # Classify user_mean_score into sentiment category
-    if 0 <= user_mean_score < 0.05:
-        user_sentiment = "very negative"
-    elif 0.05 <= user_mean_score < 0.15:
-        user_sentiment = "negative"
-    elif 0.15 <= user_mean_score < 0.35:
-        user_sentiment = "neutral"
-    elif 0.35 <= user_mean_score < 0.75:
-        user_sentiment = "positive"
-    else:
-        user_sentiment = "very positive"
+@app.on_event("shutdown")
+def stop_job_workers():
+    stop_workers(job_workers)
 
-    sentiment_time = time.time()
-    sentiment_scores = get_sentiment(list_of_texts)
-    sentiment_mean_score = sum(sentiment_scores) / len(sentiment_scores)
-    sentiment_end_time = time.time()
-    print(f"Sentiment Analysis done in {sentiment_end_time - sentiment_time:.2f}")
 
-    fake_scores = fake_check(list_of_texts)
-    num_fakes = sum([1 for i in fake_scores if i > 0.5]) / len(reviews)
+def cache(url, data, scrape=None):
+    response_cache.set(get_uuid(url), data, scrape)
 
-    for review, score in zip(reviews, sentiment_scores):
-        review["sentiment"] = score
 
-    summary = infer_llm(reviews=list_of_texts[:top_n])
-    summary = summary["content"]
-
-    summary = re.sub(r'[^a-zA-Z0-9\s\.]', '', summary)
-    summary = re.sub(r'\s+', ' ', summary.strip())
-
-    total_stop_time = time.time()
-    print(f"Time taken : {total_stop_time - total_start_time:.2f}")
-
-    print(f"Time taken : {end - start:.2f}")
+@app.get("/")
+def main():
+    return {"health": "ok"}
 
-    data = { 
-        "Reviews" : reviews,
-        "Summary" : summary,
-        "ReviewsScraped": num,
-        "SentimentScore" : (round(sentiment_mean_score * 100)),
-        "UserSentiment": user_sentiment,
-        "FakeRatio": round(num_fakes * 100),
-        "RelatedItems": similar_items,
-        }
-    cache(url, data)
+@app.get("/metrics/cache")
+def cache_metrics():
+    return response_cache.metrics()
 
-    return data
+@app.post("/analyse")
+# @limiter.limit("5/minute")
+async def analyze(request: Request, url: URLRequest, background_tasks: BackgroundTasks):
+    background, lane = url.background, url.lane
+    url, backend = url.url, url.backend
+    slug = get_uuid(url)
+
+    async def refresh():
+        # only scrape what was added since the cached run, fall back to a full one
+        entry = await asyncio.to_thread(response_cache.load, slug)
+        if entry is not None:
+            result = await refresh_analysis(url, entry["data"], entry.get("scrape"), backend, score_store)
+            if result is not None:
+                return result
+        data, _, scrape = await run_analysis(url, backend, score_store)
+        return data, scrape
+
+    data, state = await asyncio.to_thread(response_cache.get, slug)
+    if state == "stale" and await asyncio.to_thread(response_cache.claim_refresh, slug):
+        background_tasks.add_task(response_cache.refresh, slug, refresh)
+    if data is not None:
+        return JSONResponse(response_body(data), headers={"Server-Timing": f'cache;desc="{state}"'})
+
+    if background:
+        return await asyncio.to_thread(enqueue, slug, url, backend, lane)
+
+    async def compute():
+        data, timing, scrape = await run_analysis(url, backend, score_store)
+        start = time.perf_counter()
+        await asyncio.to_thread(cache, url, data, scrape)
+        return data, f"{timing}, cache;dur={(time.perf_counter() - start) * 1000:.1f}"
+
+    def lookup():
+        # another worker ran the analysis while this one waited on the lock
+        data = response_cache.peek(slug)
+        return (data, 'cache;desc="coalesced"') if data is not None else None
+
+    data, timing = await single_flight.do(slug, compute, lookup=lookup)
+    return JSONResponse(response_body(data), headers={"Server-Timing": timing})
+
+
+@app.post("/analyse/stream")
+async def analyze_stream(request: Request, url: URLRequest):
+    """NDJSON stream of partial results, the final "done" line carries the full /analyse response"""
+    url, backend = url.url, url.backend
+    slug = get_uuid(url)
+
+    async def events():
+        data = await asyncio.to_thread(response_cache.peek, slug)
+        timing = 'cache;desc="fresh"'
+        if data is None:
+            async for event in analysis_events(url, backend, score_store):
+                if event["event"] == "done":
+                    data, timing = event["data"], event["timing"]
+                    await asyncio.to_thread(cache, url, data, event["state"])
+                else:
+                    yield json.dumps(event) + "\n"
+        yield json.dumps({"event": "done", "data": response_body(data), "timing": timing}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.post("/analyse/batch")
+async def analyze_batch(request: Request, batch: BatchRequest):
+    """Analyse many products into the cache, NDJSON with one line of aggregates per product as it finishes
+
+    With `background`, every product is queued in the batch lane instead and
+    the response lists the job ids.
+    """
+    if batch.background:
+        jobs = []
+        for url in batch.urls:
+            if not batch.force and await asyncio.to_thread(response_cache.peek, get_uuid(url)) is not None:
+                jobs.append({"url": url, "Status": "cached"})
+                continue
+            try:
+                job_id = await asyncio.to_thread(job_queue.enqueue, get_uuid(url), url, batch.backend, "batch")
+                jobs.append({"url": url, "JobId": job_id})
+            except QueueFull as e:
+                jobs.append({"url": url, "error": str(e)})
+        return {"Jobs": jobs}
+
+    async def lines():
+        async for result in analyse_many(batch.urls, batch.backend, score_store, response_cache, skip_fresh=not batch.force):
+            line = {"url": result["url"], "status": result["status"]}
+            if result["error"]:
+                line["error"] = result["error"]
+            else:
+                line.update({k: v for k, v in result["data"].items() if k != "Reviews"})
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def enqueue(slug, url, backend, lane):
+    try:
+        job_id = job_queue.enqueue(slug, url, backend, lane)
+    except QueueFull as e:
+        # workers are saturated, turn the request away rather than pile more Chrome work on
+        return JSONResponse({"error": str(e)}, status_code=429, headers={"Retry-After": "30"})
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    job = job_queue.get(job_id)
+    return JSONResponse(
+        {"JobId": job_id, "Status": job["status"], "Position": job.get("position")},
+        status_code=202,
+        headers={"Location": f"/jobs/{job_id}"},
+    )
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Poll a queued analysis, the result is included once it is done"""
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        return JSONResponse({"error": "unknown job"}, status_code=404)
+
+    body = {
+        "JobId": job_id,
+        "Url": job["url"],
+        "Lane": job["lane"],
+        "Status": job["status"],
+        "Position": job.get("position"),
+        "Error": job["error"] if job["status"] == "error" else None,
+    }
+    if job["status"] == "done":
+        data = await asyncio.to_thread(response_cache.peek, job["slug"])
+        body["Result"] = response_body(data) if data is not None else None
+    return body
+
+@app.get("/metrics/inference")
+def inference_metrics():
+    """Cross-request batcher: queue depth, batch sizes, how long callers waited and time per inference stage"""
+    return model_inference_metrics()
+
+@app.get("/metrics/jobs")
+def job_metrics():
+    return {"workers": sum(worker.is_alive() for worker in job_workers), "lanes": job_queue.depth()}
 
 
 def get_similar(url: URLRequest):
     return find_similar_items(get_uuid(url))
 
 
-def infer_llm(reviews):
-    try:
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        prompt = (
-            "You are given a list of user reviews. Read them all carefully and generate a concise, balanced summary that captures the overall sentiment, common themes, notable pros and cons, and any frequently mentioned issues or praises. Use clear language and aim to reflect the general consensus as well as any strong outliers. DO NOT USE POINTS. "
-            "GIVE ME A 150 WORD REVIEW: " + str(reviews)
-        )
-        response = model.generate_content(prompt)
-        return {"content": response.text}
-    except Exception as e:
-        print(f"Gemini API error: {e}")
-        return {"content": ""}
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
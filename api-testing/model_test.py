@@ -1,46 +1,263 @@
-
-import torch
-from torch.nn.utils.rnn import pad_sequence
-from nltk.tokenize import word_tokenize
+import importlib.util
 import json
+import os
+import threading
+import time
+from encoder import encode_ids, encode_many, pad_ids
+from batcher import InferenceBatcher
+from dotenv import load_dotenv
+load_dotenv()
+
+# float32 TorchScript, plus the int8 and ONNX exports written by ml/export_models.py
+MODEL_PATHS = {
+    "torch": ("../ml/check-fake.pt", "../ml/sentiment-analysis.pt"),
+    "int8": ("../ml/check-fake-int8.pt", "../ml/sentiment-analysis-int8.pt"),
+    "onnx": ("../ml/check-fake.onnx", "../ml/sentiment-analysis.onnx"),
+}
+CHECK_FAKE_PATH, SENTIMENT_PATH = MODEL_PATHS["torch"]
+EXPORT_REPORT_PATH = "../ml/export-report.json"
+# torch | int8 | onnx, or auto for the lightest export whose parity check stayed within MODEL_TOLERANCE
+MODEL_RUNTIME = os.getenv("MODEL_RUNTIME", "torch")
+MODEL_TOLERANCE = float(os.getenv("MODEL_TOLERANCE", 0.02))
+# when set, inference goes to inference_server.py on this socket and the models aren't loaded here
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET")
+# 0 keeps torch's defaults
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", 0))
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", 0))
+# concurrent score_reviews calls are merged for up to this long, 0 turns cross-request batching off
+INFERENCE_BATCH_WINDOW_MS = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", 5))
+INFERENCE_BATCH_MAX = int(os.getenv("INFERENCE_BATCH_MAX", 1024))
+# background: the API loads the models next to serving its first requests, lazy: on the first score
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "background")
+
+
+# both models stack two MaxPool1d(2) layers, so every batch needs at least 4 positions
+MIN_SEQ_LEN = 4
+# reviews are padded up to a multiple of this many tokens
+PAD_MULTIPLE = int(os.getenv("INFERENCE_PAD_MULTIPLE", 16))
+# the models don't mask padding, so how reviews are padded changes their scores, part of the score cache digest
+PADDING_VERSION = f"pad{PAD_MULTIPLE}-min{MIN_SEQ_LEN}"
+MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", 256))
+MAX_BATCH_MB = float(os.getenv("INFERENCE_MAX_BATCH_MB", 64))
+# rough float32 activation footprint of one padded token (embedding + conv1 in/out)
+BYTES_PER_TOKEN = 64 * 4 * 5
+
+
+def configure_threads(threads=TORCH_THREADS, interop=TORCH_INTEROP_THREADS):
+    """Cap torch's intra-op and inter-op pools so inference doesn't fight the scraper threads for cores"""
+    if threads or interop:
+        import torch
+    if threads:
+        torch.set_num_threads(threads)
+    if interop:
+        try:
+            torch.set_num_interop_threads(interop)
+        except RuntimeError as e:
+            # only settable before the first parallel op of the process
+            print(f"Couldn't set interop threads: {e}")
+
+def resolve_runtime(runtime=MODEL_RUNTIME, tolerance=MODEL_TOLERANCE):
+    """`auto` picks onnx, then int8, when the export report shows them within tolerance, else torch"""
+    if runtime in ("torch", "int8", "onnx"):
+        return runtime
+    if runtime != "auto":
+        raise ValueError(f"unknown MODEL_RUNTIME {runtime}")
+    try:
+        report = json.load(open(EXPORT_REPORT_PATH))["runtimes"]
+    except (OSError, ValueError, KeyError):
+        return "torch"
+    for candidate in ("onnx", "int8"):
+        if candidate == "onnx" and importlib.util.find_spec("onnxruntime") is None:
+            continue
+        within = report.get(candidate, {}).get("max_diff", float("inf")) <= tolerance
+        if within and all(os.path.exists(path) for path in MODEL_PATHS[candidate]):
+            return candidate
+    return "torch"
+
+
+class TorchModel:
+    """TorchScript model (float32 or int8) taking a padded int64 id array"""
+
+    seconds = 0.0  # spent in __call__ through run_models, see inference_metrics
+
+    def __init__(self, path):
+        import torch
+
+        self.torch = torch
+        self.module = torch.jit.load(path, map_location="cpu").eval()
+
+    def __call__(self, ids):
+        with self.torch.no_grad():
+            return self.module(self.torch.from_numpy(ids)).tolist()
+
+    def share_memory(self):
+        self.module.share_memory()
+
+
+class OnnxModel:
+    """ONNX Runtime session, serves without importing torch"""
+
+    seconds = 0.0
+
+    def __init__(self, path, threads=0):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input = self.session.get_inputs()[0].name
+
+    def __call__(self, ids):
+        return self.session.run(None, {self.input: ids})[0].tolist()
+
+    def share_memory(self):
+        pass
+
 
-check_fake_model = torch.jit.load("../ml/check-fake.pt", map_location="cpu") 
-sentiment_model = torch.jit.load("../ml/sentiment-analysis.pt", map_location="cpu")
-print("Loaded torch model")
-vocab = json.load(open("../ml/vocab.json"))
-print(f"Loaded vocabulary ({len(vocab)} tokens)")
+def load_models(runtime=None, threads=TORCH_THREADS):
+    runtime = runtime or MODEL_RUNTIME
+    check_fake_path, sentiment_path = MODEL_PATHS[runtime]
+    if runtime == "onnx":
+        models = OnnxModel(check_fake_path, threads), OnnxModel(sentiment_path, threads)
+    else:
+        models = TorchModel(check_fake_path), TorchModel(sentiment_path)
+    print(f"Loaded {runtime} models")
+    return models
+
+
+MODEL_RUNTIME = resolve_runtime()
+check_fake_model = sentiment_model = None
+models_lock = threading.Lock()
+
+def get_models():
+    """(check_fake, sentiment), loaded on first use so importing this module doesn't import torch"""
+    global check_fake_model, sentiment_model
+    with models_lock:
+        if check_fake_model is None:
+            if MODEL_RUNTIME != "onnx":
+                configure_threads()
+            check_fake_model, sentiment_model = load_models()
+        return check_fake_model, sentiment_model
+
+def preload_models(mode=MODEL_PRELOAD):
+    """Start loading the models on a background thread, the first score waits for it if it's not done"""
+    if mode == "background" and INFERENCE_SOCKET is None:
+        threading.Thread(target=get_models, daemon=True).start()
 
 
 def encode_text(text):
-    return torch.tensor([
-        vocab.get(tk, 1)
-        for tk in word_tokenize(text)
-    ])
+    import torch
+
+    return torch.from_numpy(encode_ids(text).copy())
 
 def batch_tensors(reviews):
-    batched_tensors = pad_sequence([
-        encode_text(text)
-        for text in reviews
-    ], batch_first=True)
+    import torch
 
-    return batched_tensors
+    return torch.from_numpy(pad_ids(encode_many(reviews), MIN_SEQ_LEN))
 
-def fake_check(reviews):
-    batched_tensors = batch_tensors(reviews)
+def padded_width(length):
+    """Width a review is padded to, it only depends on the review itself
+
+    The models don't mask padding, so a shared bucket width would make a
+    review's score depend on whatever else was batched with it.
+    """
+    return max(-(-length // PAD_MULTIPLE) * PAD_MULTIPLE, MIN_SEQ_LEN)
+
+# encoding time of every run_models call in this process
+tokenize_seconds = 0.0
+
+def make_buckets(lengths, max_batch_size=MAX_BATCH_SIZE, max_batch_mb=MAX_BATCH_MB):
+    """Group review indices of the same padded width, capping batch size and padded tokens"""
+    max_batch_tokens = max(int(max_batch_mb * 1024 * 1024 / BYTES_PER_TOKEN), 1)
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+
+    buckets = []
+    bucket = []
+    bucket_width = None
+    for idx in order:
+        width = padded_width(lengths[idx])
+        if bucket and (width != bucket_width or len(bucket) >= max_batch_size or (len(bucket) + 1) * width > max_batch_tokens):
+            buckets.append(bucket)
+            bucket = []
+        bucket.append(idx)
+        bucket_width = width
+    if bucket:
+        buckets.append(bucket)
+
+    return buckets
 
-    check_fake_model.eval()
-    with torch.no_grad():
-        output = check_fake_model(batched_tensors)
-    return output.numpy().tolist()
+def run_models(models, reviews, max_batch_size=MAX_BATCH_SIZE, max_batch_mb=MAX_BATCH_MB):
+    """Run every model over length-bucketed batches, returns one score list per model in input order"""
+    global tokenize_seconds
+    start = time.perf_counter()
+    encoded = encode_many(reviews)
+    tokenize_seconds += time.perf_counter() - start
+    outputs = [[0.0] * len(reviews) for _ in models]
+
+    buckets = make_buckets([len(i) for i in encoded], max_batch_size, max_batch_mb)
+    for bucket in buckets:
+        width = padded_width(len(encoded[bucket[0]]))
+        ids = pad_ids([encoded[i] for i in bucket], width)
+        for output, model in zip(outputs, models):
+            start = time.perf_counter()
+            scores = model(ids)
+            model.seconds += time.perf_counter() - start
+            for idx, score in zip(bucket, scores):
+                output[idx] = score
+
+    return outputs
+
+def fake_check(reviews):
+    if INFERENCE_SOCKET is not None:
+        return score_reviews(reviews)[1]
+    return run_models([get_models()[0]], reviews)[0]
 
 def get_sentiment(reviews):
-    batched_tensors = batch_tensors(reviews)
-    
-    sentiment_model.eval()
-    with torch.no_grad():
-        output = sentiment_model(batched_tensors)
+    if INFERENCE_SOCKET is not None:
+        return score_reviews(reviews)[0]
+    return run_models([get_models()[1]], reviews)[0]
+
+def score_reviews(reviews):
+    """Run both models over the same encoded batches, returns (sentiments, fakes)
+
+    Calls from concurrent requests are merged by the process-wide batcher.
+    With INFERENCE_SOCKET they go straight to the server, which batches
+    across every API process, a local window would only add its wait twice.
+    """
+    if INFERENCE_BATCH_WINDOW_MS > 0 and INFERENCE_SOCKET is None and reviews:
+        return get_batcher().score(reviews)
+    return score_now(reviews)
+
+def score_now(reviews):
+    if INFERENCE_SOCKET is not None:
+        from inference_server import get_client
+
+        return get_client(INFERENCE_SOCKET).score(reviews)
+    check_fake, sentiment = get_models()
+    sentiments, fakes = run_models([sentiment, check_fake], reviews)
+    return sentiments, fakes
+
+batcher = None
+batcher_lock = threading.Lock()
+
+def get_batcher():
+    global batcher
+    with batcher_lock:
+        if batcher is None:
+            batcher = InferenceBatcher(score_now, INFERENCE_BATCH_WINDOW_MS, INFERENCE_BATCH_MAX)
+        return batcher
 
-    return output.numpy().tolist()
+def inference_metrics():
+    """Batcher stats, plus the total seconds spent per inference stage when the models run in this process"""
+    metrics = batcher.metrics() if batcher is not None else {}
+    if check_fake_model is not None:
+        metrics["seconds"] = {
+            "tokenize": round(tokenize_seconds, 4),
+            "sentiment": round(sentiment_model.seconds, 4),
+            "fake": round(check_fake_model.seconds, 4),
+        }
+    return metrics
 
 
 if __name__ == "__main__":
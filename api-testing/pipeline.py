@@ -0,0 +1,234 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from model_test import score_reviews
+from dedupe import DuplicateClusters, get_index
+from review_batch import ReviewBatch
+import scoring
+
+
+grads = {
+    "ldr": 0.0829,
+    "eng": 0.4726,
+    "len": 0.0363,
+    "sent": 0.3277,
+    "plag": 0.4035,
+}
+
+# written by ml/grad_descent.py, grads is used until it exists
+WEIGHTS_PATH = os.getenv("WEIGHTS_PATH", "../ml/weights.json")
+WEIGHTS_CHECK_INTERVAL = float(os.getenv("WEIGHTS_CHECK_INTERVAL", 5))
+
+
+class WeightsFile:
+    """Score weights reloaded from WEIGHTS_PATH whenever its mtime changes
+
+    The file is stat'ed at most every `interval` seconds. A file that fails to
+    load or validate keeps the previous weights.
+    """
+
+    def __init__(self, path=WEIGHTS_PATH, fallback=grads, interval=WEIGHTS_CHECK_INTERVAL):
+        self.path = path
+        self.weights = fallback
+        self.version = None
+        self.mtime = None
+        self.interval = interval
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def load(self):
+        with open(self.path, encoding="utf-8") as f:
+            body = json.load(f)
+        weights = {name: float(body["weights"][name]) for name in scoring.COMPONENTS}
+        if any(weight < 0 for weight in weights.values()):
+            raise ValueError("negative weight")
+        return weights, body.get("version")
+
+    def get(self):
+        now = time.monotonic()
+        if now - self.checked_at < self.interval:
+            return self.weights
+        with self.lock:
+            self.checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                return self.weights
+            if mtime != self.mtime:
+                self.mtime = mtime
+                try:
+                    self.weights, self.version = self.load()
+                    print(f"Loaded score weights version {self.version}: {self.weights}")
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    print(f"Keeping score weights version {self.version}, {self.path} is invalid: {e}")
+        return self.weights
+
+
+weights_file = WeightsFile()
+
+
+def classify_user_sentiment(user_mean_score):
+    if 0 <= user_mean_score < 0.05:
+        return "very negative"
+    elif 0.05 <= user_mean_score < 0.15:
+        return "negative"
+    elif 0.15 <= user_mean_score < 0.35:
+        return "neutral"
+    elif 0.35 <= user_mean_score < 0.75:
+        return "positive"
+    return "very positive"
+
+
+def mean(values):
+    return float(np.mean(values)) if len(values) else 0
+
+
+class AnalysisPipeline:
+    """Runs each model once over the scraped reviews and derives every score from that pass
+
+    Reviews are kept in a ReviewBatch, model outputs, engagement and final
+    scores are written straight into its columns. Near-duplicate reviews are
+    clustered first and each cluster goes through the models once.
+    """
+
+    def __init__(self, reviews=(), weights=None, store=None, max_votes=scoring.MAX_VOTES):
+        self.batch = reviews if isinstance(reviews, ReviewBatch) else ReviewBatch.from_dicts(list(reviews))
+        # the latest trained weights unless given
+        self.weights = weights if weights is not None else weights_file.get()
+        self.store = store
+        self.max_votes = max_votes
+        self.scored = 0
+        self.clusters = DuplicateClusters()
+        self.todo = None
+
+    def run(self):
+        """Score the reviews passed in, rank them and apply the final scores"""
+        self.score_pending()
+        return self.rank().apply()
+
+    def add(self, reviews):
+        """Score newly scraped reviews (dicts or a ReviewBatch), earlier ones keep their model outputs"""
+        self.batch.extend(reviews)
+        self.score_pending()
+        return self
+
+    def add_scored(self, batch):
+        """Add a ReviewBatch that already carries model scores, e.g. from a cached response"""
+        self.score_pending()
+        start = len(self.batch)
+        self.batch.extend(batch)
+        self.cluster_pending()
+        clusters, first = np.unique(self.clusters.ids[start:], return_index=True)
+        unscored = np.isnan(self.clusters.sent[clusters])
+        self.clusters.set_scores(clusters[unscored], batch.sent[first[unscored]], batch.plag[first[unscored]])
+        self.scored = len(self.batch)
+        return self
+
+    def cluster_pending(self):
+        if len(self.clusters) < len(self.batch):
+            self.clusters.add(self.batch.text[len(self.clusters):])
+
+    def pending_texts(self):
+        """Texts the models still have to score, one per near-duplicate cluster of the unscored reviews"""
+        self.cluster_pending()
+        clusters, first = np.unique(self.clusters.ids[self.scored:], return_index=True)
+        unscored = np.isnan(self.clusters.sent[clusters])
+        self.todo = clusters[unscored]
+        texts = self.batch.text[self.scored:]
+        return [texts[i] for i in first[unscored]]
+
+    def set_scores(self, sentiments, fakes):
+        """Scores of pending_texts(), fanned out to every review in their clusters"""
+        self.clusters.set_scores(self.todo, sentiments, fakes)
+        ids = self.clusters.ids[self.scored:]
+        if len(ids) > len(self.todo):
+            print(f"{len(ids)} reviews scored with {len(self.todo)} model inputs")
+        self.batch.set_column("sent", self.clusters.sent[ids], start=self.scored)
+        self.batch.set_column("plag", self.clusters.plag[ids], start=self.scored)
+        self.scored = len(self.batch)
+        self.todo = None
+
+    def score_pending(self):
+        self.set_scores(*self.score(self.pending_texts()))
+
+    def sort_by_page(self):
+        self.cluster_pending()
+        order = np.argsort(self.batch.page, kind="stable")
+        self.batch = self.batch.take(order)
+        self.clusters.take(order)
+
+    def match_products(self, slug, index=None):
+        """Near-duplicates of this product's reviews in the other indexed products, then index this one"""
+        index = index or get_index()
+        if index is None:
+            return self
+        self.cluster_pending()
+        try:
+            index.match_and_add(slug, self.clusters)
+        except Exception as e:
+            # the counts just stay per product
+            print(f"Dedupe index failed for {slug}: {type(e).__name__} {e}")
+        return self
+
+    def rank(self, total_ldr=None):
+        """ldr/eng/len scores of every review, engagement depends on all of them so this reruns as reviews arrive"""
+        batch = self.batch
+        engagement = scoring.engagement_scores(batch.likes, batch.dislikes, batch.length, self.max_votes, total_ldr)
+        for name, values in engagement.items():
+            batch.set_column(name, values)
+        if len(self.clusters) == len(batch):
+            batch.set_column("dup", self.clusters.counts())
+        return self
+
+    def apply(self):
+        """Weighted final_score of every review from its component columns"""
+        batch = self.batch
+        components = {name: getattr(batch, name) for name in scoring.COMPONENTS}
+        batch.set_column("final", scoring.final_scores(components, self.weights))
+        return self
+
+    def score(self, texts):
+        """Scores from the store where possible, only new texts go through the models"""
+        if self.store is None:
+            return score_reviews(texts)
+
+        cached = self.store.get_many(texts)
+        missing = [text for text, hit in zip(texts, cached) if hit is None]
+        sentiments, fakes = score_reviews(missing)
+        self.store.set_many(missing, sentiments, fakes)
+
+        fresh = iter(zip(sentiments, fakes))
+        scores = [hit if hit is not None else next(fresh) for hit in cached]
+        print(f"Scored {len(missing)} new reviews, {len(texts) - len(missing)} from cache")
+        return [i[0] for i in scores], [i[1] for i in scores]
+
+    def final_score(self, score):
+        final_score = sum(
+            weight * score.get(attr, 1)
+            for attr, weight in self.weights.items()
+        )
+        return min(final_score, 1.0)
+
+    @property
+    def sentiment_score(self):
+        return round(mean(self.batch.sent) * 100)
+
+    @property
+    def fake_ratio(self):
+        return round(mean(self.batch.plag > 0.5) * 100)
+
+    @property
+    def user_sentiment(self):
+        return classify_user_sentiment(mean(self.batch.final))
+
+    def aggregates(self):
+        return {
+            "ReviewsScraped": len(self.batch),
+            "SentimentScore": self.sentiment_score,
+            "UserSentiment": self.user_sentiment,
+            "FakeRatio": self.fake_ratio,
+        }
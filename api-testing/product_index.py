@@ -0,0 +1,341 @@
+import json
+import math
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+import numpy as np
+from dotenv import load_dotenv
+load_dotenv()
+
+PRODUCT_INDEX_BACKEND = os.getenv("PRODUCT_INDEX_BACKEND", "local")  # local | off (always scrape)
+PRODUCT_INDEX_PATH = os.getenv("PRODUCT_INDEX_PATH", "product-index.sqlite3")
+# snapshots of the built index, memory-mapped on load
+PRODUCT_INDEX_DIR = os.getenv("PRODUCT_INDEX_DIR", "product-index")
+# a changed catalog is rebuilt at most this often
+PRODUCT_INDEX_REFRESH = float(os.getenv("PRODUCT_INDEX_REFRESH", 60))
+# cosine similarity a result needs, below it the live search runs instead
+RELATED_MIN_SIMILARITY = float(os.getenv("RELATED_MIN_SIMILARITY", 0.3))
+RELATED_COUNT = 3
+# the RelatedItems shape the client renders, query results carry nothing else
+RELATED_FIELDS = ("title", "url", "image", "price")
+
+DIM = 512
+TABLES = 8
+BITS = 12
+# below this many items a query just scores all of them
+BRUTE_FORCE_LIMIT = 20000
+# review text counts for this much of an analysed product's vector, its title for the rest
+REVIEW_WEIGHT = 0.3
+# bigrams keep word order without letting a different variant ("15 128" vs "15 256") dominate
+BIGRAM_WEIGHT = 0.5
+
+rng = np.random.default_rng(7)
+HYPERPLANES = rng.standard_normal((TABLES * BITS, DIM)).astype(np.float32)
+BIT_VALUES = (1 << np.arange(BITS)).astype(np.int64)
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def features(text):
+    """Hashed unigram and bigram counts: {bucket: signed count}"""
+    words = WORD.findall(text.lower())
+    counts = {}
+    grams = [(word, 1.0) for word in words] + [(f"{a} {b}", BIGRAM_WEIGHT) for a, b in zip(words, words[1:])]
+    for gram, weight in grams:
+        h = zlib.crc32(gram.encode())
+        bucket, sign = h % DIM, 1 if h & (1 << 31) else -1
+        counts[bucket] = counts.get(bucket, 0) + sign * weight
+    return counts
+
+
+def vectorize(texts, idf):
+    """L2-normalised sublinear TF-IDF vectors, (len(texts), DIM) float32"""
+    out = np.zeros((len(texts), DIM), dtype=np.float32)
+    for row, text in zip(out, texts):
+        for bucket, count in features(text).items():
+            row[bucket] = math.copysign(1 + math.log(abs(count)) if abs(count) >= 1 else abs(count), count) * idf[bucket]
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    return out / np.where(norms == 0, 1, norms)
+
+
+def lsh_codes(vectors):
+    """(n, TABLES) bucket of every vector in every table, one bit per hyperplane side"""
+    bits = (vectors @ HYPERPLANES.T > 0).reshape(len(vectors), TABLES, BITS)
+    return bits @ BIT_VALUES
+
+
+def title_from_slug(slug):
+    return slug.replace("-", " ").replace("+", " ")
+
+
+class Snapshot:
+    """Immutable built index: vectors, LSH tables sorted by code, item metadata"""
+
+    def __init__(self, vectors, idf, items, codes=None):
+        self.vectors = vectors
+        self.idf = idf
+        self.items = items
+        self.codes = lsh_codes(vectors) if codes is None else codes
+        self.order = np.argsort(self.codes, axis=0, kind="stable")
+        self.sorted_codes = np.take_along_axis(self.codes, self.order, axis=0)
+
+    def __len__(self):
+        return len(self.items)
+
+    def candidates(self, query):
+        """Items sharing a bucket with the query, or one bit away from it, in any table"""
+        code = lsh_codes(query[None, :])[0]
+        found = []
+        for table in range(TABLES):
+            probes = np.concatenate([[code[table]], code[table] ^ BIT_VALUES])
+            left = np.searchsorted(self.sorted_codes[:, table], probes, side="left")
+            right = np.searchsorted(self.sorted_codes[:, table], probes, side="right")
+            for start, stop in zip(left.tolist(), right.tolist()):
+                found.append(self.order[start:stop, table])
+        return np.unique(np.concatenate(found)) if found else np.zeros(0, dtype=np.int64)
+
+    def query(self, text, k=RELATED_COUNT, min_similarity=RELATED_MIN_SIMILARITY, exclude=()):
+        if not len(self):
+            return []
+        query = vectorize([text], self.idf)[0]
+        ids = np.arange(len(self)) if len(self) <= BRUTE_FORCE_LIMIT else self.candidates(query)
+        if not len(ids):
+            return []
+        similarity = np.asarray(self.vectors[ids]) @ query
+        results, titles = [], set()
+        for i in np.argsort(-similarity).tolist():
+            if similarity[i] < min_similarity or len(results) == k:
+                break
+            item = self.items[ids[i]]
+            # analysed products have no listing (image, price) to show, they only shape the index
+            if item.get("source") == "analysed" or not item.get("image"):
+                continue
+            if item["url"] in exclude or item["title"].lower() in titles:
+                continue
+            titles.add(item["title"].lower())
+            results.append({field: item.get(field, "") for field in RELATED_FIELDS})
+        return results
+
+    def save(self, path):
+        os.makedirs(path)
+        np.save(os.path.join(path, "vectors.npy"), self.vectors)
+        np.save(os.path.join(path, "codes.npy"), self.codes)
+        np.save(os.path.join(path, "idf.npy"), self.idf)
+        with open(os.path.join(path, "items.json"), "w", encoding="utf-8") as f:
+            json.dump(self.items, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "items.json"), encoding="utf-8") as f:
+            items = json.load(f)
+        return cls(
+            np.load(os.path.join(path, "vectors.npy"), mmap_mode="r"),
+            np.load(os.path.join(path, "idf.npy")),
+            items,
+            np.load(os.path.join(path, "codes.npy")),
+        )
+
+
+class ProductIndex:
+    """Related items answered locally from the products seen so far
+
+    The catalog (SQLite) collects items returned by the live Amazon search and
+    every analysed product. Queries only return search listings, analysed
+    products just add their titles and reviews to the IDF weights.
+
+    Queries go to an immutable Snapshot built from the catalog, rebuilt on a
+    background thread when it changed and swapped in whole, so queries never
+    wait on a rebuild. The last snapshot is kept on disk and memory-mapped on
+    startup.
+    """
+
+    def __init__(self, path=PRODUCT_INDEX_PATH, snapshot_dir=PRODUCT_INDEX_DIR, refresh_interval=PRODUCT_INDEX_REFRESH):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS items (url TEXT PRIMARY KEY, slug TEXT, title TEXT, image TEXT, price TEXT, "
+            "text TEXT, source TEXT, seen_at REAL)"
+        )
+        self.snapshot_dir = snapshot_dir
+        self.refresh_interval = refresh_interval
+        self.snapshot = self.load_snapshot()
+        self.dirty = False
+        self.built_at = 0.0
+        self.refreshing = None
+
+    def load_snapshot(self):
+        try:
+            with open(os.path.join(self.snapshot_dir, "current"), encoding="utf-8") as f:
+                snapshot = Snapshot.load(os.path.join(self.snapshot_dir, f.read().strip()))
+            print(f"Loaded product index with {len(snapshot)} items")
+            return snapshot
+        except (OSError, ValueError) as e:
+            print(f"No product index snapshot yet: {e}")
+            return Snapshot(np.zeros((0, DIM), dtype=np.float32), np.ones(DIM, dtype=np.float32), [])
+
+    def add_items(self, items, source="amazon"):
+        """Related items from a live search"""
+        now = time.time()
+        rows = [
+            (item["url"], None, item["title"], item.get("image", ""), item.get("price", ""), "", source, now)
+            for item in items if item.get("url") and item.get("title")
+        ]
+        self.upsert(rows)
+
+    def add_product(self, url, slug, reviews=()):
+        """An analysed product, its reviews flavour the vector but the title dominates"""
+        text = " ".join(reviews)[:5000]
+        self.upsert([(url, slug, title_from_slug(slug), "", "", text, "analysed", time.time())])
+
+    def upsert(self, rows):
+        if not rows:
+            return
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (url) DO UPDATE SET "
+                "title = excluded.title, image = excluded.image, price = excluded.price, "
+                "text = excluded.text, seen_at = excluded.seen_at",
+                rows,
+            )
+        self.dirty = True
+        self.schedule_refresh()
+
+    def schedule_refresh(self):
+        """Rebuild in the background if the catalog changed, at most once per refresh interval"""
+        with self.lock:
+            if self.refreshing is not None and self.refreshing.is_alive():
+                return
+            delay = max(0.0, self.built_at + self.refresh_interval - time.time())
+            self.refreshing = threading.Timer(delay, self.refresh)
+            self.refreshing.daemon = True
+            self.refreshing.start()
+
+    def refresh(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        start = time.perf_counter()
+        try:
+            snapshot = self.build()
+            self.save(snapshot)
+        except Exception as e:
+            self.dirty = True
+            print(f"Product index rebuild failed: {type(e).__name__} {e}")
+            return
+        self.snapshot = snapshot
+        self.built_at = time.time()
+        print(f"Rebuilt product index with {len(snapshot)} items in {time.perf_counter() - start:.2f}s")
+
+        # items upserted during the build found this timer still running and didn't schedule one
+        with self.lock:
+            self.refreshing = None
+        if self.dirty:
+            self.schedule_refresh()
+
+    def build(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT url, title, image, price, text, source FROM items").fetchall()
+        titles = [row[1] for row in rows]
+        texts = [row[4] or "" for row in rows]
+
+        # document frequency per hashed bucket over titles and review text
+        df = np.zeros(DIM, dtype=np.float64)
+        for title, text in zip(titles, texts):
+            df[list(features(f"{title} {text}"))] += 1
+        idf = np.log((len(rows) + 1) / (df + 1)).astype(np.float32) + 1
+
+        vectors = vectorize(titles, idf)
+        with_text = [i for i, text in enumerate(texts) if text]
+        if with_text:
+            reviews = vectorize([texts[i] for i in with_text], idf)
+            vectors[with_text] = (1 - REVIEW_WEIGHT) * vectors[with_text] + REVIEW_WEIGHT * reviews
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.where(norms == 0, 1, norms)
+
+        items = [
+            {"title": title, "url": url, "image": image or "", "price": price or "", "source": source}
+            for url, title, image, price, _, source in rows
+        ]
+        return Snapshot(vectors, idf, items)
+
+    def save(self, snapshot):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        name = uuid.uuid4().hex
+        snapshot.save(os.path.join(self.snapshot_dir, name))
+        tmp = os.path.join(self.snapshot_dir, "current.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(name)
+        os.replace(tmp, os.path.join(self.snapshot_dir, "current"))
+        # older builds may still be mapped by a running snapshot, only the ones before that go
+        builds = sorted(
+            (entry for entry in os.scandir(self.snapshot_dir) if entry.is_dir() and entry.name != name),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in builds[:-1]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+    def query(self, text, k=RELATED_COUNT, exclude=()):
+        return self.snapshot.query(text, k, exclude=set(exclude))
+
+
+product_index = None
+product_index_lock = threading.Lock()
+
+
+def get_product_index(backend=PRODUCT_INDEX_BACKEND):
+    """Process-wide index, None when turned off"""
+    global product_index
+    if backend != "local":
+        return None
+    with product_index_lock:
+        if product_index is None:
+            product_index = ProductIndex()
+        return product_index
+
+
+if __name__ == "__main__":
+    # query latency on a synthetic catalog, brute force and LSH
+    import random
+    import sys
+    import tempfile
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rand = random.Random(0)
+    brands = ["apple", "samsung", "oneplus", "redmi", "realme", "vivo", "oppo", "nokia", "motorola", "iqoo"]
+    kinds = ["phone", "earbuds", "charger", "case", "watch", "tablet", "laptop", "speaker", "cable", "power bank"]
+    colors = ["black", "blue", "white", "green", "red", "silver"]
+    models = [f"{rand.choice(['pro', 'max', 'lite', 'neo', 'plus', 'ultra'])} {rand.randint(1, 60)}" for _ in range(2000)]
+
+    def title():
+        return f"{rand.choice(brands)} {rand.choice(models)} {rand.choice(kinds)} {rand.choice(colors)} {rand.choice([64, 128, 256])} gb"
+
+    titles = [title() for _ in range(count)]
+    df = np.zeros(DIM)
+    for t in titles[:20000]:
+        df[list(features(t))] += 1
+    idf = (np.log((20001) / (df + 1)) + 1).astype(np.float32)
+    start = time.perf_counter()
+    vectors = vectorize(titles, idf)
+    print(f"vectorised {count} titles in {time.perf_counter() - start:.2f}s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        items = [{"title": t, "url": f"u{i}", "image": f"i{i}", "price": "", "source": "amazon"} for i, t in enumerate(titles)]
+        Snapshot(vectors, idf, items).save(os.path.join(tmp, "s"))
+        start = time.perf_counter()
+        snapshot = Snapshot.load(os.path.join(tmp, "s"))
+        print(f"loaded (mmap) in {time.perf_counter() - start:.2f}s")
+
+        queries = [titles[rand.randrange(count)] for _ in range(200)]
+        for name, limit in (("brute force", count + 1), ("lsh", 0)):
+            BRUTE_FORCE_LIMIT = limit
+            start = time.perf_counter()
+            results = [snapshot.query(q, min_similarity=0) for q in queries]
+            elapsed = (time.perf_counter() - start) / len(queries)
+            found = np.mean([bool(r) and r[0]["title"] == q for r, q in zip(results, queries)])
+            print(f"{name:<12} {elapsed * 1000:.2f}ms per query, exact title ranked first {found:.0%}")
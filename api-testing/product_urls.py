@@ -0,0 +1,7 @@
+import urllib.parse
+
+
+def get_uuid(url):
+    """Product slug of a review URL, the first path segment"""
+    parsed_url = urllib.parse.urlparse(url)
+    return parsed_url.path.strip("/").split("/")[0]
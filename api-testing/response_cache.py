@@ -0,0 +1,122 @@
+import asyncio
+import base64
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from dotenv import load_dotenv
+load_dotenv()
+
+from score_cache import MODEL_DIGEST
+from review_batch import ReviewBatch
+
+# bump whenever the shape of the /analyse response or the payload changes
+SCHEMA_VERSION = 4
+RESPONSE_TTL = int(os.getenv("RESPONSE_TTL", 6 * 3600))
+RESPONSE_STALE_TTL = int(os.getenv("RESPONSE_STALE_TTL", 7 * 24 * 3600))
+REFRESH_LOCK_TTL = int(os.getenv("REFRESH_LOCK_TTL", 300))
+
+
+def encode_payload(payload):
+    """JSON for everything but the reviews, which go in ReviewBatch's binary form after it"""
+    data = payload["data"]
+    header = json.dumps({**payload, "data": {k: v for k, v in data.items() if k != "Reviews"}}).encode()
+    body = struct.pack("<I", len(header)) + header + data["Reviews"].to_bytes()
+    return base64.b64encode(zlib.compress(body)).decode()
+
+def decode_payload(raw):
+    body = zlib.decompress(base64.b64decode(raw))
+    (length,) = struct.unpack_from("<I", body)
+    payload = json.loads(body[4:4 + length])
+    payload["data"]["Reviews"] = ReviewBatch.from_bytes(body[4 + length:])
+    return payload
+
+
+class ResponseCache:
+    """Versioned /analyse response cache with per-entry TTL and stale-while-revalidate
+
+    Each entry also keeps the scrape state of its product (see
+    incremental.py) so a refresh only has to fetch the newest reviews.
+    """
+
+    def __init__(self, redis, ttl=RESPONSE_TTL, stale_ttl=RESPONSE_STALE_TTL, version=SCHEMA_VERSION):
+        self.redis = redis
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.prefix = f"analysis:v{version}:{MODEL_DIGEST[:8]}"
+        self.stats = Counter(hits=0, misses=0, stale=0, refreshes=0, refresh_errors=0)
+        self.stats_lock = threading.Lock()
+
+    def key(self, slug):
+        return f"{self.prefix}:{slug}"
+
+    def count(self, name):
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    def load(self, slug):
+        try:
+            raw = self.redis.get(self.key(slug))
+            return decode_payload(raw) if raw else None
+        except Exception as e:
+            print(f"Response cache read failed: {e}")
+            return None
+
+    def get(self, slug):
+        """Returns (data, state) where state is "fresh", "stale" or None on a miss"""
+        entry = self.load(slug)
+        if entry is None:
+            self.count("misses")
+            return None, None
+        if time.time() - entry["created_at"] < self.ttl:
+            self.count("hits")
+            return entry["data"], "fresh"
+        self.count("stale")
+        return entry["data"], "stale"
+
+    def peek(self, slug):
+        """Fresh data or None, without touching the counters"""
+        entry = self.load(slug)
+        if entry is not None and time.time() - entry["created_at"] < self.ttl:
+            return entry["data"]
+        return None
+
+    def set(self, slug, data, scrape=None):
+        entry = {"created_at": time.time(), "data": data, "scrape": scrape}
+        try:
+            # the entry outlives its TTL by the stale window, after that it is a plain miss
+            self.redis.set(self.key(slug), encode_payload(entry), ex=self.ttl + self.stale_ttl)
+        except Exception as e:
+            print(f"Response cache write failed: {e}")
+
+    def claim_refresh(self, slug):
+        """Only one caller across all workers gets to refresh a stale entry"""
+        try:
+            return bool(self.redis.set(f"{self.key(slug)}:refreshing", 1, nx=True, ex=REFRESH_LOCK_TTL))
+        except Exception as e:
+            print(f"Response cache refresh lock failed: {e}")
+            return False
+
+    async def refresh(self, slug, compute):
+        """Re-run the async `compute` -> (data, scrape state) and replace the entry, meant to run as a background task"""
+        self.count("refreshes")
+        try:
+            await asyncio.to_thread(self.set, slug, *await compute())
+        except Exception as e:
+            self.count("refresh_errors")
+            print(f"Background refresh of {slug} failed: {e}")
+        finally:
+            await asyncio.to_thread(self.release_refresh, slug)
+
+    def release_refresh(self, slug):
+        try:
+            self.redis.delete(f"{self.key(slug)}:refreshing")
+        except Exception as e:
+            print(f"Response cache refresh unlock failed: {e}")
+
+    def metrics(self):
+        with self.stats_lock:
+            return dict(self.stats)
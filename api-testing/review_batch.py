@@ -0,0 +1,200 @@
+import json
+import struct
+import numpy as np
+
+# numeric columns and their dtypes, scraped fields first, then model and engagement scores
+NUMERIC = {
+    "likes": np.int64,
+    "dislikes": np.int64,
+    "length": np.int64,
+    "page": np.int32,
+    "sent": np.float64,
+    "plag": np.float64,
+    "dup": np.int64,
+    "ldr": np.float64,
+    "eng": np.float64,
+    "len": np.float64,
+    "final": np.float64,
+}
+STRINGS = ("text", "user", "rating", "time")
+MAGIC = b"RVB2"
+
+
+class ReviewBatch:
+    """Reviews of one product stored column-wise
+
+    Numeric columns live in preallocated NumPy arrays that grow by doubling,
+    so appending a scraped page doesn't copy the reviews before it and the
+    scoring code reads `batch.likes`, `batch.sent`, ... as views. Strings stay
+    in plain lists. Dicts in the shape of the /analyse response are only
+    built by `to_dicts`.
+    """
+
+    __slots__ = ("size", "capacity", "columns", "text", "user", "rating", "time")
+
+    def __init__(self, capacity=64):
+        self.size = 0
+        self.capacity = capacity
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in NUMERIC.items()}
+        self.text = []
+        self.user = []
+        self.rating = []
+        self.time = []
+
+    def __len__(self):
+        return self.size
+
+    def __getattr__(self, name):
+        # only called for names not in __slots__, i.e. the numeric columns
+        if name in NUMERIC:
+            return self.columns[name][:self.size]
+        raise AttributeError(name)
+
+    def reserve(self, extra):
+        if self.size + extra <= self.capacity:
+            return
+        while self.capacity < self.size + extra:
+            self.capacity *= 2
+        for name, column in self.columns.items():
+            grown = np.zeros(self.capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+
+    def append(self, review):
+        """Add one scraped review dict, any scores it carries are copied too"""
+        return self.extend([review])
+
+    def extend(self, reviews):
+        """Add a list of review dicts or another ReviewBatch"""
+        count = len(reviews)
+        self.reserve(count)
+        start, stop = self.size, self.size + count
+
+        if isinstance(reviews, ReviewBatch):
+            for name in NUMERIC:
+                self.columns[name][start:stop] = getattr(reviews, name)
+            for name in STRINGS:
+                getattr(self, name).extend(getattr(reviews, name))
+        else:
+            # one list per column, then a single slice assignment per column
+            scores = [review.get("score", {}) for review in reviews]
+            values = {
+                "likes": [int(i["ldr"][0]) for i in reviews],
+                "dislikes": [int(i["ldr"][1]) for i in reviews],
+                "length": [len(i["review"]) for i in reviews],
+                "page": [i.get("page", 0) for i in reviews],
+                "final": [i.get("final_score", 0.0) for i in reviews],
+                "dup": [score.get("dup", 1) for score in scores],
+            }
+            for name in ("sent", "plag", "ldr", "eng", "len"):
+                values[name] = [score.get(name, 0.0) for score in scores]
+            for name, column in values.items():
+                self.columns[name][start:stop] = column
+            self.text.extend(i["review"] for i in reviews)
+            # the scrapers set None for a missing name, rating or date, stored as "" (no rating is "" too)
+            self.user.extend(i.get("user") or "" for i in reviews)
+            self.rating.extend(i.get("rating") or "" for i in reviews)
+            self.time.extend(i.get("time") or "" for i in reviews)
+
+        self.size = stop
+        return self
+
+    @classmethod
+    def from_dicts(cls, reviews):
+        return cls(max(len(reviews), 1)).extend(reviews)
+
+    def set_column(self, name, values, start=0):
+        self.columns[name][start:self.size] = values
+
+    def take(self, order):
+        """New batch with the rows in `order`"""
+        batch = ReviewBatch(max(len(order), 1))
+        for name in NUMERIC:
+            batch.columns[name][:len(order)] = getattr(self, name)[order]
+        for name in STRINGS:
+            column = getattr(self, name)
+            setattr(batch, name, [column[i] for i in order])
+        batch.size = len(order)
+        return batch
+
+    def to_dicts(self, start=0, stop=None):
+        """Rows as /analyse response dicts, only for the response boundary"""
+        stop = self.size if stop is None else stop
+        columns = [getattr(self, name)[start:stop].tolist() for name in ("likes", "dislikes", "ldr", "eng", "len", "sent", "plag", "dup", "final")]
+        return [
+            {
+                "review": text,
+                "user": user,
+                "rating": rating,
+                "time": time,
+                "ldr": [str(likes), str(dislikes)],
+                "score": {"ldr": ldr, "eng": eng, "len": length, "sent": sent, "plag": plag, "dup": dup},
+                "sentiment": sent,
+                "final_score": final,
+            }
+            for text, user, rating, time, likes, dislikes, ldr, eng, length, sent, plag, dup, final in zip(
+                self.text[start:stop], self.user[start:stop], self.rating[start:stop], self.time[start:stop], *columns
+            )
+        ]
+
+    def to_bytes(self):
+        """Compact binary form: header, raw little-endian numeric columns, then offset-indexed UTF-8 strings"""
+        parts = [MAGIC, struct.pack("<I", self.size)]
+        for name, dtype in NUMERIC.items():
+            parts.append(getattr(self, name).astype(np.dtype(dtype).newbyteorder("<"), copy=False).tobytes())
+        for name in STRINGS:
+            encoded = [value.encode() for value in getattr(self, name)]
+            offsets = np.zeros(self.size + 1, dtype="<i8")
+            np.cumsum([len(i) for i in encoded], out=offsets[1:])
+            parts.append(offsets.tobytes())
+            parts.append(b"".join(encoded))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, raw):
+        if raw[:4] != MAGIC:
+            raise ValueError("not a ReviewBatch payload")
+        (size,) = struct.unpack_from("<I", raw, 4)
+        position = 8
+        batch = cls(max(size, 1))
+        for name, dtype in NUMERIC.items():
+            dtype = np.dtype(dtype).newbyteorder("<")
+            batch.columns[name][:size] = np.frombuffer(raw, dtype=dtype, count=size, offset=position)
+            position += size * dtype.itemsize
+        for name in STRINGS:
+            offsets = np.frombuffer(raw, dtype="<i8", count=size + 1, offset=position).tolist()
+            position += (size + 1) * 8
+            blob = raw[position:position + offsets[-1]]
+            position += offsets[-1]
+            setattr(batch, name, [blob[offsets[i]:offsets[i + 1]].decode() for i in range(size)])
+        batch.size = size
+        return batch
+
+
+if __name__ == "__main__":
+    # round trip and size against the JSON list of dicts it replaces
+    import random
+    import zlib
+
+    rng = random.Random(0)
+    reviews = [
+        {
+            "review": " ".join(rng.choice(["good", "bad", "phone", "battery", "worth"]) for _ in range(rng.randint(3, 60))),
+            "user": f"user {rng.randint(0, 999)}",
+            "rating": str(rng.randint(1, 5)),
+            "time": "3 months ago",
+            "ldr": [str(rng.randint(0, 300)), str(rng.randint(0, 40))],
+            "score": {"ldr": rng.random(), "eng": rng.random(), "len": rng.random(), "sent": rng.random(), "plag": rng.random(), "dup": rng.randint(1, 9)},
+        }
+        for _ in range(5000)
+    ]
+    for review in reviews:
+        review["sentiment"] = review["score"]["sent"]
+        review["final_score"] = rng.random()
+
+    batch = ReviewBatch.from_dicts(reviews)
+    restored = ReviewBatch.from_bytes(batch.to_bytes())
+    assert restored.to_dicts() == reviews
+    as_json = len(zlib.compress(json.dumps(reviews).encode()))
+    as_batch = len(zlib.compress(batch.to_bytes()))
+    print(f"{len(reviews)} reviews: JSON {as_json} bytes, ReviewBatch {as_batch} bytes (zlib)")
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from dotenv import load_dotenv
+load_dotenv()
+
+from model_test import MODEL_PATHS, MODEL_RUNTIME, PADDING_VERSION
+
+SCORE_CACHE_BACKEND = os.getenv("SCORE_CACHE_BACKEND", "sqlite")  # sqlite | redis | off
+SCORE_CACHE_PATH = os.getenv("SCORE_CACHE_PATH", "score-cache.sqlite3")
+SCORE_CACHE_TTL = int(os.getenv("SCORE_CACHE_TTL", 30 * 24 * 3600))
+CHUNK_SIZE = 500
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def model_digest(*paths, runtime="torch", padding=""):
+    """Combined digest of the model files, part of every key so retrained models never hit old scores
+
+    The runtime and the padding scheme are part of it too, both change the
+    scores: int8 and ONNX differ slightly from float32, and the models don't
+    mask padding.
+    """
+    key = "\0".join([runtime, padding, *(file_digest(p) for p in paths)])
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+# the files of the runtime that actually serves, (check_fake, sentiment)
+MODEL_DIGEST = model_digest(*MODEL_PATHS[MODEL_RUNTIME], runtime=MODEL_RUNTIME, padding=PADDING_VERSION)
+
+
+def chunks(items, size=CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class SQLiteScoreBackend:
+    """Local on-disk backend, rows from other model digests are dropped on open"""
+
+    def __init__(self, path=SCORE_CACHE_PATH, digest=MODEL_DIGEST):
+        self.digest = digest
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, digest TEXT, sent REAL, plag REAL)"
+        )
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM scores WHERE digest != ?", (digest,))
+
+    def get_many(self, keys):
+        found = {}
+        with self.lock:
+            for chunk in chunks(keys):
+                rows = self.conn.execute(
+                    f"SELECT key, sent, plag FROM scores WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for key, sent, plag in rows:
+                    found[key] = (sent, plag)
+        return found
+
+    def set_many(self, items):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?)",
+                [(key, self.digest, sent, plag) for key, (sent, plag) in items.items()],
+            )
+
+
+class RedisScoreBackend:
+    """Shared backend on the Upstash client, stale digests simply age out through the TTL"""
+
+    def __init__(self, redis, ttl=SCORE_CACHE_TTL):
+        self.redis = redis
+        self.ttl = ttl
+
+    def get_many(self, keys):
+        found = {}
+        for chunk in chunks(keys):
+            for key, value in zip(chunk, self.redis.mget(*chunk)):
+                if value is not None:
+                    found[key] = tuple(json.loads(value))
+        return found
+
+    def set_many(self, items):
+        for chunk in chunks(list(items.items())):
+            pipe = self.redis.pipeline()
+            for key, scores in chunk:
+                pipe.set(key, json.dumps(scores), ex=self.ttl)
+            pipe.exec()
+
+
+class ScoreStore:
+    """Content-addressed (sentiment, fake) scores keyed by review text + model digest"""
+
+    def __init__(self, backend, digest=MODEL_DIGEST):
+        self.backend = backend
+        self.digest = digest
+
+    def key(self, text):
+        return "score:" + hashlib.sha256(f"{self.digest}\0{text}".encode()).hexdigest()
+
+    def get_many(self, texts):
+        """Returns a (sent, plag) tuple or None for every text"""
+        keys = [self.key(text) for text in texts]
+        try:
+            found = self.backend.get_many(list(dict.fromkeys(keys)))
+        except Exception as e:
+            print(f"Score cache read failed: {e}")
+            found = {}
+        return [found.get(key) for key in keys]
+
+    def set_many(self, texts, sentiments, fakes):
+        items = {
+            self.key(text): (sent, plag)
+            for text, sent, plag in zip(texts, sentiments, fakes)
+        }
+        try:
+            self.backend.set_many(items)
+        except Exception as e:
+            print(f"Score cache write failed: {e}")
+
+
+def make_score_store(backend=SCORE_CACHE_BACKEND, redis=None):
+    if backend == "sqlite":
+        return ScoreStore(SQLiteScoreBackend())
+    if backend == "redis" and redis is not None:
+        return ScoreStore(RedisScoreBackend(redis))
+    return None
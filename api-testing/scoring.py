@@ -0,0 +1,88 @@
+import numpy as np
+
+# column order of the weight vector and the component matrix
+COMPONENTS = ("ldr", "eng", "len", "sent", "plag")
+MAX_VOTES = 10
+LENGTH_CAP = 300
+
+
+def weight_vector(weights):
+    """Weights dict -> vector in COMPONENTS order, missing components weigh nothing"""
+    return np.array([weights.get(name, 0.0) for name in COMPONENTS], dtype=np.float64)
+
+
+def parse_reviews(reviews):
+    """Scraped review dicts -> (likes, dislikes, length) arrays, each field parsed once"""
+    n = len(reviews)
+    likes = np.fromiter((int(i["ldr"][0]) for i in reviews), dtype=np.int64, count=n)
+    dislikes = np.fromiter((int(i["ldr"][1]) for i in reviews), dtype=np.int64, count=n)
+    length = np.fromiter((len(i["review"]) for i in reviews), dtype=np.int64, count=n)
+    return likes, dislikes, length
+
+
+def total_ldr(likes, dislikes):
+    total_likes, total_dislikes = int(likes.sum()), int(dislikes.sum())
+    votes = total_likes + total_dislikes
+    return (total_likes - total_dislikes) / votes if votes else 0
+
+
+def engagement_scores(likes, dislikes, length, max_votes=MAX_VOTES, total=None):
+    """Columnar rank_reviews: ldr alignment, engagement and length score per review
+
+    Same rules as the dict version, reviews without votes get 0 for ldr and eng.
+    """
+    if total is None:
+        total = total_ldr(likes, dislikes)
+
+    votes = likes + dislikes
+    has_votes = votes > 0
+    item_ldr = np.divide(likes - dislikes, votes, out=np.zeros(len(votes)), where=has_votes)
+
+    ldr = np.where(has_votes, 1 - np.abs(item_ldr - total), 0.0)
+    eng = np.where(has_votes, np.minimum(votes / max_votes, 1.0), 0.0)
+    length_score = np.minimum(length / LENGTH_CAP, 1.0)
+    return {"ldr": ldr, "eng": eng, "len": length_score}
+
+
+def final_scores(components, weights):
+    """Weighted sum of every component column capped at 1, `components` maps COMPONENTS names to arrays"""
+    matrix = np.stack([np.asarray(components[name], dtype=np.float64) for name in COMPONENTS])
+    return np.minimum(weight_vector(weights) @ matrix, 1.0)
+
+
+if __name__ == "__main__":
+    # parity with the dict-based rank_reviews + AnalysisPipeline.final_score
+    import copy
+    import random
+
+    from sel_multithread import rank_reviews
+    from pipeline import AnalysisPipeline, grads
+
+    rng = random.Random(0)
+    reviews = [
+        {
+            "review": "x" * rng.randint(1, 600),
+            "ldr": [str(rng.choice([0, rng.randint(0, 500)])), str(rng.choice([0, rng.randint(0, 80)]))],
+        }
+        for _ in range(20000)
+    ]
+    sentiments = [rng.random() for _ in reviews]
+    fakes = [rng.random() for _ in reviews]
+
+    expected = rank_reviews(copy.deepcopy(reviews))
+    scorer = AnalysisPipeline(weights=grads)
+    for review, sent, plag in zip(expected, sentiments, fakes):
+        review["score"].update(sent=sent, plag=plag)
+        review["final_score"] = scorer.final_score(review["score"])
+
+    components = engagement_scores(*parse_reviews(reviews))
+    components.update(sent=sentiments, plag=fakes)
+    final = final_scores(components, grads)
+
+    worst = 0.0
+    for i, review in enumerate(expected):
+        for name in ("ldr", "eng", "len"):
+            worst = max(worst, abs(review["score"][name] - components[name][i]))
+        worst = max(worst, abs(review["final_score"] - final[i]))
+    print(f"{len(reviews)} reviews, max abs difference {worst:.2e}")
+    assert worst < 1e-12
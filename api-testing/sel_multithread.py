@@ -1,27 +1,19 @@
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import time
 import json
+import os
 import re
 from concurrent.futures import ThreadPoolExecutor
-from model_test import get_sentiment, fake_check
+from pipeline import AnalysisPipeline
+from driver_pool import driver_pool
+from dotenv import load_dotenv
+load_dotenv()
 
-
-def setup_driver():
-    chrome_options = Options()
-    chrome_options.add_argument(
-        "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
-    )
-    chrome_options.add_argument("--accept-language=en-US,en;q=0.9")
-
-    chrome_options.add_argument("--headless")
-
-    driver = webdriver.Chrome(options=chrome_options)
-    return driver
+# auto | http | selenium
+SCRAPER_BACKEND = os.getenv("SCRAPER_BACKEND", "auto")
 
 
 def clean_text(text):
@@ -53,148 +45,134 @@ def get_total_pages(driver):
         return 1
 
 
-def scrape_pages_range(base_url, start_page, end_page, thread_id, max_empty_pages=3):
-    """Scrape a range of pages assigned to a specific thread"""
-    thread_reviews = []
-    driver = setup_driver()
-    consecutive_empty_pages = 0
+def scrape_page(driver, base_url, page, thread_id=None):
+    """Scrape the reviews on a single page, empty if no review containers load"""
+    paged_url = f"{base_url}&page={page}"
+    driver.get(paged_url)
+    driver_pool.page_loaded(driver)
 
-    # refreshed_already = defaultdict(bool)
+    wait = WebDriverWait(driver, 3)
 
     try:
-        # page = start_page
-        for page in range(start_page, end_page + 1):
-            paged_url = f"{base_url}&page={page}"
-            driver.get(paged_url)
+        wait.until(
+            EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.EKFha-"))
+        )
+    except TimeoutException:
+        return []
 
-            wait = WebDriverWait(driver, 3)
+    # Find all review containers
+    review_containers = driver.find_elements(By.CSS_SELECTOR, "div.EKFha-")
 
+    page_reviews = []
+    for container in review_containers:
+        try:
+            # Review text
+            review_text = None
             try:
-                wait.until(
-                    EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.EKFha-"))
+                raw_block = container.find_element(
+                    By.CSS_SELECTOR, "div.ZmyHeo"
                 )
-            except TimeoutException:
-                # print(sum(refreshed_already.values()))
-                # print(f"Thread {thread_id}: No reviews found on page {page}")
-                # if not refreshed_already[page]:
-                #     print('Refreshing', page)
-                #     driver.refresh()
-                #     refreshed_already[page] = True
-                #     consecutive_empty_pages = 0
-                # else:
-                #     page += 1
-                #     consecutive_empty_pages += 1
-                consecutive_empty_pages += 1
-
-                if consecutive_empty_pages >= max_empty_pages:
-                    break
-
-                continue
+                review_text = clean_text(raw_block.text)
+            except NoSuchElementException:
+                pass
 
-            # Find all review containers
-            review_containers = driver.find_elements(By.CSS_SELECTOR, "div.EKFha-")
-
-            # Check if containers actually have content
-            page_reviews_count = 0
-            for container in review_containers:
-                try:
-                    # Review text
-                    review_text = None
-                    try:
-                        raw_block = container.find_element(
-                            By.CSS_SELECTOR, "div.ZmyHeo"
-                        )
-                        review_text = clean_text(raw_block.text)
-                    except NoSuchElementException:
-                        pass
-
-                    # Rating
-                    rating = None
-                    try:
-                        rating_div = container.find_element(
-                            By.CSS_SELECTOR, "div.XQDdHH.Ga3i8K"
-                        )
-                        rating = rating_div.text.strip()
-                    except NoSuchElementException:
-                        pass
-
-                    # Reviewer name and time info
-                    reviewer_name = None
-                    time_info = None
-
-                    try:
-                        p_tags = container.find_elements(By.CSS_SELECTOR, "p._2NsDsF")
-                        for p in p_tags:
-                            class_list = p.get_attribute("class").split()
-                            if "AwS1CA" in class_list:
-                                reviewer_name = p.text.strip()
-                            elif len(class_list) == 1:
-                                time_info = p.text.strip()
-                    except NoSuchElementException:
-                        pass
-
-                    ldr = None
-                    try:
-                        ldr_tags = container.find_elements(
-                            By.CSS_SELECTOR, "div._6kK6mk"
-                        )
-                        likes = 0
-                        dislikes = 0
-                        for div in ldr_tags:
-                            div_list = div.get_attribute("class").split()
-                            if "_6kK6mk" in div_list and "aQymJL" in div_list:
-                                dislikes = div.text.strip()
-                            elif "_6kK6mk" in div_list and "aQymJL" not in div_list:
-                                likes = div.text.strip()
-                        ldr = [likes, dislikes]
-                    except NoSuchElementException:
-                        pass
-
-                    # Only add review if we have review text
-                    if review_text:
-                        thread_reviews.append(
-                            {
-                                "review": review_text,
-                                "user": reviewer_name,
-                                "rating": rating,
-                                "time": time_info,
-                                "page": page,
-                                "ldr": ldr,
-                                "thread_id": thread_id,
-                            }
-                        )
-                        page_reviews_count += 1
+            # Rating
+            rating = None
+            try:
+                rating_div = container.find_element(
+                    By.CSS_SELECTOR, "div.XQDdHH.Ga3i8K"
+                )
+                rating = rating_div.text.strip()
+            except NoSuchElementException:
+                pass
 
-                except Exception as e:
-                    print(
-                        f"Thread {thread_id}: Error parsing review on page {page}: {e}"
-                    )
-                    continue
+            # Reviewer name and time info
+            reviewer_name = None
+            time_info = None
 
-            # Check if this page had any actual reviews
-            if page_reviews_count == 0:
-                consecutive_empty_pages += 1
-                print(
-                    f"Thread {thread_id}: Page {page} had no valid reviews (empty page {consecutive_empty_pages})"
+            try:
+                p_tags = container.find_elements(By.CSS_SELECTOR, "p._2NsDsF")
+                for p in p_tags:
+                    class_list = p.get_attribute("class").split()
+                    if "AwS1CA" in class_list:
+                        reviewer_name = p.text.strip()
+                    elif len(class_list) == 1:
+                        time_info = p.text.strip()
+            except NoSuchElementException:
+                pass
+
+            ldr = None
+            try:
+                ldr_tags = container.find_elements(
+                    By.CSS_SELECTOR, "div._6kK6mk"
                 )
+                likes = 0
+                dislikes = 0
+                for div in ldr_tags:
+                    div_list = div.get_attribute("class").split()
+                    if "_6kK6mk" in div_list and "aQymJL" in div_list:
+                        dislikes = div.text.strip()
+                    elif "_6kK6mk" in div_list and "aQymJL" not in div_list:
+                        likes = div.text.strip()
+                ldr = [likes, dislikes]
+            except NoSuchElementException:
+                pass
+
+            # Only add review if we have review text
+            if review_text:
+                page_reviews.append(
+                    {
+                        "review": review_text,
+                        "user": reviewer_name,
+                        "rating": rating,
+                        "time": time_info,
+                        "page": page,
+                        "ldr": ldr,
+                        "thread_id": thread_id,
+                    }
+                )
+
+        except Exception as e:
+            print(
+                f"Thread {thread_id}: Error parsing review on page {page}: {e}"
+            )
+            continue
+
+    return page_reviews
 
-                # If we hit too many empty pages in a row, stop scraping
-                if consecutive_empty_pages >= max_empty_pages:
+
+def scrape_pages_range(base_url, start_page, end_page, thread_id, max_empty_pages=3):
+    """Scrape a range of pages assigned to a specific thread"""
+    thread_reviews = []
+    consecutive_empty_pages = 0
+
+    with driver_pool.lease() as driver:
+        try:
+            for page in range(start_page, end_page + 1):
+                page_reviews = scrape_page(driver, base_url, page, thread_id)
+                thread_reviews.extend(page_reviews)
+
+                # Check if this page had any actual reviews
+                if not page_reviews:
+                    consecutive_empty_pages += 1
                     print(
-                        f"Thread {thread_id}: Found {consecutive_empty_pages} consecutive empty pages, stopping early at page {page}"
+                        f"Thread {thread_id}: Page {page} had no valid reviews (empty page {consecutive_empty_pages})"
                     )
-                    break
-            else:
-                consecutive_empty_pages = 0
-                print(
-                    f"Thread {thread_id}: Completed page {page}, found {page_reviews_count} reviews"
-                )
 
-    except Exception as e:
-        print(f"Thread {thread_id}: Error in scraping: {e}")
+                    # If we hit too many empty pages in a row, stop scraping
+                    if consecutive_empty_pages >= max_empty_pages:
+                        print(
+                            f"Thread {thread_id}: Found {consecutive_empty_pages} consecutive empty pages, stopping early at page {page}"
+                        )
+                        break
+                else:
+                    consecutive_empty_pages = 0
+                    print(
+                        f"Thread {thread_id}: Completed page {page}, found {len(page_reviews)} reviews"
+                    )
 
-    finally:
-        driver.quit()
+        except Exception as e:
+            print(f"Thread {thread_id}: Error in scraping: {e}")
 
     return thread_reviews
 
@@ -221,19 +199,24 @@ def distribute_pages(total_pages, num_threads=4):
     return page_ranges
 
 
-def scrape_all_reviews_threaded(base_url, num_threads=12, max_empty_pages=3):
-    # First, get total pages using a single driver
-    driver = setup_driver()
-    try:
-        driver.get(base_url)
-        total_pages = get_total_pages(driver)
-        print(f"Found {total_pages} pages total.")
-    finally:
-        driver.quit()
+def scrape_all_reviews_threaded(base_url, num_threads=12, max_empty_pages=3, backend="selenium"):
+    if backend == "http":
+        import html_scraper
+
+        total_pages = html_scraper.get_total_pages(base_url)
+        scrape_range = html_scraper.scrape_pages_range
+    else:
+        # First, get total pages, the leased driver goes straight back to the pool for the workers
+        with driver_pool.lease() as driver:
+            driver.get(base_url)
+            driver_pool.page_loaded(driver)
+            total_pages = get_total_pages(driver)
+        scrape_range = scrape_pages_range
+    print(f"Found {total_pages} pages total.")
 
     if total_pages == 0:
         print("No pages found to scrape")
-        return []
+        return [], 0
 
     page_ranges = distribute_pages(total_pages, num_threads)
     print(f"Page distribution: {page_ranges}")
@@ -245,7 +228,7 @@ def scrape_all_reviews_threaded(base_url, num_threads=12, max_empty_pages=3):
         future_to_thread = {}
         for i, (start_page, end_page) in enumerate(page_ranges):
             future = executor.submit(
-                scrape_pages_range,
+                scrape_range,
                 base_url,
                 start_page,
                 end_page,
@@ -276,8 +259,36 @@ def scrape_all_reviews_threaded(base_url, num_threads=12, max_empty_pages=3):
     return all_reviews, len(all_reviews)
 
 
-def rank_reviews_by_score(url, max_votes=10, num_threads=12):
-    reviews, num_reviews = scrape_all_reviews_threaded(url, num_threads=num_threads)
+def scrape_all_reviews(base_url, num_threads=12, max_empty_pages=3, backend=SCRAPER_BACKEND):
+    """Scrape with the chosen backend, "auto" tries plain HTTP first and falls back to Selenium"""
+    if backend in ("http", "auto"):
+        try:
+            reviews, num = scrape_all_reviews_threaded(
+                base_url, num_threads, max_empty_pages, backend="http"
+            )
+            if num or backend == "http":
+                return reviews, num
+            print("HTTP scrape found no reviews, falling back to Selenium")
+        except Exception as e:
+            # ImportError without selectolax, NeedsJavaScript for script-rendered pages
+            if backend == "http":
+                raise
+            print(f"HTTP scrape unavailable ({e}), falling back to Selenium")
+
+    return scrape_all_reviews_threaded(base_url, num_threads, max_empty_pages, backend="selenium")
+
+
+def rank_reviews_by_score(url, max_votes=10, num_threads=12, backend=SCRAPER_BACKEND):
+    reviews, num_reviews = scrape_all_reviews(url, num_threads=num_threads, backend=backend)
+    return rank_reviews(reviews, max_votes=max_votes), num_reviews
+
+
+def rank_reviews(reviews, max_votes=10):
+    """Attach the ldr/eng/len engagement scores to already scraped reviews
+
+    Dict-based reference for scoring.engagement_scores, which the analysis
+    pipeline uses instead.
+    """
 
     def get_total_ldr(reviews):
         likes = 0
@@ -323,46 +334,16 @@ def rank_reviews_by_score(url, max_votes=10, num_threads=12):
     for review in reviews:
         review["score"] = score_review(review, total_ldr, max_votes=max_votes)
 
-    return reviews, num_reviews
-
-
-def get_reviews_formatted(url, num_threads=12):
-    reviews, num = rank_reviews_by_score(
-        url,
-        num_threads=num_threads,
-    )  # scrape_all_reviews_threaded(i, num_threads=NUM_THREADS, max_empty_pages=1)
-
-    all_review_texts = [i["review"] for i in reviews]
-    print(all_review_texts)
+    return reviews
 
-    all_sentiments = get_sentiment(all_review_texts)
-    all_plag = fake_check(all_review_texts)
 
-    for idx, review in enumerate(reviews):
-        print(review["score"])
-        review["score"]["sent"] = all_sentiments[idx]
-        review["score"]["plag"] = all_plag[idx]
+def get_reviews_formatted(url, num_threads=12, store=None, backend=SCRAPER_BACKEND):
+    reviews, num = scrape_all_reviews(url, num_threads=num_threads, backend=backend)
 
-    grads = {
-        "ldr": 0.0829,
-        "eng": 0.4726,
-        "len": 0.0363,
-        "sent": 0.3277,
-        "plag": 0.4035,
-    }
+    # ranks the reviews column-wise alongside the model scores
+    pipeline = AnalysisPipeline(reviews, store=store).run()
 
-    for review in reviews:
-        score = review["score"]
-        final_score = (
-            grads["ldr"] * score.get("ldr", 1)
-            + grads["eng"] * score.get("eng", 1)
-            + grads["len"] * score.get("len", 1)
-            + grads["sent"] * score.get("sent", 1)
-            + grads["plag"] * score.get("plag", 1)
-        )
-        review["final_score"] = min(final_score, 1.0)
-
-    return reviews, num
+    return pipeline.batch.to_dicts(), num
 
 
 if __name__ == "__main__":
@@ -375,42 +356,29 @@ if __name__ == "__main__":
         # "https://www.flipkart.com/vellosta-men-self-design-casual-black-shirt/product-reviews/itm1d0ab280b3fc9?pid=SHTHCFXAJ5H4EHNG&lid=LSTSHTHCFXAJ5H4EHNGO67UAK&marketplace=FLIPKART",
     ]
 
-    NUM_THREADS = 6
+    import asyncio
+    from batch_analyse import analyse_many
+    from analysis import response_body
+
+    async def analyse_all():
+        # every product scraped concurrently over the shared driver pool, reviews scored in pooled batches
+        cnt = 0
+        total_reviews = 0
+        async for result in analyse_many(review_page_url, backend=SCRAPER_BACKEND, related=False):
+            if result["error"]:
+                print(f"Failed {result['url']}: {result['error']}")
+                continue
+            reviews = response_body(result["data"])["Reviews"]
 
-    cnt = 0
-    total_reviews = 0
-    m_start = time.time()
-    for i in review_page_url:
-        print(f"Scraping {i}")
-        start_time = time.time()
-        reviews = get_reviews_formatted(
-            i,
-            num_threads=NUM_THREADS,
-        )  # scrape_all_reviews_threaded(i, num_threads=NUM_THREADS, max_empty_pages=1)
-
-        all_review_texts = [i["review"] for i in reviews]
-        print(all_review_texts)
-
-        all_sentiments = get_sentiment(all_review_texts)
-        all_plag = fake_check(all_review_texts)
-
-        for idx, review in enumerate(reviews):
-            print(review["score"])
-            review["score"]["sent"] = all_sentiments[idx]
-            review["score"]["plag"] = all_plag[idx]
-
-        end_time = time.time()
-
-        file_name = f"flipkart_detailed_reviews{cnt}.json"
-        cnt += 1
-
-        # Save to JSON file
-        with open(file_name, "w", encoding="utf-8") as f:
-            json.dump(reviews, f, ensure_ascii=False, indent=4)
-        total_reviews += len(reviews)
-        print(
-            f"\nScraped {len(reviews)} reviews total in {end_time - start_time:.2f} seconds."
-        )
-    m_end = time.time()
+            # Save to JSON file
+            file_name = f"flipkart_detailed_reviews{cnt}.json"
+            cnt += 1
+            with open(file_name, "w", encoding="utf-8") as f:
+                json.dump(reviews, f, ensure_ascii=False, indent=4)
+            total_reviews += len(reviews)
+            print(f"Scraped {len(reviews)} reviews from {result['url']}")
+        return total_reviews
 
-    print(f"Scraped {total_reviews} and {cnt} Pages in {m_end - m_start:.2f}s.")
+    m_start = time.time()
+    total_reviews = asyncio.run(analyse_all())
+    print(f"Scraped {total_reviews} reviews from {len(review_page_url)} products in {time.time() - m_start:.2f}s.")
@@ -1,20 +1,64 @@
-from selenium import webdriver
+import os
+import urllib.parse
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from driver_pool import driver_pool
+from dotenv import load_dotenv
+load_dotenv()
 
+SIMILAR_ITEMS_BACKEND = os.getenv("SIMILAR_ITEMS_BACKEND", "selenium")  # selenium | http
+# search terms are appended, point it at fixture_server.py for benchmarks
+AMAZON_SEARCH_URL = os.getenv("AMAZON_SEARCH_URL", "https://www.amazon.in/s?k=")
+SIMILAR_ITEMS_COUNT = 3
 
-def find_similar_items(url):
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')
 
-    # Start the WebDriver
-    driver = webdriver.Chrome(options=chrome_options)
+def find_similar_items(url, backend=SIMILAR_ITEMS_BACKEND):
+    if backend == "http":
+        return fetch_similar_items(url)
+    # Lease a warm WebDriver from the shared pool
+    with driver_pool.lease() as driver:
+        return scrape_similar_items(driver, url)
 
-    url = "https://www.amazon.in/s?k=" + url
+
+def fetch_similar_items(search):
+    """Same items scrape_similar_items reads, from the plain HTML of the search page"""
+    from html_scraper import session, HTTP_TIMEOUT
+
+    url = AMAZON_SEARCH_URL + search
+    response = session.get(url, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    return parse_similar_items(response.text, url)
+
+
+def parse_similar_items(html, base_url):
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+
+    results = []
+    for card in HTMLParser(html).css("div.puis-card-container"):
+        image, title, price = card.css_first("img"), card.css_first("a h2 span"), card.css_first("span.a-price-whole")
+        link = card.css_first("a[href]")
+        if None in (image, title, price, link):
+            continue
+        # weird bug: some links are 'javascript:void(0)'
+        link = urllib.parse.urljoin(base_url, link.attributes["href"])
+        if not link.startswith(("https://", "http://")):
+            continue
+        results.append({
+            "title": title.text().strip(),
+            "url": link,
+            "image": image.attributes.get("src", ""),
+            "price": price.text().strip(),
+        })
+        if len(results) == SIMILAR_ITEMS_COUNT:
+            break
+    return results
+
+
+def scrape_similar_items(driver, url):
+    url = AMAZON_SEARCH_URL + url
     driver.get(url)
+    driver_pool.page_loaded(driver)
 
     # Wait for elements to load
     wait = WebDriverWait(driver, 10)
@@ -28,7 +72,7 @@ def find_similar_items(url):
 
     min_length = min(len(ls) for ls in (images, titles, prices, links))
     results = []
-    for i in range(min(3, min_length)):
+    for i in range(min(SIMILAR_ITEMS_COUNT, min_length)):
         img_src = images[i].get_attribute('src')
         title = titles[i].text
         price = prices[i].text
@@ -53,7 +97,4 @@ def find_similar_items(url):
         print("Price:" , item["price"])
         print("----")
 
-    driver.quit()
     return results
-
-    # Close the driver
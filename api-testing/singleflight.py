@@ -0,0 +1,86 @@
+import asyncio
+import os
+import time
+import uuid
+from dotenv import load_dotenv
+load_dotenv()
+
+SINGLEFLIGHT_LOCK_TTL = int(os.getenv("SINGLEFLIGHT_LOCK_TTL", 300))
+SINGLEFLIGHT_POLL_INTERVAL = float(os.getenv("SINGLEFLIGHT_POLL_INTERVAL", 0.5))
+# delete the lock only while it still holds our token, in one round trip so an expired
+# leader can't remove the lock a newer leader took in between
+RELEASE_SCRIPT = 'if redis.call("get", KEYS[1]) == ARGV[1] then return redis.call("del", KEYS[1]) end return 0'
+
+
+class SingleFlight:
+    """Runs one computation per key at a time, concurrent callers await the same result
+
+    Within a process callers share one task. Across uvicorn workers the first
+    caller takes a Redis lock and the rest poll `lookup` until the leader has
+    published its result. If Redis is unreachable this degrades to the
+    in-process deduplication only.
+    """
+
+    def __init__(self, redis=None, lock_ttl=SINGLEFLIGHT_LOCK_TTL, poll_interval=SINGLEFLIGHT_POLL_INTERVAL):
+        self.redis = redis
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self.inflight = {}
+
+    async def do(self, key, fn, lookup=None):
+        """`fn` is an async callable doing the work, `lookup` returns a result published by another worker or None"""
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.run(key, fn, lookup))
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        # a caller disconnecting must not cancel the work everyone else is waiting on
+        return await asyncio.shield(task)
+
+    async def run(self, key, fn, lookup):
+        lock_key = f"singleflight:{key}"
+        token = uuid.uuid4().hex
+
+        if await self.acquire(lock_key, token):
+            try:
+                return await fn()
+            finally:
+                await self.release(lock_key, token)
+
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            if lookup is not None and (result := await asyncio.to_thread(lookup)) is not None:
+                return result
+            if not await self.locked(lock_key):
+                # the leader may have published and unlocked since the lookup above
+                if lookup is not None and (result := await asyncio.to_thread(lookup)) is not None:
+                    return result
+                break
+
+        # the leader failed or its lock expired without publishing anything
+        return await fn()
+
+    async def acquire(self, lock_key, token):
+        if self.redis is None:
+            return True
+        try:
+            return bool(await asyncio.to_thread(self.redis.set, lock_key, token, nx=True, ex=self.lock_ttl))
+        except Exception as e:
+            print(f"Single-flight lock unavailable, using local dedup only: {e}")
+            return True
+
+    async def release(self, lock_key, token):
+        if self.redis is None:
+            return
+        try:
+            await asyncio.to_thread(self.redis.eval, RELEASE_SCRIPT, [lock_key], [token])
+        except Exception as e:
+            print(f"Single-flight unlock failed: {e}")
+
+    async def locked(self, lock_key):
+        try:
+            return bool(await asyncio.to_thread(self.redis.exists, lock_key))
+        except Exception as e:
+            print(f"Single-flight lock check failed: {e}")
+            return False
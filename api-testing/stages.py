@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+
+class StageGraph:
+    """Runs async stages as soon as their dependencies resolve
+
+    Every stage gets an optional timeout and a fallback used when it times
+    out or raises, so one slow dependency degrades the response instead of
+    failing it. Stages driven from outside the graph (like the streamed
+    scrape) are resolved by hand with `resolve`. Timings of every stage are
+    kept for the Server-Timing header.
+    """
+
+    def __init__(self):
+        self.futures = {}
+        self.timings = {}
+        self.degraded = set()
+        self.tasks = []
+
+    def future(self, name):
+        if name not in self.futures:
+            self.futures[name] = asyncio.get_running_loop().create_future()
+        return self.futures[name]
+
+    def stage(self, name, fn, deps=(), timeout=None, fallback=None):
+        """Schedule `await fn(*dep_results)` once every dependency has resolved"""
+
+        async def run():
+            args = [await self.future(dep) for dep in deps]
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(fn(*args), timeout)
+            except Exception as e:
+                print(f"Stage {name} degraded: {type(e).__name__} {e}")
+                self.degraded.add(name)
+                result = fallback() if callable(fallback) else fallback
+            self.record(name, time.perf_counter() - start)
+            self.resolve(name, result)
+
+        self.tasks.append(asyncio.ensure_future(run()))
+        return self.future(name)
+
+    def resolve(self, name, value):
+        future = self.future(name)
+        if not future.done():
+            future.set_result(value)
+
+    def resolved(self, name):
+        return name in self.futures and self.futures[name].done()
+
+    def record(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0) + seconds
+
+    def timer(self, name):
+        return StageTimer(self, name)
+
+    def server_timing(self):
+        return ", ".join(
+            f"{name};dur={seconds * 1000:.1f}" + (';desc="fallback"' if name in self.degraded else "")
+            for name, seconds in self.timings.items()
+        )
+
+    def cancel(self):
+        for task in self.tasks:
+            task.cancel()
+
+
+class StageTimer:
+    def __init__(self, graph, name):
+        self.graph = graph
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.graph.record(self.name, time.perf_counter() - self.start)
@@ -0,0 +1,165 @@
+from collections import OrderedDict, deque
+import asyncio
+import weakref
+import hashlib
+import json
+import os
+import re
+import numpy as np
+import requests
+from dotenv import load_dotenv
+load_dotenv()
+
+SUMMARY_BACKEND = os.getenv("SUMMARY_BACKEND", "gemini")  # gemini | http
+SUMMARY_BACKEND_URL = os.getenv("SUMMARY_BACKEND_URL", "http://127.0.0.1:8765/v1/summarize")
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gemini-1.5-flash")
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", 4))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", 2000))
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", 1024))
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", 7 * 24 * 3600))
+SUMMARY_TIMEOUT = float(os.getenv("SUMMARY_TIMEOUT", 30))
+# rough English average, good enough to stay under the model's context
+CHARS_PER_TOKEN = 4
+
+PROMPT = (
+    "You are given a list of user reviews. Read them all carefully and generate a concise, balanced summary that captures the overall sentiment, common themes, notable pros and cons, and any frequently mentioned issues or praises. Use clear language and aim to reflect the general consensus as well as any strong outliers. DO NOT USE POINTS. "
+    "GIVE ME A 150 WORD REVIEW:\n"
+)
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def select_reviews(batch, budget=SUMMARY_TOKEN_BUDGET):
+    """Pick the best reviews of a ReviewBatch by final_score that fit the token budget
+
+    Positive and negative reviews are drawn in proportion to their share of
+    all reviews, so a product with mostly glowing reviews still gets its
+    complaints summarized and the other way round.
+    """
+    ranked = np.argsort(-batch.final, kind="stable").tolist()
+    sentiments = batch.sent
+    positive = deque(i for i in ranked if sentiments[i] >= 0.5)
+    negative = deque(i for i in ranked if sentiments[i] < 0.5)
+    share = len(positive) / len(ranked) if ranked else 0
+
+    selected = []
+    used = estimate_tokens(PROMPT)
+    taken = {"positive": 0, "negative": 0}
+    while positive or negative:
+        # take from whichever side is furthest below its share
+        total = taken["positive"] + taken["negative"] + 1
+        side = "positive" if positive and (not negative or taken["positive"] / total < share) else "negative"
+        text = batch.text[(positive if side == "positive" else negative).popleft()]
+        cost = estimate_tokens(text) + 1
+        if used + cost > budget:
+            continue  # too long, a shorter review may still fit
+        selected.append(text)
+        used += cost
+        taken[side] += 1
+    return selected
+
+
+def build_prompt(texts):
+    return PROMPT + "\n".join(f"- {text}" for text in texts)
+
+
+def clean_summary(summary):
+    summary = re.sub(r'[^a-zA-Z0-9\s\.]', '', summary)
+    return re.sub(r'\s+', ' ', summary.strip())
+
+
+class GeminiBackend:
+    def __init__(self, model=SUMMARY_MODEL):
+        import google.generativeai as genai
+
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        self.model = genai.GenerativeModel(model)
+
+    async def generate(self, prompt):
+        response = await self.model.generate_content_async(prompt)
+        return response.text
+
+
+class HTTPBackend:
+    """Any endpoint taking {"prompt"} and answering {"text"}, e.g. the stub in fixture_server.py"""
+
+    def __init__(self, url=SUMMARY_BACKEND_URL):
+        self.url = url
+        self.session = requests.Session()
+
+    async def generate(self, prompt):
+        response = await asyncio.to_thread(self.session.post, self.url, json={"prompt": prompt}, timeout=60)
+        response.raise_for_status()
+        return response.json()["text"]
+
+
+def make_backend(name=SUMMARY_BACKEND):
+    if name == "http":
+        return HTTPBackend()
+    return GeminiBackend()
+
+
+class Summarizer:
+    """Async summary service with one reused client, bounded concurrency and a review-set cache"""
+
+    def __init__(self, backend=None, concurrency=SUMMARY_CONCURRENCY, redis=None):
+        self.backend = backend
+        self.concurrency = concurrency
+        self.redis = redis
+        self.cache = OrderedDict()
+        # per event loop, a Semaphore can't be shared between loops
+        self.slots = weakref.WeakKeyDictionary()
+
+    def key(self, texts):
+        return "summary:" + hashlib.sha256(json.dumps(texts).encode()).hexdigest()
+
+    async def summarize(self, batch):
+        texts = select_reviews(batch)
+        if not texts:
+            return ""
+
+        key = self.key(texts)
+        if (summary := await self.cached(key)) is not None:
+            return summary
+
+        if self.backend is None:
+            self.backend = make_backend()
+        loop = asyncio.get_running_loop()
+        if loop not in self.slots:
+            self.slots[loop] = asyncio.Semaphore(self.concurrency)
+        async with self.slots[loop]:
+            summary = clean_summary(await self.backend.generate(build_prompt(texts)))
+
+        await self.store(key, summary)
+        return summary
+
+    async def cached(self, key):
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        if self.redis is not None:
+            try:
+                return await asyncio.to_thread(self.redis.get, key)
+            except Exception as e:
+                print(f"Summary cache read failed: {e}")
+        return None
+
+    async def store(self, key, summary):
+        self.cache[key] = summary
+        if len(self.cache) > SUMMARY_CACHE_SIZE:
+            self.cache.popitem(last=False)
+        if self.redis is not None and summary:
+            try:
+                await asyncio.to_thread(self.redis.set, key, summary, ex=SUMMARY_CACHE_TTL)
+            except Exception as e:
+                print(f"Summary cache write failed: {e}")
+
+
+summarizer = Summarizer()
+
+
+def configure(redis=None):
+    """Give the shared summarizer the Redis client its summaries are cached in, once per process at startup"""
+    summarizer.redis = redis
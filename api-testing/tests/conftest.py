@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+# the modules read ../ml/... relative to api-testing and keep their caches in the working directory
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+os.chdir(HERE)
+
+STATE = tempfile.mkdtemp(prefix="api-testing-tests-")
+for name, filename in {
+    "SCORE_CACHE_PATH": "score-cache.sqlite3",
+    "DEDUPE_INDEX_PATH": "dedupe-index.sqlite3",
+    "PRODUCT_INDEX_PATH": "product-index.sqlite3",
+    "JOB_QUEUE_PATH": "job-queue.sqlite3",
+}.items():
+    os.environ.setdefault(name, os.path.join(STATE, filename))
+os.environ.setdefault("PRODUCT_INDEX_DIR", os.path.join(STATE, "product-index"))
@@ -0,0 +1,38 @@
+import asyncio
+
+import analysis
+
+
+def test_closing_the_stream_cancels_running_stages(monkeypatch):
+    started, cancelled = [], []
+
+    async def no_pages(url, backend):
+        return
+        yield
+
+    def slow(name):
+        async def stage(*args):
+            started.append(name)
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                cancelled.append(name)
+                raise
+        return stage
+
+    monkeypatch.setattr(analysis, "iter_review_pages", no_pages)
+    monkeypatch.setattr(analysis, "find_related", slow("related"))
+    monkeypatch.setattr(analysis.summarizer, "summarize", slow("summary"))
+
+    async def run():
+        # a client disconnecting mid-stream cancels the task draining the generator
+        stream = asyncio.ensure_future(analysis.run_analysis("https://www.flipkart.com/phone/product-reviews/itm1?pid=X"))
+        while len(started) < 2:
+            await asyncio.sleep(0.01)
+        stream.cancel()
+        await asyncio.gather(stream, return_exceptions=True)
+        await asyncio.sleep(0.05)
+        # checked before asyncio.run cancels whatever is left
+        return sorted(cancelled)
+
+    assert asyncio.run(run()) == ["related", "summary"]
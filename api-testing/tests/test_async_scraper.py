@@ -0,0 +1,60 @@
+import asyncio
+
+import async_scraper
+import fixture_server
+
+
+def scrape(url, concurrency=4):
+    async def collect():
+        return [item async for item in async_scraper.iter_review_pages(url, "http", concurrency)]
+
+    return asyncio.run(collect())
+
+
+def test_separate_event_loops_share_the_page_limit(monkeypatch):
+    # job workers and the batch CLI run each analysis in its own loop, pages contend for 2 slots
+    monkeypatch.setattr(async_scraper, "SCRAPE_CONCURRENCY", 2)
+    server, base_url = fixture_server.serve(total_pages=8)
+    try:
+        url = fixture_server.review_url(base_url)
+        for _ in range(3):
+            pages = scrape(url)
+            assert sorted(page for page, _ in pages) == list(range(1, 9))
+    finally:
+        server.shutdown()
+
+
+def fake_backend(monkeypatch, total_pages, page_reviews):
+    """Serve pages from `page_reviews(page, attempt)` instead of the network, returns the fetch log"""
+    calls = []
+
+    def fetch_page(base_url, page, worker_id):
+        calls.append(page)
+        return page_reviews(page, calls.count(page))
+
+    monkeypatch.setattr(async_scraper, "resolve_backend", lambda base_url, backend: (total_pages, fetch_page))
+    monkeypatch.setattr(async_scraper, "PAGE_RETRY_DELAY", 0)
+    return calls
+
+
+def test_empty_and_failing_pages_mid_range_are_skipped(monkeypatch):
+    def page_reviews(page, attempt):
+        if page == 3:
+            return []  # empty, even after the retry
+        if page == 4 and attempt == 1:
+            raise RuntimeError("rate limited")
+        if page == 5:
+            raise RuntimeError("driver crashed")
+        return [{"review": f"page {page}"}]
+
+    fake_backend(monkeypatch, 8, page_reviews)
+    pages = scrape("http://fixture/reviews?pid=X")
+    assert sorted(page for page, _ in pages) == [1, 2, 4, 6, 7, 8]
+
+
+def test_reviews_end_at_a_run_of_empty_pages(monkeypatch):
+    monkeypatch.setattr(async_scraper, "EMPTY_PAGES_TO_END", 3)
+    calls = fake_backend(monkeypatch, 40, lambda page, attempt: [{"review": "x"}] if page <= 4 else [])
+    pages = scrape("http://fixture/reviews?pid=X", concurrency=2)
+    assert sorted(page for page, _ in pages) == [1, 2, 3, 4]
+    assert max(calls) < 40
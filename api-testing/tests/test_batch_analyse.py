@@ -0,0 +1,22 @@
+import json
+
+from batch_analyse import completed_urls
+
+
+def test_resume_skips_finished_products_and_retries_errors(tmp_path):
+    out = tmp_path / "results.jsonl"
+    written = (
+        json.dumps({"url": "https://a", "status": "done"}) + "\n"
+        + json.dumps({"url": "https://b", "status": "error", "error": "timeout"}) + "\n"
+    )
+    out.write_text(written + '{"url": "https://c", "sta')
+    assert completed_urls(str(out)) == {"https://a"}
+    assert out.read_text() == written
+
+
+def test_a_corrupt_line_is_cut_off_with_everything_after_it(tmp_path):
+    out = tmp_path / "results.jsonl"
+    first = json.dumps({"url": "https://a", "status": "done"}) + "\n"
+    out.write_text(first + "not json\n" + json.dumps({"url": "https://c", "status": "done"}) + "\n")
+    assert completed_urls(str(out)) == {"https://a"}
+    assert out.read_text() == first
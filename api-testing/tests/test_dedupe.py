@@ -0,0 +1,41 @@
+from dedupe import DedupeIndex, DuplicateClusters
+
+TEMPLATE = "Very good product at this price, delivery was quick and the packaging was fine. Highly recommended to everyone"
+OTHERS = [
+    "Battery drains within half a day even with the screen brightness turned all the way down",
+    "Camera is sharp in daylight but the night mode photos come out blurry and full of noise",
+    "Stopped charging after two weeks and customer care has not replied to any of my emails",
+]
+
+
+def test_near_duplicates_share_a_cluster():
+    clusters = DuplicateClusters()
+    ids = clusters.add([TEMPLATE, OTHERS[0], TEMPLATE.upper() + "!!", OTHERS[1]])
+    assert ids[0] == ids[2]
+    assert len(set(ids.tolist())) == 3
+    assert clusters.counts().tolist() == [2, 1, 2, 1]
+
+
+def test_clusters_carry_over_between_calls():
+    clusters = DuplicateClusters()
+    first = clusters.add([TEMPLATE, OTHERS[0]])
+    second = clusters.add([OTHERS[2], TEMPLATE.replace("Highly", "highly")])
+    assert second[1] == first[0]
+    assert clusters.count == 3
+    assert clusters.sizes().tolist() == [2, 1, 1]
+
+
+def test_index_counts_copies_in_other_products_once(tmp_path):
+    index = DedupeIndex(str(tmp_path / "dedupe.sqlite3"))
+
+    def analyse(slug, texts):
+        clusters = DuplicateClusters()
+        clusters.add(texts)
+        index.match_and_add(slug, clusters)
+        return clusters
+
+    analyse("product-a", [TEMPLATE, OTHERS[0]])
+    assert analyse("product-b", [TEMPLATE, OTHERS[1]]).external.tolist() == [1, 0]
+    # re-analysing a product replaces its share instead of adding to it
+    assert analyse("product-b", [TEMPLATE, OTHERS[1]]).external.tolist() == [1, 0]
+    assert analyse("product-c", [TEMPLATE, OTHERS[2]]).external.tolist() == [2, 0]
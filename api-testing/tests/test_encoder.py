@@ -0,0 +1,39 @@
+import json
+
+import numpy as np
+
+import encoder
+
+TEXTS = [
+    "i really enjoyed this product, the quality is great",
+    "i liked the delivery guy, send him again",
+    "",
+    "Don't buy!! It's a waste... 10/10 would NOT recommend",
+]
+
+
+def test_ids_match_the_plain_vocab_lookup():
+    plain = json.load(open(encoder.VOCAB_PATH))
+    buffer = encoder.encode_batch(TEXTS)
+    for text, row in zip(TEXTS, buffer):
+        expected = [plain.get(token, 1) for token in encoder.tokenize(text)]
+        assert row[:len(expected)].tolist() == expected
+        assert not row[len(expected):].any()
+
+
+def test_compiled_table_matches_the_json_vocab(tmp_path):
+    json_path, table_path = tmp_path / "vocab.json", tmp_path / "vocab.npy"
+    plain = {"<PAD>": 0, "<UNKOWN>": 1, "good": 2, "phone": 3, "battery": 4}
+    json_path.write_text(json.dumps(plain))
+    assert encoder.compile_vocab(str(json_path), str(table_path)) == len(plain)
+
+    tokens = ["good", "phone", "not-in-vocab", "battery", "good"]
+    table = encoder.VocabTable(str(table_path))
+    assert table.lookup(tokens).tolist() == encoder.Vocab(plain).lookup(tokens).tolist() == [2, 3, 1, 4, 2]
+
+
+def test_pad_ids_zero_fills_to_the_longest_row():
+    buffer = encoder.pad_ids([np.array([5, 6, 7]), np.array([8])], min_len=2)
+    assert buffer.dtype == np.int64
+    assert buffer.tolist() == [[5, 6, 7], [8, 0, 0]]
+    assert encoder.pad_ids([np.array([9])], min_len=4).tolist() == [[9, 0, 0, 0]]
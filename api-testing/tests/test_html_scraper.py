@@ -0,0 +1,50 @@
+import pytest
+from selectolax.lexbor import LexborHTMLParser as HTMLParser
+
+import fixture_server
+import html_scraper
+
+
+def test_parse_review_page_reads_the_webdriver_fields():
+    reviews = html_scraper.parse_review_page(fixture_server.load_fixture("flipkart", "reviews-page-1.html"), 1, 0)
+    assert len(reviews) == 10
+    assert reviews[0] == {
+        "review": "Dont buy this its a waste of money totally disappointed",
+        "user": "Rahul Sharma",
+        "rating": "2",
+        "time": "2 days ago",
+        "page": 1,
+        "ldr": ["202", "41"],
+        "thread_id": 0,
+    }
+    assert html_scraper.parse_review_page(fixture_server.load_fixture("flipkart", "reviews-empty.html")) == []
+
+
+def test_total_pages_from_the_pager():
+    tree = HTMLParser(fixture_server.load_fixture("flipkart", "reviews-page-1.html"))
+    assert html_scraper.parse_total_pages(tree) == 3
+
+
+@pytest.fixture
+def server():
+    server, base_url = fixture_server.serve(total_pages=5)
+    yield fixture_server.review_url(base_url)
+    server.shutdown()
+
+
+def test_pages_range_keeps_page_order_and_stops_after_empty_pages(server, monkeypatch):
+    fetched = []
+    scrape_page = html_scraper.scrape_page
+    monkeypatch.setattr(html_scraper, "scrape_page", lambda *args: fetched.append(args[1]) or scrape_page(*args))
+
+    reviews = html_scraper.scrape_pages_range(server, 1, 20, 0)
+    assert [review["page"] for review in reviews] == sorted(review["page"] for review in reviews)
+    assert {review["page"] for review in reviews} == {1, 2, 3, 4, 5}
+    # pages past the last one are empty, three in a row end the range
+    assert fetched == list(range(1, 9))
+
+
+def test_fetch_errors_raise_instead_of_looking_empty(server):
+    with pytest.raises(Exception):
+        html_scraper.fetch_review_page(server.replace("/product-reviews/", "/missing/"), 1)
+    assert html_scraper.get_total_pages(server) == 5
@@ -0,0 +1,32 @@
+import asyncio
+
+import incremental
+from incremental import batch_fingerprints, fingerprint, recent_url
+from review_batch import ReviewBatch
+
+
+def test_anonymous_review_fingerprint_matches_its_stored_form():
+    scraped = {"review": "nice phone", "user": None, "rating": None, "time": None, "ldr": ["0", "0"]}
+    batch = ReviewBatch.from_dicts([scraped])
+    assert batch_fingerprints(batch) == [fingerprint(scraped["user"], scraped["rating"], scraped["review"])]
+
+
+def test_fingerprint_ignores_time_but_not_text():
+    assert fingerprint("Rahul", "4", "good") == fingerprint("Rahul", "4", "good")
+    assert fingerprint("Rahul", "4", "good") != fingerprint("Rahul", "4", "bad")
+    assert fingerprint("Rahul", 4, "good") == fingerprint("Rahul", "4", "good")
+
+
+def test_recent_url_sorts_newest_first():
+    url = recent_url("https://www.flipkart.com/p/product-reviews/itm1?pid=X&page=3&sortOrder=MOST_HELPFUL")
+    assert url == "https://www.flipkart.com/p/product-reviews/itm1?pid=X&sortOrder=MOST_RECENT"
+
+
+def test_a_failed_refresh_falls_back_to_a_full_run(monkeypatch):
+    async def broken_scrape(url, known, backend):
+        raise RuntimeError("driver crashed")
+
+    monkeypatch.setattr(incremental, "scrape_new_reviews", broken_scrape)
+    data = {"Reviews": ReviewBatch.from_dicts([{"review": "nice phone", "user": "Asha", "rating": "5", "time": "", "ldr": ["1", "0"]}])}
+    state = incremental.scrape_state(1, 1, 0)
+    assert asyncio.run(incremental.refresh_analysis("https://www.flipkart.com/p/product-reviews/itm1?pid=X", data, state)) is None
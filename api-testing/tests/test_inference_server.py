@@ -0,0 +1,26 @@
+import os
+import stat
+
+import pytest
+
+import inference_server
+
+
+def test_an_authkey_is_required():
+    with pytest.raises(RuntimeError):
+        inference_server.require_authkey(None)
+    with pytest.raises(RuntimeError):
+        inference_server.InferenceClient("/nonexistent.sock", authkey="")
+    assert inference_server.require_authkey("secret") == b"secret"
+
+
+def test_socket_directory_is_private(tmp_path):
+    address = tmp_path / "inference" / "inference.sock"
+    inference_server.private_dir(str(address))
+    assert stat.S_IMODE(os.stat(address.parent).st_mode) == 0o700
+
+    shared = tmp_path / "shared"
+    shared.mkdir(mode=0o755)
+    os.chmod(shared, 0o755)
+    with pytest.raises(RuntimeError):
+        inference_server.private_dir(str(shared / "inference.sock"))
@@ -0,0 +1,32 @@
+import os
+
+import jobs
+
+
+class FakeProcess:
+    started_with = []
+
+    def __init__(self, target, args, daemon):
+        self.args = args
+
+    def start(self):
+        FakeProcess.started_with.append((os.environ.get("DRIVER_POOL_SIZE"), os.environ.get("SCRAPE_CONCURRENCY")))
+
+
+class FakeContext:
+    Process = FakeProcess
+
+
+def test_workers_inherit_their_share_of_the_pool(monkeypatch):
+    monkeypatch.setattr(jobs.multiprocessing, "get_context", lambda method: FakeContext)
+    monkeypatch.setenv("DRIVER_POOL_SIZE", "12")
+    monkeypatch.delenv("SCRAPE_CONCURRENCY", raising=False)
+    FakeProcess.started_with.clear()
+
+    workers = jobs.start_workers(3)
+
+    assert [worker.args for worker in workers] == [(0,), (1,), (2,)]
+    # set while the children spawn, so it's there when they import driver_pool and async_scraper
+    assert FakeProcess.started_with == [("4", "4")] * 3
+    assert os.environ["DRIVER_POOL_SIZE"] == "12"
+    assert "SCRAPE_CONCURRENCY" not in os.environ
@@ -0,0 +1,17 @@
+import inference_server
+import model_test
+
+
+def test_server_inference_skips_the_local_batch_window(monkeypatch):
+    class Client:
+        def score(self, texts):
+            return [0.9] * len(texts), [0.1] * len(texts)
+
+    def no_batcher():
+        raise AssertionError("held in the local batcher before the server's own window")
+
+    monkeypatch.setattr(model_test, "INFERENCE_SOCKET", "/run/inference.sock")
+    monkeypatch.setattr(model_test, "INFERENCE_BATCH_WINDOW_MS", 5)
+    monkeypatch.setattr(model_test, "get_batcher", no_batcher)
+    monkeypatch.setattr(inference_server, "get_client", lambda address: Client())
+    assert model_test.score_reviews(["good", "bad"]) == ([0.9, 0.9], [0.1, 0.1])
@@ -0,0 +1,51 @@
+import random
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+import model_test
+from encoder import encode_ids, pad_ids
+
+WORDS = "good bad phone battery camera screen fast slow value price quality delivery worst best not very the it is".split()
+
+
+def corpus(count=300, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 70))) for _ in range(count)]
+
+
+def test_padded_width():
+    assert model_test.padded_width(0) == model_test.MIN_SEQ_LEN
+    assert model_test.padded_width(1) == 16
+    assert model_test.padded_width(16) == 16
+    assert model_test.padded_width(17) == 32
+
+
+def test_score_does_not_depend_on_batch_companions():
+    texts = corpus(40)
+    models = list(model_test.get_models())
+    alone = [model_test.run_models(models, [text]) for text in texts[:5]]
+    together = model_test.run_models(models, texts)
+    for i, scores in enumerate(alone):
+        # equal up to float noise from the batch size, not the 0.1+ a shared padding width caused
+        assert [output[0] for output in scores] == pytest.approx([output[i] for output in together], abs=1e-5)
+
+
+def test_padding_tolerance():
+    """How far padding to a multiple of PAD_MULTIPLE moves scores from the exact-length ones
+
+    The models don't mask padding, so some reviews move a lot. That's why the
+    padding scheme is part of the score cache digest. This pins the drift so a
+    change to the padding rule shows up here.
+    """
+    diffs = []
+    for model in model_test.get_models():
+        for text in corpus():
+            ids = encode_ids(text)
+            exact = pad_ids([ids], model_test.MIN_SEQ_LEN)
+            padded = pad_ids([ids], model_test.padded_width(len(ids)))
+            diffs.append(abs(model(exact)[0] - model(padded)[0]))
+    diffs = np.array(diffs)
+    assert diffs.mean() < 0.05
+    assert np.percentile(diffs, 99) < 0.45
@@ -0,0 +1,41 @@
+import time
+
+from product_index import RELATED_FIELDS, ProductIndex
+
+
+def listing(title, url, image="https://img/x.jpg", price="9,999"):
+    return {"title": title, "url": url, "image": image, "price": price}
+
+
+def test_related_items_are_listings_in_the_client_shape(tmp_path):
+    index = ProductIndex(str(tmp_path / "catalog.sqlite3"), str(tmp_path / "snapshots"), refresh_interval=3600)
+    index.add_items([
+        listing("Samsung Galaxy M34 5G Blue 128 GB", "https://amazon/m34"),
+        listing("Samsung Galaxy M34 5G Black 128 GB", "https://amazon/m34-black"),
+        listing("Samsung Galaxy M34 5G Silver", "https://amazon/m34-noimage", image=""),
+    ])
+    index.add_product("https://flipkart/samsung-galaxy-m34-5g", "samsung-galaxy-m34-5g", ["great battery on this samsung galaxy"])
+    index.refresh()
+
+    items = index.query("samsung galaxy m34 5g")
+    assert [item["url"] for item in items] == ["https://amazon/m34", "https://amazon/m34-black"]
+    assert all(tuple(item) == RELATED_FIELDS for item in items)
+
+
+def test_items_added_during_a_rebuild_get_their_own(tmp_path):
+    index = ProductIndex(str(tmp_path / "catalog.sqlite3"), str(tmp_path / "snapshots"), refresh_interval=0)
+    build = index.build
+    late = [listing("Redmi Note 13 Pro 256 GB", "https://amazon/note13")]
+
+    def build_with_a_late_upsert():
+        snapshot = build()
+        if late:
+            index.add_items([late.pop()])
+        return snapshot
+
+    index.build = build_with_a_late_upsert
+    index.add_items([listing("Samsung Galaxy M34 5G Blue 128 GB", "https://amazon/m34")])
+    deadline = time.time() + 5
+    while len(index.snapshot) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(index.snapshot) == 2
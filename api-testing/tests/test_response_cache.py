@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+
+from response_cache import ResponseCache, encode_payload
+from review_batch import ReviewBatch
+
+
+class DictRedis:
+    """The few Upstash calls ResponseCache makes, recording the thread each one ran on"""
+
+    def __init__(self):
+        self.data = {}
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        self.threads.append(threading.get_ident())
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def delete(self, key):
+        self.threads.append(threading.get_ident())
+        self.data.pop(key, None)
+
+
+def analysis(rating):
+    return {"Rating": rating, "Reviews": ReviewBatch.from_dicts([{"review": "Good phone", "user": "Asha", "rating": "5", "time": "", "ldr": ["3", "1"]}])}
+
+
+def test_entries_go_stale_after_the_ttl():
+    cache = ResponseCache(DictRedis(), ttl=60, stale_ttl=60)
+    assert cache.get("slug") == (None, None)
+    cache.set("slug", analysis(4))
+    data, state = cache.get("slug")
+    assert (data["Rating"], data["Reviews"].text, state) == (4, ["Good phone"], "fresh")
+
+    entry = cache.load("slug")
+    entry["created_at"] = time.time() - 61
+    cache.redis.data[cache.key("slug")] = encode_payload(entry)
+    data, state = cache.get("slug")
+    assert (data["Rating"], state) == (4, "stale")
+    assert cache.peek("slug") is None
+    assert cache.metrics()["stale"] == 1
+
+
+def test_only_one_caller_claims_a_refresh():
+    cache = ResponseCache(DictRedis())
+    assert cache.claim_refresh("slug")
+    assert not cache.claim_refresh("slug")
+
+
+def test_refresh_writes_off_the_event_loop_and_releases_the_lock():
+    redis = DictRedis()
+    cache = ResponseCache(redis)
+    assert cache.claim_refresh("slug")
+
+    async def compute():
+        return analysis(5), None
+
+    async def run():
+        redis.threads.clear()
+        await cache.refresh("slug", compute)
+        return threading.get_ident(), list(redis.threads)
+
+    loop_thread, threads = asyncio.run(run())
+    assert threads and loop_thread not in threads
+    assert cache.peek("slug")["Rating"] == 5
+    assert cache.claim_refresh("slug")
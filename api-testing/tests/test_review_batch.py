@@ -0,0 +1,29 @@
+from review_batch import ReviewBatch
+
+
+def scraped(text, user="Rahul", rating="4", time="2 days ago"):
+    return {"review": text, "user": user, "rating": rating, "time": time, "page": 1, "ldr": ["3", "1"]}
+
+
+def test_round_trip():
+    batch = ReviewBatch.from_dicts([scraped("good phone"), scraped("bad battery", rating="1")])
+    restored = ReviewBatch.from_bytes(batch.to_bytes())
+    assert restored.to_dicts() == batch.to_dicts()
+    assert restored.likes.tolist() == [3, 3]
+
+
+def test_missing_scraped_fields_round_trip():
+    # the scrapers emit None when a review has no name, rating or date
+    batch = ReviewBatch.from_dicts([scraped("anonymous review", user=None, rating=None, time=None), scraped("named")])
+    restored = ReviewBatch.from_bytes(batch.to_bytes())
+    first, second = restored.to_dicts()
+    assert (first["user"], first["rating"], first["time"]) == ("", "", "")
+    assert (second["user"], second["rating"]) == ("Rahul", "4")
+
+
+def test_extend_grows_past_capacity():
+    batch = ReviewBatch(capacity=1)
+    for i in range(5):
+        batch.append(scraped(f"review {i}"))
+    assert len(batch) == 5
+    assert batch.text == [f"review {i}" for i in range(5)]
@@ -0,0 +1,27 @@
+import score_cache
+from model_test import MODEL_PATHS
+
+
+def test_digest_depends_on_runtime_and_files():
+    torch_digest = score_cache.model_digest(*MODEL_PATHS["torch"], runtime="torch")
+    assert torch_digest == score_cache.model_digest(*MODEL_PATHS["torch"], runtime="torch")
+    # same files under another runtime name, as if int8 scores were stored next to float32 ones
+    assert torch_digest != score_cache.model_digest(*MODEL_PATHS["torch"], runtime="int8")
+    check_fake, sentiment = MODEL_PATHS["torch"]
+    assert torch_digest != score_cache.model_digest(sentiment, check_fake, runtime="torch")
+
+
+def test_store_misses_scores_of_another_digest(tmp_path):
+    path = str(tmp_path / "scores.sqlite3")
+    store = score_cache.ScoreStore(score_cache.SQLiteScoreBackend(path, "fp32"), "fp32")
+    store.set_many(["good phone", "bad phone"], [0.9, 0.1], [0.2, 0.7])
+    assert store.get_many(["good phone", "new text", "bad phone"]) == [(0.9, 0.2), None, (0.1, 0.7)]
+
+    # reopened under another runtime's digest: the old rows are dropped, nothing is served across runtimes
+    other = score_cache.ScoreStore(score_cache.SQLiteScoreBackend(path, "int8"), "int8")
+    assert other.get_many(["good phone", "bad phone"]) == [None, None]
+
+
+def test_digest_depends_on_padding():
+    paths = MODEL_PATHS["torch"]
+    assert score_cache.model_digest(*paths, padding="pad16-min4") != score_cache.model_digest(*paths, padding="pad1-min4")
@@ -0,0 +1,49 @@
+import copy
+import random
+
+import numpy as np
+import pytest
+
+import scoring
+from pipeline import AnalysisPipeline, grads
+from sel_multithread import rank_reviews
+
+
+def review(text, likes, dislikes):
+    return {"review": text, "ldr": [str(likes), str(dislikes)]}
+
+
+def test_engagement_scores_by_hand():
+    likes, dislikes, length = scoring.parse_reviews([review("x" * 600, 8, 2), review("short", 0, 0), review("x" * 150, 1, 1)])
+    components = scoring.engagement_scores(likes, dislikes, length)
+    # total ldr is (9 - 3) / 12 = 0.5
+    assert components["ldr"].tolist() == pytest.approx([1 - abs(0.6 - 0.5), 0.0, 0.5])
+    assert components["eng"].tolist() == pytest.approx([1.0, 0.0, 0.2])
+    assert components["len"].tolist() == pytest.approx([1.0, 5 / 300, 0.5])
+
+
+def test_final_scores_are_capped_at_one():
+    components = {name: np.ones(2) for name in scoring.COMPONENTS}
+    assert scoring.final_scores(components, {name: 1.0 for name in scoring.COMPONENTS}).tolist() == [1.0, 1.0]
+    assert scoring.final_scores(components, {"len": 0.25}).tolist() == [0.25, 0.25]
+
+
+def test_matches_the_dict_based_scoring():
+    rng = random.Random(0)
+    reviews = [review("x" * rng.randint(1, 600), rng.choice([0, rng.randint(0, 500)]), rng.choice([0, rng.randint(0, 80)])) for _ in range(2000)]
+    sentiments = [rng.random() for _ in reviews]
+    fakes = [rng.random() for _ in reviews]
+
+    expected = rank_reviews(copy.deepcopy(reviews))
+    scorer = AnalysisPipeline(weights=grads)
+    for item, sent, plag in zip(expected, sentiments, fakes):
+        item["score"].update(sent=sent, plag=plag)
+        item["final_score"] = scorer.final_score(item["score"])
+
+    components = scoring.engagement_scores(*scoring.parse_reviews(reviews))
+    components.update(sent=sentiments, plag=fakes)
+    final = scoring.final_scores(components, grads)
+
+    for name in ("ldr", "eng", "len"):
+        assert components[name].tolist() == pytest.approx([item["score"][name] for item in expected], abs=1e-12)
+    assert final.tolist() == pytest.approx([item["final_score"] for item in expected], abs=1e-12)
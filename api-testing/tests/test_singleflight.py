@@ -0,0 +1,59 @@
+import asyncio
+
+from singleflight import SingleFlight
+
+
+class LockRedis:
+    """set NX / exists / the compare-and-delete script, enough for SingleFlight's lock"""
+
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def eval(self, script, keys, args):
+        if self.data.get(keys[0]) == args[0]:
+            del self.data[keys[0]]
+            return 1
+        return 0
+
+
+def test_follower_rechecks_after_the_leader_unlocks():
+    redis = LockRedis()
+    redis.set("singleflight:slug", "leader-in-another-worker")
+    published = []
+
+    def lookup():
+        # the leader publishes and unlocks right after the follower's first look
+        if not published:
+            published.append("result")
+            redis.data.clear()
+            return None
+        return published[0]
+
+    async def fn():
+        raise AssertionError("the work ran twice")
+
+    flight = SingleFlight(redis, poll_interval=0)
+    assert asyncio.run(flight.do("slug", fn, lookup=lookup)) == "result"
+
+
+def test_release_leaves_a_newer_leaders_lock_alone():
+    redis = LockRedis()
+    flight = SingleFlight(redis)
+
+    async def expired_leader():
+        assert await flight.acquire("singleflight:slug", "old")
+        # the TTL ran out and another worker took the lock
+        redis.data["singleflight:slug"] = "new"
+        await flight.release("singleflight:slug", "old")
+
+    asyncio.run(expired_leader())
+    assert redis.data == {"singleflight:slug": "new"}
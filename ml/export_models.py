@@ -0,0 +1,207 @@
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import torch
+from torch import nn
+import nltk
+from nltk.tokenize import word_tokenize
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+nltk.data.path.append(os.path.join(HERE, "nltk-tokenizers"))
+# the parity check has to see the inputs the API builds, so it pads with the API's own rule
+sys.path.insert(0, os.path.join(HERE, "..", "api-testing"))
+from model_test import PAD_MULTIPLE, make_buckets, padded_width
+
+MODELS = {
+    "sentiment": "sentiment-analysis",
+    "check_fake": "check-fake",
+}
+REPORT_PATH = os.path.join(HERE, "export-report.json")
+
+NON_ALPHANUM = re.compile(r"[\W]")
+NON_ASCII = re.compile(r"[^a-z0-9\s]")
+
+
+class ClassifierModel(nn.Module):
+    """Same architecture as the notebooks, rebuilt so the scripted weights can be quantized and exported"""
+
+    def __init__(self, vocab_size, emb=64):
+        super().__init__()
+        self.embed = nn.Embedding(vocab_size, emb)
+        self.conv1 = nn.Conv1d(emb, 64, kernel_size=3, padding=1)
+        self.pool1 = nn.MaxPool1d(2)
+        self.conv2 = nn.Conv1d(64, 64, kernel_size=3, padding=1)
+        self.pool2 = nn.MaxPool1d(2)
+        self.conv3 = nn.Conv1d(64, 64, kernel_size=3, padding=1)
+        self.globpool = nn.AdaptiveMaxPool1d(1)
+        self.fc1 = nn.Linear(64, 100)
+        self.fc2 = nn.Linear(100, 1)
+
+    def forward(self, x):
+        x = self.embed(x).transpose(1, 2)
+        x = self.pool1(torch.relu(self.conv1(x)))
+        x = self.pool2(torch.relu(self.conv2(x)))
+        x = torch.relu(self.conv3(x))
+        x = self.globpool(x).squeeze(2)
+        x = torch.relu(self.fc1(x))
+        return torch.sigmoid(self.fc2(x)).squeeze(1)
+
+
+def model_path(name, runtime):
+    suffix = {"torch": ".pt", "int8": "-int8.pt", "onnx": ".onnx"}[runtime]
+    return os.path.join(HERE, MODELS[name] + suffix)
+
+
+def load_eager(name):
+    scripted = torch.jit.load(model_path(name, "torch"), map_location="cpu")
+    state = scripted.state_dict()
+    model = ClassifierModel(state["embed.weight"].shape[0])
+    model.load_state_dict(state)
+    return model.eval()
+
+
+def export_int8(model, path):
+    # dynamic quantization only covers the Linear layers, the convolutions stay float32
+    quantized = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    torch.jit.save(torch.jit.script(quantized), path)
+
+
+def export_onnx(model, path):
+    example = torch.ones((2, PAD_MULTIPLE), dtype=torch.int64)
+    torch.onnx.export(
+        model, (example,), path,
+        input_names=["ids"], output_names=["score"],
+        dynamic_axes={"ids": {0: "batch", 1: "tokens"}, "score": {0: "batch"}},
+        opset_version=17,
+        dynamo=False,
+    )
+
+
+def normalize_text(text):
+    text = NON_ALPHANUM.sub(" ", text.lower())
+    text = NON_ASCII.sub("", text)
+    return text.strip()
+
+
+def load_reviews_samples(path, count):
+    """fastText format: __label__1 (negative) / __label__2 (positive) then the review"""
+    labels, texts = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if len(texts) == count:
+                break
+            labels.append(int(line[9]) - 1)
+            texts.append(normalize_text(line[10:]))
+    return labels, texts
+
+
+def load_fake_samples(path, count):
+    labels, texts = [], []
+    with open(path, encoding="utf-8") as f:
+        for i, row in enumerate(csv.reader(f)):
+            if i == 0:
+                continue
+            if len(texts) == count:
+                break
+            _, _, text, label = row
+            labels.append(int(label))
+            texts.append(normalize_text(text))
+    return labels, texts
+
+
+def encode_batches(texts, vocab, batch_size=256):
+    """Padded int64 batches built like the API's run_models, every review padded to its own padded_width
+
+    Returns (order, batches), `order` is the index into `texts` of every batch row in turn.
+    """
+    encoded = [[vocab.get(tk, 1) for tk in word_tokenize(text)] for text in texts]
+    buckets = make_buckets([len(tokens) for tokens in encoded], max_batch_size=batch_size)
+    batches = []
+    for bucket in buckets:
+        ids = np.zeros((len(bucket), padded_width(len(encoded[bucket[0]]))), dtype=np.int64)
+        for row, i in zip(ids, bucket):
+            row[:len(encoded[i])] = encoded[i]
+        batches.append(ids)
+    return np.array([i for bucket in buckets for i in bucket], dtype=np.int64), batches
+
+
+def torch_scores(path, batches):
+    model = torch.jit.load(path, map_location="cpu").eval()
+    with torch.no_grad():
+        return np.concatenate([model(torch.from_numpy(ids)).numpy() for ids in batches])
+
+
+def onnx_scores(path, batches):
+    import onnxruntime
+
+    session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+    return np.concatenate([session.run(None, {"ids": ids})[0] for ids in batches])
+
+
+def parity(name, runtimes, labels, texts, vocab):
+    """Score the dataset samples with every runtime and compare against the float32 TorchScript model"""
+    order, batches = encode_batches(texts, vocab)
+    labels = np.array(labels)[order]
+    results = {}
+    reference = None
+    for runtime in ["torch", *runtimes]:
+        path = model_path(name, runtime)
+        start = time.perf_counter()
+        scores = onnx_scores(path, batches) if runtime == "onnx" else torch_scores(path, batches)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = scores
+        results[runtime] = {
+            "max_diff": float(np.abs(scores - reference).max()),
+            "mean_diff": float(np.abs(scores - reference).mean()),
+            "agreement": float(np.mean((scores > 0.5) == (reference > 0.5))),
+            "accuracy": float(np.mean((scores > 0.5) == labels)),
+            "seconds": round(elapsed, 3),
+            "size_mb": round(os.path.getsize(path) / 1024 / 1024, 3),
+        }
+    return results
+
+
+def main(args):
+    vocab = json.load(open(os.path.join(HERE, "vocab.json")))
+    runtimes = [runtime for runtime in ("int8", "onnx") if runtime in args.runtimes]
+
+    for name in MODELS:
+        model = load_eager(name)
+        if "int8" in runtimes:
+            export_int8(model, model_path(name, "int8"))
+        if "onnx" in runtimes:
+            export_onnx(model, model_path(name, "onnx"))
+        print(f"Exported {name}: {', '.join(runtimes)}")
+
+    samples = {
+        "sentiment": load_reviews_samples(args.reviews_dataset, args.samples),
+        "check_fake": load_fake_samples(args.fake_dataset, args.samples),
+    }
+    report = {"samples": args.samples, "created_at": time.time(), "runtimes": {}}
+    for name, (labels, texts) in samples.items():
+        for runtime, result in parity(name, runtimes, labels, texts, vocab).items():
+            report["runtimes"].setdefault(runtime, {})[name] = result
+            print(f"{name:<10} {runtime:<5} max diff {result['max_diff']:.4f}  agreement {result['agreement']:.4f}  "
+                  f"accuracy {result['accuracy']:.4f}  {result['seconds']:.2f}s  {result['size_mb']:.2f}MB")
+
+    for runtime, models in report["runtimes"].items():
+        report["runtimes"][runtime]["max_diff"] = max(result["max_diff"] for result in models.values())
+    json.dump(report, open(args.report, "w"), indent=2)
+    print(f"Wrote {args.report}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export int8 and ONNX versions of both models and check them against the float32 ones")
+    parser.add_argument("--runtimes", nargs="+", default=["int8", "onnx"], choices=["int8", "onnx"])
+    parser.add_argument("--samples", type=int, default=5000, help="reviews per dataset for the parity check")
+    parser.add_argument("--reviews-dataset", default=os.path.join(HERE, "reviews-dataset/test.ft.txt"))
+    parser.add_argument("--fake-dataset", default=os.path.join(HERE, "fake-reviews-dataset/fake_reviews_dataset.csv"))
+    parser.add_argument("--report", default=REPORT_PATH)
+    main(parser.parse_args())
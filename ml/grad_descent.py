@@ -1,8 +1,13 @@
-import numpy as np
+import argparse
 import json
 import os
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
 
-# Attribute names
+# Attribute names, same order as api-testing/scoring.py COMPONENTS
 attributes = [
     "ldr",
     "eng",
@@ -11,85 +16,157 @@ attributes = [
     "plag",
 ]
 
-# Initialize weights randomly
-weights = np.random.rand(len(attributes))
-
-# Learning rate
-learning_rate = 0.01
-
-# Load sample data from JSON file
-json_path = os.path.join(os.path.dirname(__file__), "../api-testing/flipkart_detailed_reviews.json")
-with open(json_path, "r") as f:
-    raw_data = json.load(f)
-
-# Convert JSON data to sample_data list of dicts with required attributes
-
-
-print(raw_data)
-
-sample_data = []
-
-for i in raw_data:
-    sample_data.append(i["score"])
-# Example input data
-
-print(sample_data)
-
-
-def compute_score(features, weights):
-    feature_vector = np.array([features[attr] for attr in attributes])
-    return np.dot(weights, feature_vector)
-
-def normalize_weights(weights, features):
-    feature_vector = np.array([features[attr] for attr in attributes])
-    score = np.dot(weights, feature_vector)
-    
-    # Normalize score to not exceed 1.0
-    if score > 1.0:
-        scale_factor = 1.0 / score
-        weights = weights * scale_factor
-        print(f"🔧 Normalized weights (scaled by {scale_factor:.4f}) to keep score <= 1")
-    elif score < 0:
-        print("⚠️ Score < 0 detected. Clipping to zero.")
-        weights = np.zeros_like(weights)
-    
+WEIGHTS_PATH = os.path.join(HERE, "weights.json")
+FEEDBACK_LABELS = {"good": 1.0, "y": 1.0, "yes": 1.0, "bad": 0.0, "n": 0.0, "no": 0.0}
+
+
+def row_target(row):
+    """A row's target score: `target` in [0, 1], or a good/bad (1/0) `label`/`feedback`"""
+    if "target" in row:
+        return float(row["target"])
+    label = row.get("label", row.get("feedback"))
+    if isinstance(label, str):
+        return FEEDBACK_LABELS[label.strip().lower()]
+    return float(label)
+
+
+def load_feedback(paths):
+    """Labelled reviews from JSON arrays or JSONL files, returns (features (n, 5), targets (n,))
+
+    A row is a reviewed review as the API returns it ({"score": {...}, "label": "good"})
+    or just the components next to the label ({"ldr": ..., "plag": ..., "target": 0.8}).
+    """
+    features, targets = [], []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                rows = (json.loads(line) for line in f if line.strip())
+            else:
+                rows = json.load(f)
+            for row in rows:
+                score = row.get("score", row)
+                features.append([float(score[attr]) for attr in attributes])
+                targets.append(row_target(row))
+    return np.array(features, dtype=np.float64).reshape(-1, len(attributes)), np.array(targets, dtype=np.float64)
+
+
+def project(weights):
+    """Closest weights with w >= 0 and sum(w) <= 1, so scores of [0, 1] components stay in [0, 1]"""
+    weights = np.maximum(weights, 0.0)
+    if weights.sum() <= 1.0:
+        return weights
+    # Euclidean projection onto the simplex
+    ordered = np.sort(weights)[::-1]
+    cumulative = np.cumsum(ordered) - 1.0
+    rho = np.nonzero(ordered - cumulative / np.arange(1, len(ordered) + 1) > 0)[0][-1]
+    return np.maximum(weights - cumulative[rho] / (rho + 1), 0.0)
+
+
+def loss(weights, features, targets):
+    return float(np.mean((features @ weights - targets) ** 2))
+
+
+def train(features, targets, weights=None, learning_rate=0.1, epochs=20, batch_size=1024, seed=0, verbose=True):
+    """Projected mini-batch gradient descent on the squared error of w . x against the targets"""
+    rng = np.random.default_rng(seed)
+    weights = project(rng.random(len(attributes)) if weights is None else np.asarray(weights, dtype=np.float64))
+    for epoch in range(epochs):
+        order = rng.permutation(len(targets))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            x, y = features[batch], targets[batch]
+            gradient = 2.0 / len(batch) * (x.T @ (x @ weights - y))
+            weights = project(weights - learning_rate * gradient)
+        if verbose:
+            print(f"Epoch {epoch + 1}: loss {loss(weights, features, targets):.5f}")
     return weights
 
-def manual_gradient_descent_step(data_point, weights, learning_rate):
-    feature_vector = np.array([data_point[attr] for attr in attributes])
-    
-    current_score = np.dot(weights, feature_vector)
-    print(f"\nCurrent weighted score: {current_score:.4f}")
-    print(f"Data Point: {data_point=}")
-
-    feedback = input("Was the score GOOD or BAD? (good/bad/exit): ").strip().lower()
-    
-    if feedback == 'exit':
-        return weights, False
-
-    direction = 1 if feedback == 'y' else -1
-    weights += direction * learning_rate * feature_vector
-
-    # Normalize after update
-    weights = normalize_weights(weights, data_point)
-    
-    return weights, True
-
-def train(weights, data, learning_rate):
-    keep_training = True
-    step = 0
-    while keep_training:
-        for data_point in data:
-            print(f"\n--- Step {step+1} ---")
-            weights, keep_training = manual_gradient_descent_step(data_point, weights, learning_rate)
-            step += 1
-            if not keep_training:
-                break
+
+def save_weights(weights, path=WEIGHTS_PATH, **info):
+    """Write the next version of the weights file, the API picks it up by mtime
+
+    Every version is also kept next to it as weights-v<N>.json to roll back to.
+    """
+    version = 1
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            version = json.load(f).get("version", 0) + 1
+    body = {
+        "version": version,
+        "created_at": time.time(),
+        "weights": {attr: round(float(weight), 6) for attr, weight in zip(attributes, weights)},
+        **info,
+    }
+    base, ext = os.path.splitext(path)
+    with open(f"{base}-v{version}{ext}", "w", encoding="utf-8") as f:
+        json.dump(body, f, indent=2)
+    # write then rename, so the API never reads a half written file
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(body, f, indent=2)
+    os.replace(tmp, path)
+    return version
+
+
+def synthetic_feedback(rows, seed=0, noise=0.05):
+    """Components in [0, 1] scored by known weights plus noise"""
+    rng = np.random.default_rng(seed)
+    true_weights = project(rng.random(len(attributes)) * 0.5)
+    features = rng.random((rows, len(attributes)))
+    targets = np.clip(features @ true_weights + rng.normal(0, noise, rows), 0.0, 1.0)
+    return features, targets, true_weights
+
+
+def per_point_steps(features, targets, weights, learning_rate):
+    # the old loop's shape: one Python-level update per data point
+    for x, y in zip(features, targets):
+        score = sum(w * v for w, v in zip(weights, x))
+        weights = [w - learning_rate * 2 * (score - y) * v for w, v in zip(weights, x)]
+        weights = list(project(np.array(weights)))
     return weights
 
-# Run training
-final_weights = train(weights, sample_data, learning_rate)
 
-# print("\n✅ Final weights after manual training and normalization:")
-for attr, weight in zip(attributes, final_weights):
-    print(f"{attr}: {weight:.4f}")
+def bench(rows, args):
+    features, targets, true_weights = synthetic_feedback(rows)
+    start = time.perf_counter()
+    weights = train(features, targets, None, args.learning_rate, args.epochs, args.batch_size, verbose=False)
+    elapsed = time.perf_counter() - start
+    print(f"{rows} rows, {args.epochs} epochs of {args.batch_size}-row batches: {elapsed:.2f}s "
+          f"({rows * args.epochs / elapsed / 1e6:.1f}M rows/s), loss {loss(weights, features, targets):.5f}")
+    print(f"max weight error {np.abs(weights - true_weights).max():.4f}")
+
+    sample = min(rows, 20000)
+    start = time.perf_counter()
+    per_point_steps(features[:sample], targets[:sample], list(project(np.full(len(attributes), 0.2))), 0.01)
+    per_row = (time.perf_counter() - start) / sample
+    print(f"per-point updates: {per_row * 1e6:.1f}us/row, one epoch of {rows} rows would take {per_row * rows:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit the review score weights to labelled feedback")
+    parser.add_argument("feedback", nargs="*", help="JSON or JSONL files of labelled reviews")
+    parser.add_argument("--out", default=WEIGHTS_PATH)
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--learning-rate", type=float, default=0.1)
+    parser.add_argument("--warm-start", action="store_true", help="start from the current weights file")
+    parser.add_argument("--bench", type=int, metavar="ROWS", help="time a fit on this many synthetic rows instead")
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.bench, args)
+    else:
+        if not args.feedback:
+            parser.error("no feedback files given")
+        features, targets = load_feedback(args.feedback)
+        print(f"Loaded {len(targets)} labelled reviews")
+        initial = None
+        if args.warm_start and os.path.exists(args.out):
+            with open(args.out, encoding="utf-8") as f:
+                current = json.load(f)["weights"]
+            initial = [current[attr] for attr in attributes]
+        final_weights = train(features, targets, initial, args.learning_rate, args.epochs, args.batch_size)
+        version = save_weights(final_weights, args.out, rows=len(targets), loss=loss(final_weights, features, targets))
+        for attr, weight in zip(attributes, final_weights):
+            print(f"{attr}: {weight:.4f}")
+        print(f"Wrote version {version} to {args.out}")